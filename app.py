@@ -23,11 +23,15 @@ app = Flask(__name__)
 
 # Globalna instancja chart_manager - będzie ustawiona przez main.py
 _chart_manager_instance = None
+# Harmonogram odświeżania workera (RefreshScheduler) - ustawiany przez main.py
+_refresh_scheduler_instance = None
+# Fetcher workera (stan endpointów upstream) - ustawiany przez main.py
+_data_fetcher_instance = None
 
 # Cache dla logowania Steam GSI (aby nie logować każdego żądania)
 _steam_gsi_logged = False
 
-# Cache snapshotu (server_id -> (timestamp_cached, data)) – TTL 60s, minimalne obciążenie bazy
+# Cache snapshotu (server_id -> (timestamp_cached, snapshot_id, data)) – TTL 60s, unieważniany nowym snapshotem
 _snapshot_cache = {}
 _snapshot_cache_ttl_sec = 60
 
@@ -44,6 +48,18 @@ def set_chart_manager(manager):
     _chart_manager_instance = manager
 
 
+def set_data_fetcher(fetcher):
+    """Ustawia fetcher workera (dla /api/upstream)"""
+    global _data_fetcher_instance
+    _data_fetcher_instance = fetcher
+
+
+def set_refresh_scheduler(scheduler):
+    """Ustawia harmonogram odświeżania workera (dla /api/schedule)"""
+    global _refresh_scheduler_instance
+    _refresh_scheduler_instance = scheduler
+
+
 @app.route('/', methods=['GET'])
 def index():
     """Strona główna z listą przedmiotów"""
@@ -105,48 +121,97 @@ def get_servers():
     """Zwraca listę dostępnych serwerów"""
     return jsonify({'servers': config.AVAILABLE_SERVERS, 'default': config.DEFAULT_SERVER_ID})
 
+@app.route('/api/schedule')
+def get_schedule():
+    """Zwraca harmonogram odświeżania: kolejny termin, interwał i ostatni wynik dla każdego serwera"""
+    if _refresh_scheduler_instance is None:
+        return jsonify({'servers': []})
+    return jsonify({'servers': _refresh_scheduler_instance.get_schedule()})
+
+@app.route('/api/upstream')
+def get_upstream_health():
+    """Zwraca stan alternatywnych endpointów API (circuit breaker): działa / pomijany / próba"""
+    if _data_fetcher_instance is None:
+        return jsonify({'endpoints': []})
+    return jsonify({'endpoints': _data_fetcher_instance.get_endpoint_health()})
+
+@app.route('/api/db/pool')
+def get_db_pool_stats():
+    """Zwraca statystyki puli połączeń z bazą (otwarte, ponownie użyte, w użyciu, bezczynne)"""
+    return jsonify(get_chart_manager().db.get_pool_stats())
+
+@app.route('/api/db/wal')
+def get_db_wal_stats():
+    """Zwraca metryki WAL bazy (rozmiar pliku -wal, czas i wynik checkpointów)"""
+    return jsonify(get_chart_manager().db.get_wal_stats())
+
 @app.route('/api/snapshot/latest')
 def get_snapshot_latest():
     """
     Zwraca surowe oferty z ostatniego snapshotu (jeden SELECT, bez agregacji).
     Klient robi grupowanie, wyszukiwanie, paginację – serwer/baza minimalnie obciążone.
-    Cache w pamięci (TTL 60s) – powtarzające się żądania nie idą do bazy.
+    Cache w pamięci (TTL 60s) – powtarzające się żądania nie idą do bazy; nowy snapshot serwera
+    (zmiana wskaźnika najnowszego snapshotu) unieważnia wpis od razu.
     """
     import time
     server_id = request.args.get('server_id', type=int, default=config.DEFAULT_SERVER_ID)
     now = time.time()
-    cached = _snapshot_cache.get(server_id)
-    if cached and (now - cached[0]) < _snapshot_cache_ttl_sec:
-        return jsonify(cached[1])
     cm = get_chart_manager()
+    latest = cm.db.get_latest_snapshot(server_id)
+    snapshot_id = latest['snapshot_id'] if latest else None
+    cached = _snapshot_cache.get(server_id)
+    if cached and (now - cached[0]) < _snapshot_cache_ttl_sec and cached[1] == snapshot_id:
+        return jsonify(cached[2])
     offers, snapshot_timestamp = cm.db.get_latest_snapshot_offers_raw(server_id)
     payload = {
         'offers': offers,
         'last_update': snapshot_timestamp,
         'server_id': server_id,
     }
-    _snapshot_cache[server_id] = (now, payload)
+    _snapshot_cache[server_id] = (now, snapshot_id, payload)
     return jsonify(payload)
 
 
 @app.route('/api/items')
 def get_items():
-    """Zwraca listę wszystkich unikalnych przedmiotów dla danego serwera"""
+    """
+    Zwraca listę wszystkich unikalnych przedmiotów dla danego serwera (katalog przedmiotów).
+    active=1: tylko przedmioty wystawione w najnowszym snapshocie.
+    """
     server_id = request.args.get('server_id', type=int, default=config.DEFAULT_SERVER_ID)
+    active_only = request.args.get('active', '').strip().lower() in ('1', 'true', 'yes')
     cm = get_chart_manager()
-    items_list = cm.db.get_unique_items(server_id)
+    items_list = cm.db.get_unique_items(server_id, active_only=active_only)
     return jsonify({'items': items_list, 'server_id': server_id})
 
 
-@app.route('/api/item/<item_name>')
-def get_item_history(item_name):
+def choose_series_resolution(days, limit=None):
     """
-    Zwraca tylko historię cen dla przedmiotu (jeden SELECT).
-    Statystyki (min/max/śr/mediana) liczy klient z historii – bez drugiego zapytania do bazy.
+    Rozdzielczość danych wykresu dla zakresu: parametr resolution (raw/hour/day), a bez niego surowe
+    snapshoty dla krótkich zakresów (do SERIES_RAW_MAX_DAYS dni lub gdy podano tylko limit), rollupy
+    godzinowe do SERIES_HOURLY_MAX_DAYS dni, dalej dzienne. Zakres dłuższy niż retencja danej warstwy
+    przechodzi do kolejnej.
+    """
+    resolution = request.args.get('resolution')
+    if resolution in ('raw', 'hour', 'day'):
+        return resolution
+    if not days:
+        return 'raw' if limit else 'day'
+    raw_days = getattr(config, 'RAW_RETENTION_DAYS', None)
+    hourly_days = getattr(config, 'HOURLY_RETENTION_DAYS', None)
+    if days <= getattr(config, 'SERIES_RAW_MAX_DAYS', 2) and (not raw_days or days <= raw_days):
+        return 'raw'
+    if days <= getattr(config, 'SERIES_HOURLY_MAX_DAYS', 31) and (not hourly_days or days <= hourly_days):
+        return 'hour'
+    return 'day'
+
+
+def parse_item_range_args(item_name):
+    """
+    Wspólne argumenty historii i serii przedmiotu: (nazwa, server_id, limit, days).
+    limit: maks. 10000; bez limitu i days – ostatnie 30 dni.
     """
     from urllib.parse import unquote
-    cm = get_chart_manager()
-    item_name = unquote(item_name)
     server_id = request.args.get('server_id', type=int, default=config.DEFAULT_SERVER_ID)
     limit = request.args.get('limit', type=int)
     days = request.args.get('days', type=int)
@@ -154,15 +219,58 @@ def get_item_history(item_name):
         days = 30
     if limit and limit > 10000:
         limit = 10000
+    return unquote(item_name), server_id, limit, days
+
+
+@app.route('/api/item/<item_name>')
+def get_item_history(item_name):
+    """
+    Zwraca tylko historię cen dla przedmiotu (jeden SELECT) – zawsze oferty ze snapshotów ('history').
+    Statystyki (min/max/śr/mediana) liczy klient z historii – bez drugiego zapytania do bazy.
+    Zakres dni jest przycinany do retencji surowych danych (RAW_RETENTION_DAYS); 'days' w odpowiedzi
+    to zakres faktycznie użyty, 'days_capped' – czy został przycięty. Dłuższe zakresy: /series.
+    """
+    cm = get_chart_manager()
+    item_name, server_id, limit, days = parse_item_range_args(item_name)
+    raw_days = getattr(config, 'RAW_RETENTION_DAYS', None)
+    days_capped = bool(days and raw_days and days > raw_days)
+    if days_capped:
+        days = raw_days
     history = cm.db.get_item_history(item_name, server_id, limit=limit, days=days)
     if not history:
-        return jsonify({'history': [], 'message': 'Brak danych', 'server_id': server_id})
+        return jsonify({'history': [], 'message': 'Brak danych', 'server_id': server_id,
+                        'days': days, 'days_capped': days_capped})
     return jsonify({
         'item_name': item_name,
         'server_id': server_id,
         'history': history,
         'count': len(history),
-        'limit_applied': limit is not None or days is not None
+        'limit_applied': limit is not None or days is not None,
+        'days': days,
+        'days_capped': days_capped,
+    })
+
+
+@app.route('/api/item/<item_name>/series')
+def get_item_series(item_name):
+    """
+    Zwraca serię cen przedmiotu do wykresu: jeden punkt na snapshot (min/max/średnia/mediana za sztukę,
+    liczba ofert, ilość) z tabeli statystyk – bez przesyłania wszystkich ofert. Dla dłuższych zakresów
+    punkt na godzinę/dzień z rollupów (choose_series_resolution).
+    limit: liczba najnowszych punktów (maks. 10000), days: ostatnie dni (domyślnie 30).
+    """
+    cm = get_chart_manager()
+    item_name, server_id, limit, days = parse_item_range_args(item_name)
+    resolution = choose_series_resolution(days, limit)
+    series = cm.db.get_item_price_series(item_name, server_id, limit=limit, days=days, resolution=resolution)
+    if not series:
+        return jsonify({'series': [], 'message': 'Brak danych', 'server_id': server_id, 'resolution': resolution})
+    return jsonify({
+        'item_name': item_name,
+        'server_id': server_id,
+        'resolution': resolution,
+        'series': series,
+        'count': len(series),
     })
 
 
@@ -0,0 +1,163 @@
+"""
+Mikro-benchmark parsowania ofert (_parse_api_data): koszt na ofertę przed i po kompilacji
+odczytu pól według schematu rekordu i filtra nazw przedmiotów.
+
+Użycie:
+    python benchmark_parse.py                      # 80 000 syntetycznych ofert
+    python benchmark_parse.py --offers 20000 --repeat 5
+    python benchmark_parse.py --file store.json    # zapisana odpowiedź API
+    python benchmark_parse.py --names 50           # z filtrem item_names (50 szukanych nazw)
+"""
+import argparse
+import json
+import random
+import time
+import logging
+from typing import Dict, List, Optional
+
+from data_fetcher import Metin2DataFetcher
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def make_offers(count: int, vnums: int = 400, seed: int = 1) -> List[Dict]:
+    """Syntetyczne oferty w kształcie odpowiedzi sklepu (camelCase jak w API)"""
+    rnd = random.Random(seed)
+    return [{
+        'vnum': 25040 + rnd.randrange(vnums),
+        'name': f"Item{rnd.randrange(vnums)}",
+        'quantity': rnd.randint(1, 200),
+        'yangPrice': rnd.randint(0, 50_000_000),
+        'wonPrice': rnd.choice((0, 0, 1, 2, 5)),
+        'seller': f"Player{rnd.randrange(5000)}",
+    } for _ in range(count)]
+
+
+def matches_reference(original_item_name, item_names: List[str]) -> bool:
+    """Poprzedni filtr nazw (pętla po szukanych nazwach i słowach dla każdej oferty)"""
+    item_name_lower = str(original_item_name).lower()
+    for search_name in item_names:
+        search_lower = search_name.lower()
+        if (search_lower == item_name_lower or
+            search_lower in item_name_lower or
+            item_name_lower in search_lower):
+            return True
+        search_words = search_lower.split()
+        item_words = item_name_lower.split()
+        if any(sw in item_words or any(sw in iw for iw in item_words) for sw in search_words):
+            return True
+    return False
+
+
+def parse_reference(data_list: List, translations: Dict[str, str],
+                    item_names: Optional[List[str]] = None) -> List[Dict]:
+    """Poprzednia implementacja (sprawdzanie wszystkich kluczy dla każdej oferty) – punkt odniesienia"""
+    result = []
+    for item in data_list:
+        if not isinstance(item, dict):
+            logger.debug(f"Pominięto przedmiot niebędący dict: {type(item)}")
+            continue
+        vnum = None
+        for key in ['vnum', 'VNum', 'VNUM', 'id', 'item_id', 'itemId']:
+            if key in item and item[key] is not None:
+                vnum = item[key]
+                break
+        original_item_name = (item.get('name') or item.get('item_name') or item.get('title') or
+                              item.get('item') or item.get('itemName') or '')
+        if item_names and not matches_reference(original_item_name, item_names):
+            continue
+        item_name = original_item_name
+        if vnum is not None and translations:
+            vnum_str = str(vnum)
+            if vnum_str in translations:
+                translated_name = translations[vnum_str]
+                if translated_name:
+                    item_name = translated_name
+                    logger.debug(f"Przetłumaczono vnum {vnum_str}: '{original_item_name}' -> '{translated_name}'")
+            else:
+                logger.debug(f"Brak tłumaczenia dla vnum {vnum_str}, używanie oryginalnej nazwy: '{item_name}'")
+        values = []
+        for keys in (['quantity', 'count', 'qty', 'amount', 'stock'],
+                     ['yangPrice', 'yang', 'price_yang', 'yang_price', 'price'],
+                     ['wonPrice', 'won', 'price_won', 'won_price']):
+            value = None
+            for key in keys:
+                if key in item and item[key] is not None:
+                    value = item[key]
+                    break
+            values.append(str(value) if value is not None else '')
+        quantity, yang, won = values
+        seller = (item.get('seller') or item.get('seller_name') or item.get('sellerName') or
+                  item.get('owner') or item.get('player') or item.get('player_name') or '')
+        parsed_item = {
+            'name': str(item_name) if item_name else '',
+            'quantity': str(quantity) if quantity else '',
+            'yang': str(yang) if yang else '',
+            'won': str(won) if won else '',
+            'seller': str(seller) if seller else '',
+            'timestamp': time.time()
+        }
+        if parsed_item['name']:
+            result.append(parsed_item)
+        else:
+            logger.debug(f"Pominięto przedmiot bez nazwy: {item}")
+    return result
+
+
+def best_time(func, repeat: int) -> float:
+    """Najkrótszy czas z repeat uruchomień (sekundy)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def without_timestamp(items: List[Dict]) -> List[Dict]:
+    return [{k: v for k, v in item.items() if k != 'timestamp'} for item in items]
+
+
+def main(offers: int, repeat: int, file: Optional[str], names: int = 0):
+    fetcher = Metin2DataFetcher(store_url='')
+    if file:
+        with open(file, 'r', encoding='utf-8') as f:
+            api_data = json.load(f)
+        data_list = fetcher._extract_data_list(api_data) if isinstance(api_data, dict) else api_data
+        if not isinstance(data_list, list):
+            print(f"Nie znaleziono listy ofert w {file}")
+            return
+    else:
+        data_list = make_offers(offers)
+    
+    # Stałe tłumaczenia (bez sieci), co trzecie vnum bez tłumaczenia
+    translations = {str(25040 + i): f"Przedmiot {i}" for i in range(0, 400) if i % 3}
+    fetcher._load_translations = lambda: translations
+    # Szukane nazwy: co druga występuje w ofertach, reszta nie pasuje do niczego
+    item_names = [f"Item{i}" if i % 2 else f"Zw{i}" for i in range(names)] or None
+    
+    before = parse_reference(data_list, translations, item_names)
+    after = fetcher._parse_api_data(data_list, item_names)
+    if without_timestamp(before) != without_timestamp(after):
+        print("BŁĄD: wyniki parsowania różnią się od implementacji referencyjnej")
+        return
+    
+    count = max(1, len(data_list))
+    before_s = best_time(lambda: parse_reference(data_list, translations, item_names), repeat)
+    after_s = best_time(lambda: fetcher._parse_api_data(data_list, item_names), repeat)
+    print(f"Ofert: {len(data_list)}, szukanych nazw: {names}, po filtrze: {len(after)} (najlepszy z {repeat} przebiegów)")
+    print(f"  przed: {before_s * 1000:8.1f} ms  {before_s / count * 1e6:6.2f} µs/ofertę")
+    print(f"  po:    {after_s * 1000:8.1f} ms  {after_s / count * 1e6:6.2f} µs/ofertę")
+    print(f"  przyspieszenie: {before_s / after_s:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsowania ofert")
+    parser.add_argument('--offers', type=int, default=80000, help="Liczba syntetycznych ofert")
+    parser.add_argument('--repeat', type=int, default=3, help="Liczba przebiegów (liczy się najlepszy)")
+    parser.add_argument('--file', help="Plik JSON z zapisaną odpowiedzią API zamiast danych syntetycznych")
+    parser.add_argument('--names', type=int, default=0, help="Liczba szukanych nazw (filtr item_names, 0 = bez filtra)")
+    args = parser.parse_args()
+    main(args.offers, args.repeat, args.file, args.names)
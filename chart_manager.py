@@ -3,7 +3,7 @@ Moduł do zarządzania wykresami cen ulepszaczy.
 Wykresy są generowane w przeglądarce (Plotly.js); ten moduł obsługuje dane i statystyki.
 """
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable
 import logging
 from database import Database
 
@@ -39,17 +39,41 @@ class ChartManager:
             self._price_history_cache = self.db.get_all_history()
         return self._price_history_cache
     
-    def add_price_data(self, items: List[Dict], server_id: int):
+    def add_price_data(self, items: Iterable[Dict], server_id: int) -> int:
         """
         Dodaje nowe dane cenowe do bazy danych
         
         Args:
-            items: Lista przedmiotów z danymi cenowymi
+            items: Lista lub iterator (strumień) przedmiotów z danymi cenowymi
             server_id: ID serwera (np. 426, 702)
+        
+        Returns:
+            Liczba zapisanych ofert
         """
-        self.db.add_price_data(items, server_id)
+        added_count = self.db.add_price_data(items, server_id)
         # Czyścimy cache aby następne odwołanie pobrało świeże dane
         self._price_history_cache = None
+        return added_count
+    
+    def touch_snapshot(self, server_id: int) -> bool:
+        """
+        Potwierdza, że najnowszy snapshot serwera jest nadal aktualny (dane bez zmian)
+        
+        Args:
+            server_id: ID serwera (np. 426, 702)
+        """
+        return self.db.touch_latest_snapshot(server_id)
+    
+    def apply_retention(self, raw_days: Optional[int] = None, hourly_days: Optional[int] = None) -> Dict[str, int]:
+        """
+        Usuwa surowe dane starsze niż raw_days i rollupy godzinowe starsze niż hourly_days
+        (rollupy dzienne zostają na zawsze)
+        
+        Args:
+            raw_days: Dni surowych danych do zachowania (None = bez limitu)
+            hourly_days: Dni rollupów godzinowych do zachowania (None = bez limitu)
+        """
+        return self.db.apply_retention(raw_days, hourly_days)
     
     def create_chart(self, item_name: Optional[str] = None,
                     output_file: str = "price_chart.html") -> Optional[str]:
@@ -67,3 +91,7 @@ class ChartManager:
             server_id: ID serwera (np. 426, 702)
         """
         return self.db.get_statistics(server_id)
+    
+    def close(self):
+        """Zamyka połączenia z bazą (pula połączeń) – przy zatrzymywaniu aplikacji"""
+        self.db.close()
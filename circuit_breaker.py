@@ -0,0 +1,112 @@
+"""
+Circuit breaker dla endpointów upstream: endpoint, który zawodzi, jest pomijany przez czas
+schłodzenia zamiast czekać na jego timeout w każdym cyklu i dla każdego serwera.
+"""
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stan endpointu
+STATE_CLOSED = 'closed'  # działa – zapytania przechodzą
+STATE_OPEN = 'open'  # znany jako niesprawny – pomijany do końca schłodzenia
+STATE_HALF_OPEN = 'half_open'  # schłodzenie minęło – jedno zapytanie próbne
+
+
+class CircuitBreaker:
+    """
+    Stan zdrowia endpointów (bezpieczny dla wątków).
+    
+    Po failure_threshold kolejnych błędach endpoint jest otwierany na cooldown sekund.
+    Po schłodzeniu przepuszczane jest jedno zapytanie próbne: sukces zamyka obwód,
+    błąd otwiera go ponownie na dwa razy dłużej (do max_cooldown).
+    """
+    
+    def __init__(self, failure_threshold: Optional[int] = None, cooldown: Optional[float] = None,
+                 max_cooldown: Optional[float] = None):
+        self.failure_threshold = max(1, int(failure_threshold if failure_threshold is not None
+                                            else getattr(config, 'CIRCUIT_FAILURE_THRESHOLD', 1)))
+        self.cooldown = float(cooldown if cooldown is not None else getattr(config, 'CIRCUIT_COOLDOWN', 300))
+        self.max_cooldown = float(max_cooldown if max_cooldown is not None
+                                  else getattr(config, 'CIRCUIT_MAX_COOLDOWN', 3600))
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict] = {}
+    
+    def _state(self, key: str) -> Dict:
+        state = self._endpoints.get(key)
+        if state is None:
+            state = {
+                'state': STATE_CLOSED,
+                'failures': 0,
+                'open_until': 0.0,
+                'cooldown': self.cooldown,
+                'last_error': None,
+                'last_failure': None,
+                'last_success': None,
+                'probing': False,
+            }
+            self._endpoints[key] = state
+        return state
+    
+    def allow(self, key: str) -> bool:
+        """Czy wolno teraz odpytać endpoint (False = otwarty lub trwa już zapytanie próbne)"""
+        now = time.time()
+        with self._lock:
+            state = self._state(key)
+            if state['state'] == STATE_CLOSED:
+                return True
+            if state['state'] == STATE_OPEN and now >= state['open_until']:
+                state['state'] = STATE_HALF_OPEN
+            if state['state'] == STATE_HALF_OPEN and not state['probing']:
+                state['probing'] = True
+                return True
+            return False
+    
+    def record_success(self, key: str):
+        with self._lock:
+            state = self._state(key)
+            if state['state'] != STATE_CLOSED:
+                logger.info(f"Endpoint {key} znowu działa – zamykanie obwodu")
+            state.update(state=STATE_CLOSED, failures=0, cooldown=self.cooldown,
+                         last_success=time.time(), probing=False)
+    
+    def record_failure(self, key: str, error: str):
+        now = time.time()
+        with self._lock:
+            state = self._state(key)
+            state['failures'] += 1
+            state['last_error'] = error
+            state['last_failure'] = now
+            if state['state'] == STATE_HALF_OPEN:
+                # Próba po schłodzeniu nieudana – dłuższe schłodzenie
+                state['cooldown'] = min(self.max_cooldown, state['cooldown'] * 2)
+            elif state['failures'] < self.failure_threshold:
+                return
+            state['state'] = STATE_OPEN
+            state['open_until'] = now + state['cooldown']
+            state['probing'] = False
+            logger.warning(f"Endpoint {key} niesprawny ({error}) – pomijany przez {state['cooldown']:.0f}s")
+    
+    def get_health(self, keys: Optional[List[str]] = None) -> List[Dict]:
+        """Stan endpointów dla API/logów (keys: endpointy do uwzględnienia także przed pierwszym zapytaniem)"""
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat(timespec='seconds') if ts else None
+        
+        now = time.time()
+        with self._lock:
+            for key in keys or ():
+                self._state(key)
+            return [{
+                'endpoint': key,
+                'state': state['state'],
+                'consecutive_failures': state['failures'],
+                'retry_in': round(max(0.0, state['open_until'] - now), 1) if state['state'] == STATE_OPEN else 0,
+                'last_error': state['last_error'],
+                'last_failure': iso(state['last_failure']),
+                'last_success': iso(state['last_success']),
+            } for key, state in self._endpoints.items()]
@@ -6,6 +6,11 @@ STORE_URL = "https://metin2alerts.com/store/"
 
 # Interwał odświeżania danych (w sekundach)
 REFRESH_INTERVAL = 300  # 5 minut
+# Interwał per serwer dopasowuje się do tempa zmian w tych granicach (domyślnie /2 i ×4)
+REFRESH_MIN_INTERVAL = REFRESH_INTERVAL // 2
+REFRESH_MAX_INTERVAL = REFRESH_INTERVAL * 4
+REFRESH_JITTER = 0.1  # losowy rozrzut terminów ±10%
+REFRESH_ERROR_BACKOFF = 30  # po błędzie ponowienie za 30s, 60s, 120s, ... (do REFRESH_MAX_INTERVAL)
 
 # Dostępne serwery
 AVAILABLE_SERVERS = {
@@ -19,11 +24,38 @@ DEFAULT_SERVER_ID = 426
 # URL pliku z tłumaczeniami nazw przedmiotów
 TRANSLATION_URL = "https://metin2alerts.com/m2_data/pl/item_names.json"
 
+# Lokalna kopia tłumaczeń (start bez pobierania) i co ile sekund sprawdzać, czy plik się zmienił
+TRANSLATION_CACHE_PATH = "item_names_cache.json"
+TRANSLATION_REFRESH_INTERVAL = 6 * 3600
+
 # Port i host – często nadpisywane zmiennymi środowiskowymi (PORT, HOST)
 import os
 WEB_PORT = int(os.environ.get('PORT', 5001))
 WEB_HOST = os.environ.get('HOST', '0.0.0.0')
 
+# Liczba serwerów pobieranych równolegle (pobieranie kolejnego serwera trwa podczas zapisu poprzedniego)
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 4))
+# Ponowienia zapytań HTTP przy błędach połączenia i odpowiedziach 429/5xx (odstęp: 0.5s, 1s, 2s, ...)
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5
+# Alternatywne endpointy API (gdy /public/data/{id}.json nie działa) – odpytywane równolegle.
+# Endpoint, który zawiódł, jest pomijany przez CIRCUIT_COOLDOWN sekund (kolejne porażki: 2×, 4×, ... do CIRCUIT_MAX_COOLDOWN).
+FALLBACK_API_TIMEOUT = 10
+CIRCUIT_FAILURE_THRESHOLD = 1
+CIRCUIT_COOLDOWN = 300
+CIRCUIT_MAX_COOLDOWN = 3600
+# Tryb nagrywania: zmienione odpowiedzi serwerów są zapisywane do tego katalogu (odtwarzanie: replay_server.py)
+RECORD_DIR = os.environ.get('RECORD_DIR') or None
+
+# Retencja warstwowa: surowe snapshoty przez RAW_RETENTION_DAYS dni, rollupy godzinowe przez
+# HOURLY_RETENTION_DAYS dni, dzienne na zawsze (None = bez usuwania). Sprawdzane co RETENTION_CHECK_INTERVAL s.
+RAW_RETENTION_DAYS = 7
+HOURLY_RETENTION_DAYS = 90
+RETENTION_CHECK_INTERVAL = 3600
+# Wykres: surowe snapshoty do SERIES_RAW_MAX_DAYS dni zakresu, rollupy godzinowe do SERIES_HOURLY_MAX_DAYS, dalej dzienne
+SERIES_RAW_MAX_DAYS = 2
+SERIES_HOURLY_MAX_DAYS = 31
+
 # Tryb oszczędzania RAM (LOW_MEMORY=1 lub ustaw True poniżej)
 LOW_MEMORY_DEFAULT = False
 LOW_MEMORY = os.environ.get('LOW_MEMORY', str(LOW_MEMORY_DEFAULT)).lower() in ('1', 'true', 'yes')
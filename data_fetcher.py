@@ -1,103 +1,525 @@
 """
 Moduł do pobierania danych o cenach ulepszaczy z API metin2alerts.com (HTTP, bez przeglądarki).
 """
+import os
+import gzip
+import shutil
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
-import random
-import os
-from typing import List, Dict, Optional
+import re
+import codecs
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Iterator, Iterable, IO, Callable
 import logging
 import config
+from translation_store import TranslationStore
+from circuit_breaker import CircuitBreaker
+
+# Opcjonalnie: kompresja Brotli (pip install brotli) – urllib3 dekoduje 'br' tylko z tą biblioteką
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Wynik ostatniego pobrania danych serwera (Metin2DataFetcher.get_fetch_status)
+FETCH_OK = 'ok'
+FETCH_NOT_MODIFIED = 'not_modified'  # 304 – dane na serwerze się nie zmieniły
+FETCH_UNCHANGED = 'unchanged'  # 200, ale treść identyczna z poprzednim pobraniem (ten sam skrót)
+FETCH_ERROR = 'error'
+# Wyniki oznaczające, że poprzedni snapshot nadal jest aktualny
+FETCH_NO_CHANGE = (FETCH_NOT_MODIFIED, FETCH_UNCHANGED)
+
+# Alternatywne endpointy API (gdy /public/data/{serverId}.json nie działa)
+FALLBACK_API_ENDPOINTS = (
+    "https://metin2alerts.com/api/store",
+    "https://metin2alerts.com/api/store/items",
+    "https://metin2alerts.com/store/api",
+)
+
+# Klucze, pod którymi API może zwracać listę ofert (w kolejności sprawdzania)
+DATA_LIST_KEYS = ('items', 'data', 'products', 'list', 'results')
+# Klucze pól oferty (w kolejności sprawdzania). API używa camelCase: 'yangPrice', 'wonPrice'.
+VNUM_KEYS = ('vnum', 'VNum', 'VNUM', 'id', 'item_id', 'itemId')
+NAME_KEYS = ('name', 'item_name', 'title', 'item', 'itemName')
+QUANTITY_KEYS = ('quantity', 'count', 'qty', 'amount', 'stock')
+YANG_KEYS = ('yangPrice', 'yang', 'price_yang', 'yang_price', 'price')
+WON_KEYS = ('wonPrice', 'won', 'price_won', 'won_price')
+SELLER_KEYS = ('seller', 'seller_name', 'sellerName', 'owner', 'player', 'player_name')
+# Rozmiar porcji przy strumieniowym pobieraniu i dekodowaniu odpowiedzi
+STREAM_CHUNK_SIZE = 64 * 1024
+# Odpowiedź do tego rozmiaru jest trzymana w RAM, większa trafia do pliku tymczasowego
+STREAM_SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def create_http_session(pool_size: Optional[int] = None, retries: Optional[int] = None) -> requests.Session:
+    """
+    Tworzy sesję HTTP współdzieloną przez wątki pobierające: pula połączeń keep-alive
+    (bez nowego połączenia TLS w każdym cyklu), kompresja gzip/brotli, ograniczone ponowienia
+    z wykładniczym odstępem i bez proxy ze zmiennych środowiskowych (bez modyfikacji os.environ).
+    
+    Args:
+        pool_size: Maksymalna liczba połączeń na host (domyślnie FETCH_CONCURRENCY + 1 na tłumaczenia)
+        retries: Liczba ponowień (domyślnie config.HTTP_RETRIES)
+    """
+    if pool_size is None:
+        pool_size = max(1, int(getattr(config, 'FETCH_CONCURRENCY', 4))) + 1
+    
+    # Ponowienia przy błędach połączenia i odpowiedziach 429/5xx (z respektowaniem Retry-After).
+    # Po wyczerpaniu prób zwracana jest ostatnia odpowiedź – status obsługuje wywołujący.
+    retry = Retry(
+        total=int(retries if retries is not None else getattr(config, 'HTTP_RETRIES', 3)),
+        backoff_factor=float(getattr(config, 'HTTP_RETRY_BACKOFF', 0.5)),
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'Connection': 'keep-alive',
+    })
+    # Wyłączamy proxy, jeśli jest skonfigurowane. trust_env=False zamiast nadpisywania
+    # os.environ – sesja jest współdzielona przez wątki pobierające serwery równolegle.
+    session.trust_env = False
+    session.proxies = {
+        'http': None,
+        'https': None,
+    }
+    return session
+
+
+def _drain_response(response: requests.Response):
+    """Doczytuje krótką odpowiedź (304, błąd), żeby połączenie wróciło do puli zamiast zostać zamknięte"""
+    try:
+        response.content
+    except requests.exceptions.RequestException:
+        pass
+
+
+def record_response(record_dir: str, server_id: int, raw: IO[bytes]) -> Optional[str]:
+    """
+    Zapisuje pobraną odpowiedź serwera do katalogu nagrań (tryb nagrywania, RECORD_DIR).
+    Plik: {record_dir}/{server_id}/{czas UTC}.json.gz – odtwarza go replay_server.py.
+    Pozycja w raw jest zachowywana.
+    
+    Returns:
+        Ścieżka zapisanego pliku lub None w przypadku błędu
+    """
+    directory = os.path.join(record_dir, str(server_id))
+    path = os.path.join(directory, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '.json.gz')
+    position = raw.tell()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        raw.seek(0)
+        with gzip.open(f"{path}.tmp", 'wb') as f:
+            shutil.copyfileobj(raw, f, STREAM_CHUNK_SIZE)
+        os.replace(f"{path}.tmp", path)
+        return path
+    except OSError as e:
+        logger.warning(f"Nie udało się zapisać nagrania odpowiedzi serwera {server_id}: {e}")
+        return None
+    finally:
+        raw.seek(position)
+
+
+def _first_not_none(item: Dict, keys) -> object:
+    """Wartość pierwszego klucza z listy, który nie jest None (0 jest prawidłową ceną/ilością)"""
+    for key in keys:
+        value = item.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def _first_truthy(item: Dict, keys) -> object:
+    """Pierwsza niepusta wartość z listy kluczy (jak item.get(a) or item.get(b) or ...)"""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return ''
+
+
+def _probe_record(item: Dict) -> tuple:
+    """
+    Odczytuje pola oferty sprawdzając po kolei wszystkie możliwe klucze (wolna ścieżka).
+    
+    Returns:
+        (vnum, oryginalna nazwa, ilość, yang, won, sprzedawca)
+    """
+    return (
+        _first_not_none(item, VNUM_KEYS),
+        _first_truthy(item, NAME_KEYS),
+        _first_not_none(item, QUANTITY_KEYS),
+        _first_not_none(item, YANG_KEYS),
+        _first_not_none(item, WON_KEYS),
+        _first_truthy(item, SELLER_KEYS),
+    )
+
+
+def _compile_record_extractor(sample: Dict):
+    """
+    Kompiluje odczyt pól dla rekordów o takim samym zestawie kluczy jak sample.
+    
+    Klucz każdego pola jest wybierany raz (pierwszy z listy obecny w rekordzie), więc dla
+    kolejnych rekordów odpada przeszukiwanie list kluczy. Extractor zwraca None, gdy rekord
+    ma inny kształt albo wybrany klucz ma pustą wartość, a rekord ma klucze alternatywne –
+    wtedy wywołujący używa _probe_record (wynik zawsze identyczny z _probe_record).
+    
+    Returns:
+        Funkcja item -> krotka jak z _probe_record lub None
+    """
+    key_set = frozenset(sample)
+    
+    def pick(candidates):
+        present = [key for key in candidates if key in key_set]
+        return (present[0] if present else None), len(present) > 1
+    
+    vnum_key, vnum_alt = pick(VNUM_KEYS)
+    name_key, name_alt = pick(NAME_KEYS)
+    quantity_key, quantity_alt = pick(QUANTITY_KEYS)
+    yang_key, yang_alt = pick(YANG_KEYS)
+    won_key, won_alt = pick(WON_KEYS)
+    seller_key, seller_alt = pick(SELLER_KEYS)
+    
+    def extract(item: Dict):
+        if item.keys() != key_set:
+            return None
+        vnum = item[vnum_key] if vnum_key else None
+        name = item[name_key] if name_key else ''
+        quantity = item[quantity_key] if quantity_key else None
+        yang = item[yang_key] if yang_key else None
+        won = item[won_key] if won_key else None
+        seller = item[seller_key] if seller_key else ''
+        if ((vnum is None and vnum_alt) or (not name and name_alt) or
+                (quantity is None and quantity_alt) or (yang is None and yang_alt) or
+                (won is None and won_alt) or (not seller and seller_alt)):
+            return None
+        return vnum, name or '', quantity, yang, won, seller or ''
+    
+    return extract
+
+
+def _compile_name_filter(item_names: List[str]) -> Callable[[object], bool]:
+    """
+    Kompiluje filtr nazw przedmiotów (raz na pobranie zamiast pętli po nazwach dla każdej oferty).
+    
+    Nazwa pasuje, gdy (bez rozróżniania wielkości liter) dla którejś szukanej nazwy:
+    jest jej równa, zawiera ją lub się w niej zawiera, albo któreś słowo szukanej nazwy
+    jest fragmentem któregoś słowa nazwy (np. "Black" w "Black Stone").
+    
+    Słowa szukanych nazw nie zawierają białych znaków, więc "słowo jest fragmentem słowa nazwy"
+    to po prostu "słowo występuje w nazwie" – jedno wyrażenie regularne ze wszystkimi słowami.
+    Szukana nazwa zawarta w nazwie zawsze zawiera któreś swoje słowo, więc sprawdzamy osobno tylko
+    szukane nazwy bez słów. "Nazwa zawiera się w szukanej" to jedno wyszukiwanie w połączonych
+    szukanych nazwach. Oferty powtarzają te same nazwy, więc wynik jest zapamiętywany per nazwa.
+    
+    Args:
+        item_names: Szukane nazwy przedmiotów
+    
+    Returns:
+        Funkcja oryginalna nazwa -> czy pasuje
+    """
+    search_lowers = [str(search_name).lower() for search_name in item_names]
+    words = {word for search_lower in search_lowers for word in search_lower.split()}
+    # Szukane nazwy bez słów (puste lub same białe znaki) – tylko dopasowanie całej nazwy
+    blank_searches = [search_lower for search_lower in search_lowers if not search_lower.split()]
+    words_pattern = re.compile('|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))) if words else None
+    separator = '\x00'
+    haystack = separator.join(search_lowers)
+    cache: Dict[str, bool] = {}
+    
+    def matches(original_name) -> bool:
+        key = original_name if type(original_name) is str else str(original_name)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        name_lower = key.lower()
+        if separator in name_lower:
+            contained = any(name_lower in search_lower for search_lower in search_lowers)
+        else:
+            contained = name_lower in haystack
+        result = (
+            contained or
+            (words_pattern is not None and words_pattern.search(name_lower) is not None) or
+            any(search_lower in name_lower for search_lower in blank_searches)
+        )
+        cache[key] = result
+        return result
+    
+    return matches
+
+
+class _JsonStreamReader:
+    """
+    Przyrostowy dekoder JSON: czyta plik porcjami (STREAM_CHUNK_SIZE) i dekoduje kolejne
+    wartości przez json.JSONDecoder.raw_decode – w pamięci jest tylko bieżąca porcja.
+    """
+    
+    def __init__(self, fp: IO[bytes], chunk_size: int = STREAM_CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+    
+    def _fill(self) -> bool:
+        """Dokleja kolejną porcję do bufora (odrzucając już zdekodowaną część). False = koniec pliku."""
+        if self._eof:
+            return False
+        chunk = self._fp.read(self._chunk_size)
+        if chunk:
+            text = self._text_decoder.decode(chunk)
+        else:
+            self._eof = True
+            text = self._text_decoder.decode(b'', final=True)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Zwraca następny znak (bez białych znaków) bez konsumowania go. '' = koniec danych."""
+        while True:
+            buf = self._buf
+            pos = self._pos
+            n = len(buf)
+            while pos < n and buf[pos] in ' \t\n\r':
+                pos += 1
+            self._pos = pos
+            if pos < n:
+                return buf[pos]
+            if not self._fill():
+                return ''
+    
+    def accept(self, char: str) -> bool:
+        """Konsumuje znak, jeśli jest następny w danych"""
+        if self.peek() == char:
+            self._pos += 1
+            return True
+        return False
+    
+    def read_value(self):
+        """Dekoduje jedną pełną wartość JSON (dociąga porcje, jeśli wartość jest ucięta)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end >= len(self._buf) and not self._eof:
+                # Liczba może być ucięta na granicy porcji (np. "12" z "123") – dekodujemy ponownie
+                self._fill()
+                continue
+            self._pos = end
+            return value
+    
+    def iter_array(self) -> Iterator:
+        """Zwraca kolejne elementy tablicy JSON zaczynającej się w bieżącej pozycji"""
+        if not self.accept('['):
+            raise ValueError("Oczekiwano tablicy JSON")
+        if self.accept(']'):
+            return
+        while True:
+            yield self.read_value()
+            if self.accept(','):
+                continue
+            if self.accept(']'):
+                return
+            raise ValueError("Nieprawidłowa tablica JSON (oczekiwano ',' lub ']')")
+
+
+def iter_offer_records(fp: IO[bytes]) -> Optional[Iterator]:
+    """
+    Ustawia strumień na liście ofert i zwraca iterator jej elementów (dekodowanych pojedynczo).
+    
+    Obsługuje listę na najwyższym poziomie oraz dict z listą pod jednym z DATA_LIST_KEYS
+    (pozostałe wartości, np. metadane, są pomijane).
+    
+    Returns:
+        Iterator rekordów lub None, gdy struktura wymaga pełnego dekodowania (_parse_api_data)
+    """
+    reader = _JsonStreamReader(fp)
+    if reader.peek() == '[':
+        return reader.iter_array()
+    if not reader.accept('{') or reader.peek() == '}':
+        return None
+    while True:
+        key = reader.read_value()
+        if not reader.accept(':'):
+            return None
+        if key in DATA_LIST_KEYS and reader.peek() == '[':
+            return reader.iter_array()
+        reader.read_value()
+        if not reader.accept(','):
+            return None
+
 
 class Metin2DataFetcher:
     """Klasa do pobierania danych o cenach ulepszaczy"""
     
     def __init__(self, store_url: str = "https://metin2alerts.com/store/"):
         self.store_url = store_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        # Wyłączamy proxy, jeśli jest skonfigurowane
-        self.session.proxies = {
-            'http': None,
-            'https': None,
-        }
-        # Cache dla tłumaczeń nazw przedmiotów (vnum -> polska nazwa)
-        self._translation_cache: Optional[Dict[str, str]] = None
-        
+        # Jedna sesja z pulą połączeń dla wszystkich wątków (dane serwerów i tłumaczenia)
+        self.session = create_http_session()
+        # Tłumaczenia nazw przedmiotów (vnum -> polska nazwa), kopia na dysku
+        self.translations = TranslationStore(self.session)
+        # Walidatory HTTP per serwer (server_id -> {'etag', 'last_modified'}) dla zapytań warunkowych
+        self._validators: Dict[int, Dict[str, str]] = {}
+        # Skrót SHA-256 ostatnio pobranej treści per serwer (wykrywanie identycznych odpowiedzi)
+        self._digests: Dict[int, str] = {}
+        # Wynik ostatniego pobrania per serwer (FETCH_OK / FETCH_NOT_MODIFIED / FETCH_UNCHANGED / FETCH_ERROR)
+        self._fetch_status: Dict[int, str] = {}
+        # Alternatywne endpointy: odpytywane równolegle, bez ponowień (za to z circuit breakerem),
+        # sesja i pula wątków tworzone przy pierwszym użyciu
+        self.fallback_endpoints = tuple(getattr(config, 'FALLBACK_API_ENDPOINTS', FALLBACK_API_ENDPOINTS))
+        self.fallback_timeout = float(getattr(config, 'FALLBACK_API_TIMEOUT', 10))
+        self.endpoint_breaker = CircuitBreaker()
+        self._fallback_session: Optional[requests.Session] = None
+        self._fallback_executor: Optional[ThreadPoolExecutor] = None
+        self._fallback_lock = threading.Lock()
+        # Tryb nagrywania: zmienione odpowiedzi serwerów są zapisywane do odtworzenia offline (replay_server.py)
+        self.record_dir = getattr(config, 'RECORD_DIR', None)
+    
+    def get_fetch_status(self, server_id: int) -> Optional[str]:
+        """Zwraca wynik ostatniego pobrania danych dla serwera (FETCH_OK / FETCH_NOT_MODIFIED / FETCH_UNCHANGED / FETCH_ERROR)"""
+        return self._fetch_status.get(server_id)
+    
+    def invalidate_cache(self, server_id: int):
+        """
+        Zapomina walidatory HTTP i skrót treści serwera – następne pobranie zwróci pełne dane.
+        Wywoływane gdy parsowanie lub zapis pobranych danych się nie powiódł (inaczej kolejne 304 by je pominęły).
+        """
+        self._validators.pop(server_id, None)
+        self._digests.pop(server_id, None)
+    
     def _load_translations(self) -> Dict[str, str]:
         """
-        Ładuje tłumaczenia nazw przedmiotów z pliku item_names.json
-        Cache'uje wyniki, aby uniknąć wielokrotnych pobrań
+        Zwraca tłumaczenia nazw przedmiotów (item_names.json) z lokalnej kopii na dysku,
+        odświeżanej w tle – szczegóły w TranslationStore
         
         Returns:
             Dict z mapowaniem vnum (string) -> polska nazwa przedmiotu
         """
-        if self._translation_cache is not None:
-            return self._translation_cache
+        return self.translations.get()
+    
+    def _download_direct(self, server_id: int) -> Optional[IO[bytes]]:
+        """
+        Pobiera surową odpowiedź z /public/data/{serverId}.json strumieniowo do pliku tymczasowego
+        (do STREAM_SPOOL_MAX_BYTES w RAM), licząc po drodze skrót treści.
         
-        translation_url = getattr(config, 'TRANSLATION_URL', None)
-        if not translation_url:
-            logger.warning("Nie skonfigurowano URL tłumaczeń. Używanie oryginalnych nazw.")
-            self._translation_cache = {}
-            return {}
+        Returns:
+            Plik ustawiony na początek danych lub None (błąd, 304 albo treść identyczna z poprzednią –
+            rozróżnia to get_fetch_status). Wywołujący zamyka plik.
+        """
+        self._fetch_status[server_id] = FETCH_ERROR
         
         try:
-            logger.info(f"Ładowanie tłumaczeń z: {translation_url}")
-            # Wyłączamy proxy dla tego requestu
-            old_proxy = os.environ.get('HTTP_PROXY'), os.environ.get('HTTPS_PROXY')
+            # Zapytanie warunkowe zamiast cache-busting (?v=...&r=...): serwer odpowiada 304,
+            # gdy plik się nie zmienił – bez pobierania, parsowania i zapisu do bazy.
+            # Cache-Control: no-cache wymusza rewalidację w ewentualnych cache po drodze.
+            api_url = f"{self.store_url}public/data/{server_id}.json"
+            headers = {'Cache-Control': 'no-cache'}
+            validators = self._validators.get(server_id, {})
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+            
+            logger.info(f"Pobieranie danych z API: {api_url}")
+            # Sesja z pulą keep-alive, kompresją i ponowieniami (create_http_session)
+            response = self.session.get(api_url, headers=headers, timeout=15, stream=True)
             try:
-                os.environ['HTTP_PROXY'] = ''
-                os.environ['HTTPS_PROXY'] = ''
-                headers = self.session.headers.copy()
-                response = requests.get(translation_url, headers=headers, timeout=15)
+                if response.status_code == 304:
+                    _drain_response(response)
+                    logger.info(f"Dane serwera {server_id} bez zmian (304 Not Modified)")
+                    self._fetch_status[server_id] = FETCH_NOT_MODIFIED
+                    return None
+                
+                if response.status_code != 200:
+                    _drain_response(response)
+                    logger.warning(f"API zwróciło status {response.status_code} dla serwera {server_id}")
+                    return None
+                
+                # Walidatory zapamiętywane dopiero po odczycie całej treści – przerwany odczyt
+                # nie może skutkować 304 dla danych, których nie zapisano
+                new_validators = {
+                    'etag': response.headers.get('ETag', ''),
+                    'last_modified': response.headers.get('Last-Modified', ''),
+                }
+                # Serwer nie zawsze respektuje nagłówki warunkowe – identyczną treść wykrywamy skrótem
+                hasher = hashlib.sha256()
+                raw = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_BYTES)
+                try:
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        hasher.update(chunk)
+                        raw.write(chunk)
+                except Exception:
+                    raw.close()
+                    raise
             finally:
-                if old_proxy[0] is not None:
-                    os.environ['HTTP_PROXY'] = old_proxy[0]
-                else:
-                    os.environ.pop('HTTP_PROXY', None)
-                if old_proxy[1] is not None:
-                    os.environ['HTTPS_PROXY'] = old_proxy[1]
-                else:
-                    os.environ.pop('HTTPS_PROXY', None)
+                response.close()
             
-            if response.status_code == 200:
-                translations = response.json()
-                if isinstance(translations, dict):
-                    self._translation_cache = translations
-                    logger.info(f"Załadowano {len(translations)} tłumaczeń")
-                    return translations
-                else:
-                    logger.warning(f"Nieoczekiwany format tłumaczeń: {type(translations)}")
-                    self._translation_cache = {}
-                    return {}
-            else:
-                logger.warning(f"Nie udało się pobrać tłumaczeń: status {response.status_code}")
-                self._translation_cache = {}
-                return {}
-                
+            digest = hasher.hexdigest()
+            if self._digests.get(server_id) == digest:
+                raw.close()
+                self._validators[server_id] = new_validators
+                logger.info(f"Dane serwera {server_id} identyczne z poprzednim pobraniem (sha256 {digest[:12]})")
+                self._fetch_status[server_id] = FETCH_UNCHANGED
+                return None
+            
+            logger.info(f"Pomyślnie pobrano dane z API dla serwera {server_id} ({raw.tell()} B)")
+            if self.record_dir:
+                record_response(self.record_dir, server_id, raw)
+            raw.seek(0)
+            self._validators[server_id] = new_validators
+            self._digests[server_id] = digest
+            self._fetch_status[server_id] = FETCH_OK
+            return raw
+        
         except requests.exceptions.RequestException as e:
-            logger.warning(f"Błąd podczas pobierania tłumaczeń: {e}")
-            self._translation_cache = {}
-            return {}
-        except json.JSONDecodeError as e:
-            logger.warning(f"Błąd parsowania JSON tłumaczeń: {e}")
-            self._translation_cache = {}
-            return {}
+            logger.warning(f"Błąd podczas pobierania danych z API: {e}")
+            return None
         except Exception as e:
-            logger.warning(f"Nieoczekiwany błąd podczas ładowania tłumaczeń: {e}")
-            self._translation_cache = {}
-            return {}
+            logger.warning(f"Nieoczekiwany błąd podczas pobierania danych z API: {e}")
+            return None
+    
+    def _load_raw_json(self, raw: IO[bytes], server_id: int):
+        """Dekoduje całą pobraną odpowiedź (zamyka plik). None w przypadku błędu parsowania."""
+        try:
+            with raw:
+                return json.loads(raw.read().decode('utf-8-sig'))
+        except ValueError as e:
+            logger.warning(f"Błąd parsowania JSON z API: {e}")
+            self._fetch_status[server_id] = FETCH_ERROR
+            # Walidatory zapisane przy odpowiedzi 200 – bez tego kolejne 304 pominęłoby nigdy niezapisane dane
+            self.invalidate_cache(server_id)
+            return None
     
     def fetch_data_direct_api(self, server_id: Optional[int] = None) -> Optional[Dict]:
         """
         Pobiera dane bezpośrednio z endpointu API: /public/data/{serverId}.json
+        (całość w pamięci – worker używa strumieniowego iter_upgrade_items)
         
         Args:
             server_id: ID serwera (np. 426). Jeśli None, próbuje znaleźć domyślny serwer.
@@ -105,103 +527,153 @@ class Metin2DataFetcher:
         Returns:
             Dane JSON z API lub None w przypadku błędu
         """
+        # Jeśli nie podano server_id, próbujemy domyślny (426 z przykładu)
+        if server_id is None:
+            server_id = 426  # Domyślny serwer z przykładu
+        
+        raw = self._download_direct(server_id)
+        if raw is None:
+            return None
+        data = self._load_raw_json(raw, server_id)
+        
+        # Debug: logujemy strukturę danych
+        logger.debug(f"Struktura danych API: typ={type(data)}")
+        if isinstance(data, dict):
+            logger.debug(f"Klucze w danych: {list(data.keys())[:10]}")  # Pierwsze 10 kluczy
+            # Sprawdzamy czy są jakieś listy
+            for key, value in data.items():
+                if isinstance(value, list):
+                    logger.debug(f"Klucz '{key}' zawiera listę z {len(value)} elementami")
+                    if len(value) > 0:
+                        logger.debug(f"Przykładowy element z '{key}': {value[0]}")
+        elif isinstance(data, list):
+            logger.debug(f"Dane to lista z {len(data)} elementami")
+            if len(data) > 0:
+                logger.debug(f"Przykładowy element: {data[0]}")
+        return data
+    
+    def get_endpoint_health(self) -> List[Dict]:
+        """Stan alternatywnych endpointów API (circuit breaker) – dla /api/upstream"""
+        return self.endpoint_breaker.get_health(list(self.fallback_endpoints))
+    
+    def _probe_fallback_endpoint(self, endpoint: str):
+        """Jedno zapytanie do alternatywnego endpointu; wynik trafia do circuit breakera"""
         try:
-            # Jeśli nie podano server_id, próbujemy domyślny (426 z przykładu)
-            if server_id is None:
-                server_id = 426  # Domyślny serwer z przykładu
-            
-            # Generujemy parametry cache-busting jak w oryginalnym kodzie JavaScript
-            timestamp = int(time.time() * 1000)  # Date.now() w milisekundach
-            random_param = random.randint(0, 1000000)  # Math.floor(Math.random() * 1000000)
-            
-            api_url = f"{self.store_url}public/data/{server_id}.json?v={timestamp}&r={random_param}"
-            
-            logger.info(f"Pobieranie danych z API: {api_url}")
-            # Wyłączamy proxy poprzez zmienne środowiskowe
-            old_proxy = os.environ.get('HTTP_PROXY'), os.environ.get('HTTPS_PROXY')
-            try:
-                os.environ['HTTP_PROXY'] = ''
-                os.environ['HTTPS_PROXY'] = ''
-                # Używamy requests.get bezpośrednio, aby uniknąć problemów z proxy
-                # Kopiujemy headers z session
-                headers = self.session.headers.copy()
-                response = requests.get(api_url, headers=headers, timeout=15)
-            finally:
-                # Przywracamy oryginalne wartości proxy
-                if old_proxy[0] is not None:
-                    os.environ['HTTP_PROXY'] = old_proxy[0]
-                else:
-                    os.environ.pop('HTTP_PROXY', None)
-                if old_proxy[1] is not None:
-                    os.environ['HTTPS_PROXY'] = old_proxy[1]
-                else:
-                    os.environ.pop('HTTPS_PROXY', None)
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Pomyślnie pobrano dane z API dla serwera {server_id}")
-                # Debug: logujemy strukturę danych
-                logger.debug(f"Struktura danych API: typ={type(data)}")
-                if isinstance(data, dict):
-                    logger.debug(f"Klucze w danych: {list(data.keys())[:10]}")  # Pierwsze 10 kluczy
-                    # Sprawdzamy czy są jakieś listy
-                    for key, value in data.items():
-                        if isinstance(value, list):
-                            logger.debug(f"Klucz '{key}' zawiera listę z {len(value)} elementami")
-                            if len(value) > 0:
-                                logger.debug(f"Przykładowy element z '{key}': {value[0]}")
-                elif isinstance(data, list):
-                    logger.debug(f"Dane to lista z {len(data)} elementami")
-                    if len(data) > 0:
-                        logger.debug(f"Przykładowy element: {data[0]}")
-                return data
-            else:
-                logger.warning(f"API zwróciło status {response.status_code} dla serwera {server_id}")
+            response = self._fallback_session.get(endpoint, timeout=self.fallback_timeout)
+            if response.status_code != 200:
+                self.endpoint_breaker.record_failure(endpoint, f"status {response.status_code}")
                 return None
-                
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Błąd podczas pobierania danych z API: {e}")
-            return None
-        except json.JSONDecodeError as e:
-            logger.warning(f"Błąd parsowania JSON z API: {e}")
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.endpoint_breaker.record_failure(endpoint, type(e).__name__)
             return None
         except Exception as e:
-            logger.warning(f"Nieoczekiwany błąd podczas pobierania danych z API: {e}")
+            # Każdy wynik próby musi trafić do breakera – inaczej stan półotwarty zostałby bez końca
+            logger.warning(f"Nieoczekiwany błąd endpointu {endpoint}: {e}")
+            self.endpoint_breaker.record_failure(endpoint, type(e).__name__)
             return None
+        self.endpoint_breaker.record_success(endpoint)
+        return data
+    
+    def _fetch_fallback_api(self, server_id: int) -> Optional[Dict]:
+        """
+        Próbuje alternatywnych endpointów API (gdy bezpośredni endpoint nie działa).
+        
+        Endpointy są odpytywane równolegle (czas to najwolniejszy z nich zamiast sumy timeoutów),
+        a znane jako niesprawne są pomijane przez czas schłodzenia (CircuitBreaker).
+        """
+        endpoints = [endpoint for endpoint in self.fallback_endpoints if self.endpoint_breaker.allow(endpoint)]
+        if not endpoints:
+            logger.info(f"Alternatywne endpointy API niesprawne – pomijanie (serwer {server_id})")
+            return None
+        
+        with self._fallback_lock:
+            if self._fallback_session is None:
+                self._fallback_session = create_http_session(pool_size=len(self.fallback_endpoints), retries=0)
+                self._fallback_executor = ThreadPoolExecutor(
+                    max_workers=max(1, len(self.fallback_endpoints)), thread_name_prefix='fallback')
+        
+        futures = {self._fallback_executor.submit(self._probe_fallback_endpoint, endpoint): endpoint
+                   for endpoint in endpoints}
+        for future in as_completed(futures):
+            data = future.result()
+            if data:
+                # Pozostałe zapytania kończą się w tle (aktualizują tylko stan endpointów)
+                logger.info(f"Znaleziono API endpoint: {futures[future]}")
+                self._fetch_status[server_id] = FETCH_OK
+                return data
+        return None
     
     def fetch_data_api(self, server_id: Optional[int] = None) -> Optional[Dict]:
         """
         Próba pobrania danych przez API (jeśli dostępne)
         Najpierw próbuje bezpośredniego endpointu, potem inne możliwe endpointy
         """
+        if server_id is None:
+            server_id = 426
+        
         # Najpierw próbujemy bezpośredniego endpointu
         direct_data = self.fetch_data_direct_api(server_id)
         if direct_data:
             return direct_data
+        # 304 lub identyczna treść – dane bez zmian, alternatywne endpointy nie są potrzebne
+        if self._fetch_status.get(server_id) in FETCH_NO_CHANGE:
+            return None
         
         # Jeśli bezpośredni endpoint nie działa, próbujemy inne
-        try:
-            api_endpoints = [
-                "https://metin2alerts.com/api/store",
-                "https://metin2alerts.com/api/store/items",
-                "https://metin2alerts.com/store/api",
-            ]
-            
-            for endpoint in api_endpoints:
-                try:
-                    response = self.session.get(endpoint, timeout=10)
-                    if response.status_code == 200:
-                        data = response.json()
-                        logger.info(f"Znaleziono API endpoint: {endpoint}")
-                        return data
-                except:
-                    continue
-                    
-        except Exception as e:
-            logger.warning(f"Błąd podczas próby pobrania danych przez API: {e}")
-            
+        return self._fetch_fallback_api(server_id)
+    
+    def iter_upgrade_items(self, item_names: Optional[List[str]] = None,
+                           server_id: Optional[int] = None) -> Optional[Iterator[Dict]]:
+        """
+        Strumieniowa wersja fetch_upgrade_items.
+        
+        Pobieranie odbywa się od razu (w wątku wywołującym), a zwrócony generator czyta
+        pobraną odpowiedź porcjami i parsuje oferty pojedynczo – zużycie pamięci nie zależy
+        od liczby ofert. Generator najlepiej przekazać bezpośrednio do add_price_data.
+        
+        Args:
+            item_names: Lista nazw przedmiotów do filtrowania (opcjonalnie, None = wszystkie przedmioty)
+            server_id: ID serwera dla API (np. 426). Jeśli None, używa domyślnego.
+        
+        Returns:
+            Iterator sparsowanych ofert lub None, gdy brak danych albo dane się nie zmieniły
+            (rozróżnia to get_fetch_status(server_id))
+        """
+        if server_id is None:
+            server_id = 426
+        
+        raw = self._download_direct(server_id)
+        if raw is not None:
+            try:
+                records = iter_offer_records(raw)
+            except ValueError as e:
+                logger.warning(f"Błąd parsowania JSON z API: {e}")
+                records = None
+            if records is not None:
+                return self._iter_stream_items(raw, records, item_names)
+            # Nietypowa struktura danych – pełne dekodowanie i dotychczasowy parser
+            logger.info(f"Nietypowa struktura danych serwera {server_id} – parsowanie bez strumieniowania")
+            raw.seek(0)
+            api_data = self._load_raw_json(raw, server_id)
+            return iter(self._parse_api_data(api_data, item_names)) if api_data else None
+        
+        if self._fetch_status.get(server_id) in FETCH_NO_CHANGE:
+            return None
+        
+        # Jeśli bezpośredni endpoint nie działa, próbujemy inne
+        api_data = self._fetch_fallback_api(server_id)
+        if api_data:
+            return iter(self._parse_api_data(api_data, item_names))
         return None
     
+    def _iter_stream_items(self, raw: IO[bytes], records: Iterator, item_names: Optional[List[str]]) -> Iterator[Dict]:
+        """Parsuje rekordy ze strumienia i zamyka plik odpowiedzi po zakończeniu"""
+        try:
+            yield from self._iter_parsed_items(records, item_names)
+        finally:
+            raw.close()
+    
     def fetch_upgrade_items(self, server_name: Optional[str] = None, 
                            item_names: Optional[List[str]] = None,
                            server_id: Optional[int] = None) -> List[Dict]:
@@ -214,51 +686,50 @@ class Metin2DataFetcher:
             server_id: ID serwera dla API (np. 426). Jeśli None, używa domyślnego.
         
         Returns:
-            Lista słowników z danymi o przedmiotach
+            Lista słowników z danymi o przedmiotach. Pusta lista także gdy dane się nie zmieniły
+            od ostatniego pobrania – rozróżnia to get_fetch_status(server_id).
         """
-        # Najpierw próbujemy bezpośredniego API
-        api_data = self.fetch_data_api(server_id)
-        if api_data:
-            # Debug: logujemy surowe dane przed parsowaniem
-            logger.debug(f"Przed parsowaniem - typ danych: {type(api_data)}")
-            if isinstance(api_data, dict):
-                logger.debug(f"Klucze w api_data: {list(api_data.keys())}")
-            items = self._parse_api_data(api_data, item_names)
+        if server_id is None:
+            server_id = 426
+        
+        items_iter = self.iter_upgrade_items(item_names=item_names, server_id=server_id)
+        if self._fetch_status.get(server_id) in FETCH_NO_CHANGE:
+            # Brak zmian od ostatniego pobrania – nic do parsowania ani zapisu
+            return []
+        if items_iter is not None:
+            try:
+                items = list(items_iter)
+            except ValueError as e:
+                logger.warning(f"Błąd parsowania JSON z API: {e}")
+                items = []
             if items:
                 logger.info(f"Pobrano {len(items)} przedmiotów z API")
                 return items
-            else:
-                logger.warning(f"API zwróciło dane, ale parsowanie zwróciło 0 przedmiotów. Struktura: {type(api_data)}")
-                if isinstance(api_data, dict):
-                    logger.warning(f"Dostępne klucze: {list(api_data.keys())}")
+            self._fetch_status[server_id] = FETCH_ERROR
+            self.invalidate_cache(server_id)
+            logger.warning("API zwróciło dane, ale parsowanie zwróciło 0 przedmiotów.")
         
         logger.warning("API nie zwróciło danych. Pobieranie tylko przez HTTP (bez przeglądarki).")
         return []
     
-    def _parse_api_data(self, api_data, item_names: Optional[List[str]] = None) -> List[Dict]:
+    def _extract_data_list(self, api_data) -> Optional[list]:
         """
-        Parsuje dane z API
+        Wyszukuje listę ofert w zdekodowanych danych z API
         
         Obsługuje różne struktury danych:
         - Lista przedmiotów bezpośrednio
         - Dict z kluczem 'items', 'data', 'products', 'list'
         - Dict z przedmiotami w różnych formatach
         
-        Args:
-            api_data: Dane z API (dict lub list)
-            item_names: Opcjonalna lista nazw do filtrowania (None = wszystkie przedmioty)
-        
         Returns:
-            Lista słowników z danymi o przedmiotach
+            Lista rekordów lub None, gdy struktura jest nieznana
         """
-        items = []
-        
         # Struktura zależy od formatu API
         if isinstance(api_data, list):
             data_list = api_data
         elif isinstance(api_data, dict):
             # Próbujemy różne możliwe klucze
-            for key in ['items', 'data', 'products', 'list', 'results']:
+            for key in DATA_LIST_KEYS:
                 if key in api_data:
                     data_list = api_data[key]
                     break
@@ -273,157 +744,126 @@ class Metin2DataFetcher:
                             break
                     else:
                         logger.debug(f"Nieznana struktura danych API: {list(api_data.keys())}")
-                        return []
+                        return None
                 else:
                     # Może być pojedynczy przedmiot jako dict
                     data_list = [api_data]
         else:
             logger.warning(f"Nieoczekiwany typ danych z API: {type(api_data)}")
-            return []
+            return None
         
         if not isinstance(data_list, list):
             logger.warning(f"Oczekiwano listy, otrzymano: {type(data_list)}")
-            return []
+            return None
         
         logger.debug(f"Parsowanie {len(data_list)} przedmiotów z API")
         
         # Debug: sprawdzamy pierwsze kilka przedmiotów
-        if len(data_list) > 0:
+        if len(data_list) > 0 and isinstance(data_list[0], dict):
             logger.debug(f"Przykładowy przedmiot przed parsowaniem: {list(data_list[0].keys())}")
             logger.debug(f"Przykładowa nazwa: '{data_list[0].get('name', 'BRAK')}'")
-            if item_names:
-                logger.debug(f"Szukane nazwy przedmiotów: {item_names}")
+        return data_list
+    
+    def _parse_api_data(self, api_data, item_names: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Parsuje dane z API
+        
+        Args:
+            api_data: Dane z API (dict lub list)
+            item_names: Opcjonalna lista nazw do filtrowania (None = wszystkie przedmioty)
+        
+        Returns:
+            Lista słowników z danymi o przedmiotach
+        """
+        data_list = self._extract_data_list(api_data)
+        if data_list is None:
+            return []
+        return list(self._iter_parsed_items(data_list, item_names))
+    
+    def _iter_parsed_items(self, data_list: Iterable, item_names: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Parsuje rekordy ofert z API jeden po drugim (generator)
+        
+        Args:
+            data_list: Rekordy ofert (lista albo iterator ze strumienia)
+            item_names: Opcjonalna lista nazw do filtrowania (None = wszystkie przedmioty)
+        
+        Yields:
+            Słowniki z danymi o przedmiotach
+        """
+        if item_names:
+            logger.debug(f"Szukane nazwy przedmiotów: {item_names}")
+        # Filtr kompilowany raz na wywołanie (None = wszystkie przedmioty)
+        name_filter = _compile_name_filter(item_names) if item_names else None
         
         items_before_filter = 0
         items_after_filter = 0
+        parsed_count = 0
         
         # Ładujemy tłumaczenia raz na początku parsowania
         translations = self._load_translations()
+        # Wspólne dla całej odpowiedzi – bez time.time() i sprawdzania poziomu logów per oferta
+        parsed_at = time.time()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # Odczyt pól kompilowany dla kształtu rekordu; ponownie tylko gdy kształt się zmieni
+        extract = None
+        schema_changes = 0
         
         for item in data_list:
             if not isinstance(item, dict):
-                logger.debug(f"Pominięto przedmiot niebędący dict: {type(item)}")
+                if debug:
+                    logger.debug(f"Pominięto przedmiot niebędący dict: {type(item)}")
                 continue
             
-            # Pobieramy vnum (ID przedmiotu) do tłumaczenia
-            vnum = None
-            for key in ['vnum', 'VNum', 'VNUM', 'id', 'item_id', 'itemId']:
-                if key in item and item[key] is not None:
-                    vnum = item[key]
-                    break
+            fields = extract(item) if extract is not None else None
+            if fields is None:
+                if extract is None or item.keys() != extract_keys:
+                    extract = _compile_record_extractor(item)
+                    extract_keys = frozenset(item)
+                    schema_changes += 1
+                    if debug:
+                        logger.debug(f"Schemat rekordu #{schema_changes}: {sorted(extract_keys)}")
+                    fields = extract(item)
+                if fields is None:
+                    fields = _probe_record(item)
             
-            # Pobieramy oryginalną nazwę przedmiotu (różne możliwe klucze)
-            # Używamy oryginalnej nazwy do filtrowania, potem przetłumaczymy
-            original_item_name = (
-                item.get('name') or 
-                item.get('item_name') or 
-                item.get('title') or 
-                item.get('item') or
-                item.get('itemName') or
-                ''
-            )
+            vnum, original_item_name, quantity, yang, won, seller = fields
             
             # Filtrujemy po oryginalnych nazwach jeśli podano
             # Używamy bardziej elastycznego dopasowania - sprawdzamy czy któreś słowo kluczowe
             # jest zawarte w nazwie przedmiotu (nie wymagamy dokładnego dopasowania)
-            if item_names:
-                items_before_filter += 1
-                item_name_lower = str(original_item_name).lower()
-                # Sprawdzamy czy któreś słowo kluczowe z listy jest w nazwie
-                # lub czy nazwa zawiera któreś słowo kluczowe
-                matches = False
-                for search_name in item_names:
-                    search_lower = search_name.lower()
-                    # Sprawdzamy dokładne dopasowanie lub częściowe
-                    if (search_lower == item_name_lower or 
-                        search_lower in item_name_lower or 
-                        item_name_lower in search_lower):
-                        matches = True
-                        break
-                    # Sprawdzamy też pojedyncze słowa (np. "Black" w "Black Stone")
-                    search_words = search_lower.split()
-                    item_words = item_name_lower.split()
-                    if any(sw in item_words or any(sw in iw for iw in item_words) for sw in search_words):
-                        matches = True
-                        break
-                
-                if not matches:
-                    continue
-                items_after_filter += 1
-            else:
-                items_before_filter += 1
-                items_after_filter += 1
+            items_before_filter += 1
+            if name_filter is not None and not name_filter(original_item_name):
+                continue
+            items_after_filter += 1
             
             # Tłumaczymy nazwę na polski używając vnum (po filtrowaniu)
             item_name = original_item_name
             if vnum is not None and translations:
-                vnum_str = str(vnum)
-                if vnum_str in translations:
-                    translated_name = translations[vnum_str]
-                    if translated_name:
-                        item_name = translated_name
-                        logger.debug(f"Przetłumaczono vnum {vnum_str}: '{original_item_name}' -> '{translated_name}'")
-                else:
-                    logger.debug(f"Brak tłumaczenia dla vnum {vnum_str}, używanie oryginalnej nazwy: '{item_name}'")
-            
-            # Pobieramy ilość (różne możliwe klucze)
-            # Używamy sprawdzenia is not None, bo 0 może być prawidłową wartością
-            quantity = None
-            for key in ['quantity', 'count', 'qty', 'amount', 'stock']:
-                if key in item and item[key] is not None:
-                    quantity = item[key]
-                    break
-            quantity = str(quantity) if quantity is not None else ''
-            
-            # Pobieramy cenę w Yang (różne możliwe klucze)
-            # Uwaga: API używa 'yangPrice' (camelCase)
-            # Używamy sprawdzenia is not None, bo 0 jest prawidłową ceną
-            yang = None
-            for key in ['yangPrice', 'yang', 'price_yang', 'yang_price', 'price']:
-                if key in item and item[key] is not None:
-                    yang = item[key]
-                    break
-            yang = str(yang) if yang is not None else ''
-            
-            # Pobieramy cenę w Won (różne możliwe klucze)
-            # Uwaga: API używa 'wonPrice' (camelCase)
-            # Używamy sprawdzenia is not None, bo 0 jest prawidłową ceną
-            won = None
-            for key in ['wonPrice', 'won', 'price_won', 'won_price']:
-                if key in item and item[key] is not None:
-                    won = item[key]
-                    break
-            won = str(won) if won is not None else ''
-            
-            # Pobieramy sprzedawcę (różne możliwe klucze)
-            seller = (
-                item.get('seller') or 
-                item.get('seller_name') or 
-                item.get('sellerName') or
-                item.get('owner') or
-                item.get('player') or
-                item.get('player_name') or
-                ''
-            )
+                translated_name = translations.get(vnum if type(vnum) is str else str(vnum))
+                if translated_name:
+                    item_name = translated_name
+                elif debug:
+                    logger.debug(f"Brak tłumaczenia dla vnum {vnum}, używanie oryginalnej nazwy: '{item_name}'")
             
             parsed_item = {
                 'name': str(item_name) if item_name else '',
-                'quantity': str(quantity) if quantity else '',
-                'yang': str(yang) if yang else '',
-                'won': str(won) if won else '',
+                'quantity': str(quantity) if quantity is not None else '',
+                'yang': str(yang) if yang is not None else '',
+                'won': str(won) if won is not None else '',
                 'seller': str(seller) if seller else '',
-                'timestamp': time.time()
+                'timestamp': parsed_at
             }
             
             # Dodajemy tylko jeśli mamy przynajmniej nazwę
             # Uwaga: usuwamy wymaganie ceny, bo niektóre przedmioty mogą mieć 0 jako cenę
             if parsed_item['name']:
-                items.append(parsed_item)
-            else:
+                parsed_count += 1
+                yield parsed_item
+            elif debug:
                 logger.debug(f"Pominięto przedmiot bez nazwy: {item}")
         
-        logger.info(f"Sparsowano {len(items)} przedmiotów z API")
+        logger.info(f"Sparsowano {parsed_count} przedmiotów z API")
         if item_names:
-            logger.debug(f"Filtrowanie: {items_before_filter} przedmiotów przed filtrem, {items_after_filter} po filtrze, {len(items)} ostatecznie sparsowanych")
-        return items
-    
+            logger.debug(f"Filtrowanie: {items_before_filter} przedmiotów przed filtrem, {items_after_filter} po filtrze, {parsed_count} ostatecznie sparsowanych")
+
@@ -4,14 +4,86 @@ Moduł do zarządzania bazą danych SQLite dla historii cen
 import sqlite3
 import logging
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable
 import os
+import re
+import queue
+import threading
 import time
+import unicodedata
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from concurrent.futures import Future
 from contextlib import contextmanager
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Górna granica otwartego przedziału oferty (last_snapshot_id IS NULL) w porównaniach zakresów
+OPEN_INTERVAL_END = 9223372036854775807
+
+# Statystyki przedmiotów snapshotu z nazwą przedmiotu i sprzedawcy najtańszej oferty (dalej: WHERE/ORDER BY)
+ITEM_STATS_SELECT = """
+    SELECT it.name AS item_name, st.offer_count, st.total_quantity, st.min_price, st.max_price,
+           st.sum_price, st.min_quantity, se.name AS seller
+    FROM item_snapshot_stats st
+    JOIN items it ON it.id = st.item_id
+    JOIN sellers se ON se.id = st.min_seller_id
+"""
+
+# Kolumny item_snapshot_stats w kolejności zapisu (INSERT)
+ITEM_STATS_COLUMNS = """
+    snapshot_id, item_id, server_id, offer_count, total_quantity, min_price, max_price, sum_price,
+    median_price, min_quantity, min_seller_id
+"""
+
+# Agregaty czasowe (rollupy) statystyk przedmiotów: rozdzielczość -> (tabela, długość prefiksu znacznika
+# czasu ISO wyznaczającego przedział, dopełnienie do pełnego znacznika początku przedziału)
+ROLLUP_TABLES = {
+    'hour': ('item_rollups_hourly', 13, ':00:00'),
+    'day': ('item_rollups_daily', 10, 'T00:00:00'),
+}
+
+# Surowe dane podzielone na partycje czasowe (osobna tabela na tydzień lub miesiąc snapshotów, rejestr
+# w tabeli partitions). Nazwa bazowa to widok UNION ALL wszystkich partycji – z niego czytają zapytania;
+# zapisy trafiają do partycji okresu snapshotu, retencja usuwa całe partycje (DROP TABLE).
+# Nazwa bazowa -> kolumny widoku
+PARTITIONED_TABLES = {
+    'offer_intervals': """
+        id, server_id, item_id, price, price_in_won, currency, quantity, seller_id,
+        first_snapshot_id, last_snapshot_id
+    """,
+    'item_snapshot_stats': ITEM_STATS_COLUMNS,
+    'price_history': "id, timestamp, item_name, price, price_in_won, currency, quantity, seller, created_at",
+}
+
+_NON_DIGITS = re.compile(r'\D')
+
+# Litery, których NFKD nie rozkłada na literę bazową i znak diakrytyczny
+_FOLD_LETTERS = str.maketrans({'ł': 'l', 'đ': 'd', 'ø': 'o', 'ß': 'ss'})
+
+
+def parse_quantity(value) -> int:
+    """Ilość sztuk oferty z tekstu API ("200", "1,000", "") – same cyfry, brak lub 0 = 1 szt."""
+    if isinstance(value, int):
+        return value if value > 0 else 1
+    text = str(value).strip() if value is not None else ''
+    if not text.isdigit():
+        text = _NON_DIGITS.sub('', text)
+    quantity = int(text) if text else 0
+    return quantity if quantity > 0 else 1
+
+
+def epoch_ms(timestamp: str) -> int:
+    """Znacznik czasu ISO bez strefy (czas lokalny, jak datetime.now().isoformat()) -> milisekundy epoki"""
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def fold_name(name: str) -> str:
+    """Klucz wyszukiwania nazwy: małe litery bez znaków diakrytycznych ("Łuska Smoka" -> "luska smoka")"""
+    decomposed = unicodedata.normalize('NFKD', name.lower().translate(_FOLD_LETTERS))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
 
 class Database:
     """Klasa do zarządzania bazą danych SQLite"""
@@ -21,56 +93,196 @@ class Database:
         if db_path is None:
             db_path = os.environ.get('DATABASE_PATH', 'price_history.db')
         self.db_path = db_path
-        self._init_database()
+        # Cache słowników nazwa -> id (items, sellers) dla zapisu; uzupełniany po commicie
+        self._item_ids: Dict[str, int] = {}
+        self._seller_ids: Dict[str, int] = {}
+        self._dictionary_loaded = False
+        # Indeks wyszukiwania nazw item_search (FTS5 trigram) – False, gdy SQLite nie ma FTS5/trigram
+        self._item_search_fts = False
+        # Najnowszy snapshot serwera: server_id -> (snapshot_id, timestamp, timestamp_ms). Kopia tabeli
+        # latest_snapshots, ustawiana przez wątek zapisu po commicie snapshotu, brakujące wczytywane z tabeli.
+        self._latest_snapshots: Dict[int, tuple] = {}
+        # Pula połączeń: bezczynne połączenia (z ustawionymi PRAGMA i rozgrzanym cache stron) są
+        # używane ponownie zamiast otwierania nowego przy każdym wywołaniu. Ostatnio zwrócone – pierwsze.
+        # SQLITE_POOL_SIZE ogranicza wszystkie otwarte połączenia czytelników (bezczynne i w użyciu) –
+        # kolejni czekają na zwrot połączenia najwyżej SQLITE_POOL_TIMEOUT_SEC s.
+        self._pool_size = max(1, int(os.environ.get('SQLITE_POOL_SIZE', '4')))
+        self._pool_timeout_sec = float(os.environ.get('SQLITE_POOL_TIMEOUT_SEC', '30'))
+        self._pool_health_check_sec = float(os.environ.get('SQLITE_POOL_HEALTH_CHECK_SEC', '30'))
+        self._pool: List[tuple] = []  # (połączenie, time.monotonic() zwrotu)
+        self._pool_lock = threading.Lock()
+        self._pool_available = threading.Condition(self._pool_lock)
+        self._pool_closed = False
+        self._pool_stats = {'created': 0, 'reused': 0, 'discarded': 0, 'health_check_failures': 0, 'in_use': 0,
+                            'open': 0, 'max_open': 0, 'waits': 0, 'timeouts': 0}
+        # Jedyny zapisujący: wątek z własnym połączeniem wykonuje zadania z kolejki po kolei (_submit_write).
+        # Połączenia z puli są tylko do odczytu (PRAGMA query_only).
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._writer_local = threading.local()
+        # Checkpointy WAL (wątek zapisu): PASSIVE po każdym zapisie snapshotu, TRUNCATE po
+        # SQLITE_WAL_IDLE_CHECKPOINT_SEC s bez zapisów (0 = wyłączone), gdy od ostatniego były zmiany
+        self._wal_idle_checkpoint_sec = float(os.environ.get('SQLITE_WAL_IDLE_CHECKPOINT_SEC', '60'))
+        self._wal_dirty = False
+        self._wal_stats = {'checkpoints': 0, 'busy': 0, 'last_mode': None, 'last_at': None,
+                           'last_duration_ms': None, 'max_duration_ms': 0.0,
+                           'last_log_frames': None, 'last_checkpointed_frames': None}
+        # Okres partycji surowych danych (PARTITIONED_TABLES): 'week' (od poniedziałku) lub 'month'
+        self._partition_period = os.environ.get('SQLITE_PARTITION_PERIOD', 'week').strip().lower()
+        if self._partition_period not in ('week', 'month'):
+            logger.warning(f"Nieznany SQLITE_PARTITION_PERIOD={self._partition_period!r} – używam 'week'")
+            self._partition_period = 'week'
+        self._submit_write(self._init_database)
     
-    def _init_database(self):
-        """Inicjalizuje bazę danych i tworzy tabele jeśli nie istnieją"""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Stara tabela (dla kompatybilności wstecznej)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS price_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    item_name TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    price_in_won REAL NOT NULL,
-                    currency TEXT NOT NULL,
-                    quantity TEXT NOT NULL,
-                    seller TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # NOWA STRUKTURA: Tabela snapshotów (odczyty z API)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    server_id INTEGER NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(server_id, timestamp)
-                )
-            """)
-            
-            # NOWA STRUKTURA: Tabela ofert powiązanych z snapshotami
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS offers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    snapshot_id INTEGER NOT NULL,
+    def _init_database(self, conn):
+        """Inicjalizuje bazę danych i tworzy tabele jeśli nie istnieją (na połączeniu wątku zapisu)"""
+        cursor = conn.cursor()
+        
+        # Stara tabela (dla kompatybilności wstecznej)
+        self._create_price_history_table(cursor)
+        
+        # NOWA STRUKTURA: Tabela snapshotów (odczyty z API)
+        # timestamp_ms: ten sam czas jako milisekundy epoki – klucz sortowania i zakresów dat (indeks
+        # z server_id); timestamp (ISO) zostaje w odpowiedziach API i do podziału na partycje/rollupy
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                server_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                timestamp_ms INTEGER,
+                last_seen_at TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(server_id, timestamp)
+            )
+        """)
+        
+        # NOWA STRUKTURA: Tabela ofert powiązanych z snapshotami
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS offers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                snapshot_id INTEGER NOT NULL,
+                server_id INTEGER NOT NULL,
+                item_name TEXT NOT NULL,
+                price REAL NOT NULL,
+                price_in_won REAL NOT NULL,
+                currency TEXT NOT NULL,
+                quantity TEXT NOT NULL,
+                seller TEXT NOT NULL,
+                FOREIGN KEY (snapshot_id) REFERENCES snapshots(id) ON DELETE CASCADE
+            )
+        """)
+        
+        # Wskaźnik najnowszego snapshotu serwera, zmieniany w transakcji zapisu snapshotu – odczyty
+        # najnowszych danych nie sortują snapshots (kopia w pamięci: Database._latest_snapshots)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS latest_snapshots (
+                server_id INTEGER PRIMARY KEY,
+                snapshot_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                timestamp_ms INTEGER NOT NULL
+            )
+        """)
+        
+        # Słowniki nazw: każda nazwa przedmiotu i sprzedawcy zapisana raz, oferty trzymają tylko id.
+        # Wiersze nie są usuwane, więc raz nadane id jest stałe (cache w Database._item_ids/_seller_ids).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sellers (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        
+        # Wyszukiwanie przedmiotów po fragmencie nazwy (/api/search): FTS5 z tokenizerem trigram na kluczu
+        # fold_name, rowid = items.id; nowe nazwy dopisuje _intern, brakujące _sync_item_search przy starcie
+        self._item_search_fts = self._create_item_search_index(cursor)
+        
+        # Przedziały z nazwami jako TEXT (sprzed słowników) – przenoszone w _migrate_intervals_to_dictionary
+        cursor.execute("PRAGMA table_info(offer_intervals)")
+        if 'item_name' in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("DROP INDEX IF EXISTS idx_intervals_open")
+            cursor.execute("DROP INDEX IF EXISTS idx_intervals_server_item")
+            cursor.execute("ALTER TABLE offer_intervals RENAME TO offer_intervals_text")
+        
+        # Po podziale na partycje (_partition_raw_tables) tabele surowych danych są widokami –
+        # CREATE TABLE IF NOT EXISTS nic wtedy nie robi
+        self._create_intervals_table(cursor)
+        self._create_item_stats_table(cursor)
+        
+        # Rejestr partycji tabel PARTITIONED_TABLES: okres [period_start, period_end) znaczników czasu
+        # snapshotów; period_start '' – partycja "_legacy" z danymi sprzed podziału
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS partitions (
+                name TEXT PRIMARY KEY,
+                base_table TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                period_end TEXT NOT NULL
+            )
+        """)
+        
+        # Statystyki przedmiotu z całej historii serwera, aktualizowane przy każdym zapisie snapshotu
+        # (O(liczba przedmiotów)) – get_statistics nie przegląda historii. current_price: najniższa
+        # cena w ostatnim snapshocie z przedmiotem (last_snapshot_id).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_totals (
+                server_id INTEGER NOT NULL,
+                item_id INTEGER NOT NULL,
+                data_points INTEGER NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL,
+                sum_price REAL NOT NULL,
+                last_snapshot_id INTEGER NOT NULL,
+                current_price REAL NOT NULL,
+                PRIMARY KEY (server_id, item_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Katalog przedmiotów serwera (/api/items, filtr serwera w wyszukiwaniu): pierwszy i ostatni snapshot
+        # z przedmiotem, najniższa cena w ostatnim; active – przedmiot jest w najnowszym snapshocie.
+        # Aktualizowany przy zapisie snapshotu, zostaje po usunięciu surowych danych.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_catalog (
+                server_id INTEGER NOT NULL,
+                item_id INTEGER NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                last_price REAL NOT NULL,
+                active INTEGER NOT NULL,
+                PRIMARY KEY (server_id, item_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Rollupy godzinowe i dzienne (OHLC najniższej ceny za sztukę, liczba ofert, ilość) – wykresy
+        # długich okresów bez odczytu wszystkich snapshotów; zostają po usunięciu surowych danych.
+        for table, _, _ in ROLLUP_TABLES.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
                     server_id INTEGER NOT NULL,
-                    item_name TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    price_in_won REAL NOT NULL,
-                    currency TEXT NOT NULL,
-                    quantity TEXT NOT NULL,
-                    seller TEXT NOT NULL,
-                    FOREIGN KEY (snapshot_id) REFERENCES snapshots(id) ON DELETE CASCADE
-                )
+                    item_id INTEGER NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    open_price REAL NOT NULL,
+                    high_price REAL NOT NULL,
+                    low_price REAL NOT NULL,
+                    close_price REAL NOT NULL,
+                    max_price REAL NOT NULL,
+                    sum_price REAL NOT NULL,
+                    offer_count INTEGER NOT NULL,
+                    total_quantity INTEGER NOT NULL,
+                    samples INTEGER NOT NULL,
+                    last_snapshot_id INTEGER NOT NULL,
+                    PRIMARY KEY (server_id, item_id, bucket_start)
+                ) WITHOUT ROWID
             """)
-            
-            # Indeksy dla starej tabeli (kompatybilność wsteczna)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket_start)")
+        
+        # Indeksy dla starej tabeli (kompatybilność wsteczna); partycje mają własne (_create_partition_indexes)
+        if self._is_table(cursor, 'price_history'):
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_item_name ON price_history(item_name)
             """)
@@ -80,47 +292,364 @@ class Database:
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_item_timestamp ON price_history(item_name, timestamp)
             """)
-            
-            # Indeksy dla nowej struktury (optymalizacja wydajności)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_snapshots_server_timestamp ON snapshots(server_id, timestamp)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_snapshot_id ON offers(snapshot_id)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_server_id ON offers(server_id)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_item_name ON offers(item_name)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_snapshot_item ON offers(snapshot_id, item_name)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_server_item ON offers(server_id, item_name)
-            """)
-            # Indeks dla szybkiego wyszukiwania po item_name i price_in_won
+        
+        # Indeksy dla nowej struktury (optymalizacja wydajności). Snapshoty: (server_id, timestamp) ma już
+        # indeks UNIQUE, zakresy i sortowanie po czasie – idx_snapshots_server_time (_migrate_snapshot_timestamps)
+        cursor.execute("DROP INDEX IF EXISTS idx_snapshots_server_timestamp")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_snapshot_id ON offers(snapshot_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_server_id ON offers(server_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_item_name ON offers(item_name)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_snapshot_item ON offers(snapshot_id, item_name)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_server_item ON offers(server_id, item_name)
+        """)
+        # Indeks dla szybkiego wyszukiwania po item_name i price_in_won
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_item_price ON offers(item_name, price_in_won)
+        """)
+        # Indeks dla timestamp + item_name (dla szybkiego filtrowania)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_snapshot_item_price ON offers(snapshot_id, item_name, price_in_won)
+        """)
+        # Indeks dla paginacji: DISTINCT item_name ... ORDER BY item_name LIMIT/OFFSET
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_offers_snapshot_server_item ON offers(snapshot_id, server_id, item_name)
+        """)
+        
+        if self._is_table(cursor, 'offer_intervals'):
+            self._create_interval_indexes(cursor)
+        # Snapshoty serwera w zakresie id (odtwarzanie snapshotów z przedziałów)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_snapshots_server_id ON snapshots(server_id, id)
+        """)
+        # Seria przedmiotu (wykres) i statystyki ogólne
+        if self._is_table(cursor, 'item_snapshot_stats'):
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_item_price ON offers(item_name, price_in_won)
+                CREATE INDEX IF NOT EXISTS idx_item_stats_server_item ON item_snapshot_stats(server_id, item_id, snapshot_id)
             """)
-            # Indeks dla timestamp + item_name (dla szybkiego filtrowania)
+        
+        conn.commit()
+        logger.info(f"Baza danych zainicjalizowana: {self.db_path}")
+        
+        # Migrujemy strukturę jeśli brakuje kolumny server_id
+        self._migrate_schema_if_needed(conn)
+        
+        # Sprawdzamy czy trzeba zmigrować dane ze starej struktury
+        self._migrate_old_data_if_needed(conn)
+        
+        # Czas snapshotów jako milisekundy epoki (timestamp_ms) dla wierszy sprzed tej kolumny
+        self._migrate_snapshot_timestamps(conn)
+        
+        # Przedziały z nazwami jako TEXT -> id ze słowników items/sellers
+        self._migrate_intervals_to_dictionary(conn)
+        
+        # Ilość jako TEXT -> INTEGER (przepisanie tabeli porcjami)
+        self._migrate_quantity_to_integer(conn)
+        
+        # Tabele surowych danych -> partycje czasowe za widokami o tych samych nazwach
+        self._partition_raw_tables(conn)
+        
+        # Pełne snapshoty z tabeli offers -> przedziały ofert
+        self._migrate_offers_to_intervals(conn)
+        
+        # Statystyki przedmiotów dla snapshotów zapisanych przed item_snapshot_stats
+        backfilled = self._backfill_item_snapshot_stats(conn)
+        
+        # Rollupy i statystyki z całej historii (item_totals) – przeliczenie po uzupełnieniu item_snapshot_stats
+        rebuilt = self._rebuild_item_rollups(conn, force=backfilled > 0)
+        self._rebuild_item_totals(conn, force=rebuilt)
+        
+        # Wskaźniki najnowszych snapshotów (bazy sprzed latest_snapshots, snapshoty z migracji)
+        self._rebuild_latest_snapshots(conn)
+        
+        # Indeks wyszukiwania dla nazw sprzed item_search i dodanych przez migracje
+        self._sync_item_search(conn)
+        
+        # Katalog przedmiotów (baza sprzed item_catalog) – po rollupach i wskaźnikach najnowszych snapshotów
+        self._rebuild_item_catalog(conn, force=rebuilt)
+    
+    def _create_intervals_table(self, cursor, table: str = 'offer_intervals'):
+        """
+        Oferty jako przedziały obecności: każda oferta (ten sam przedmiot, sprzedawca, cena, ilość)
+        zapisana raz, z pierwszym i ostatnim snapshotem, w którym była widoczna.
+        Nowy snapshot zapisuje tylko oferty nowe (INSERT) i znikające (UPDATE last_snapshot_id).
+        last_snapshot_id NULL = oferta obecna w najnowszym snapshocie serwera.
+        Tabela offers (pełna kopia każdego snapshotu) jest już tylko etapem migracji starych danych.
+        quantity: liczba sztuk po parse_quantity (zawsze >= 1).
+        """
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                server_id INTEGER NOT NULL,
+                item_id INTEGER NOT NULL REFERENCES items(id),
+                price REAL NOT NULL,
+                price_in_won REAL NOT NULL,
+                currency TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                seller_id INTEGER NOT NULL REFERENCES sellers(id),
+                first_snapshot_id INTEGER NOT NULL,
+                last_snapshot_id INTEGER
+            )
+        """)
+    
+    def _create_interval_indexes(self, cursor):
+        """Indeksy przedziałów ofert: najnowszy snapshot (otwarte przedziały, także DISTINCT item_id
+        dla paginacji) oraz historia przedmiotu"""
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_intervals_open ON offer_intervals(server_id, last_snapshot_id, item_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_intervals_server_item ON offer_intervals(server_id, item_id, first_snapshot_id)
+        """)
+    
+    def _create_item_search_index(self, cursor) -> bool:
+        """Tworzy indeks item_search; False, gdy SQLite nie obsługuje FTS5 z tokenizerem trigram"""
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(name_key, tokenize='trigram')")
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Brak FTS5 trigram w SQLite ({e}) – wyszukiwanie przedmiotów bez indeksu")
+            return False
+    
+    def _sync_item_search(self, conn):
+        """Dopisuje do item_search przedmioty, których w nim brakuje (słownik items nie traci wierszy)"""
+        if not self._item_search_fts:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO item_search (rowid, name_key)
+            SELECT id, fold_name(name) FROM items WHERE id NOT IN (SELECT rowid FROM item_search)
+        """)
+        if cursor.rowcount > 0:
+            logger.info(f"Indeks wyszukiwania: dodano {cursor.rowcount} przedmiotów")
+        conn.commit()
+    
+    def _create_item_stats_table(self, cursor, table: str = 'item_snapshot_stats'):
+        """
+        Statystyki przedmiotu w snapshocie, liczone przy zapisie z ofert snapshotu. Najnowsze dane,
+        statystyki i wykres czytają jeden wiersz na (snapshot, przedmiot) zamiast wszystkich ofert.
+        min_quantity/min_seller_id: najtańsza oferta (reprezentatywna na liście przedmiotów).
+        """
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                snapshot_id INTEGER NOT NULL,
+                item_id INTEGER NOT NULL,
+                server_id INTEGER NOT NULL,
+                offer_count INTEGER NOT NULL,
+                total_quantity INTEGER NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL,
+                sum_price REAL NOT NULL,
+                median_price REAL NOT NULL,
+                min_quantity INTEGER NOT NULL,
+                min_seller_id INTEGER NOT NULL,
+                PRIMARY KEY (snapshot_id, item_id)
+            ) WITHOUT ROWID
+        """)
+    
+    def _create_price_history_table(self, cursor, table: str = 'price_history'):
+        """Pełna kopia ofert każdego zapisu z nazwami jako TEXT (stara struktura, SKIP_PRICE_HISTORY_TABLE ją wyłącza)"""
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                item_name TEXT NOT NULL,
+                price REAL NOT NULL,
+                price_in_won REAL NOT NULL,
+                currency TEXT NOT NULL,
+                quantity TEXT NOT NULL,
+                seller TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    def _create_partition_indexes(self, cursor, base: str, table: str):
+        """Indeksy nowej partycji – jak indeksy tabeli bazowej sprzed podziału, z nazwą partycji"""
+        indexes = {
+            'offer_intervals': {'open': 'server_id, last_snapshot_id, item_id',
+                                'server_item': 'server_id, item_id, first_snapshot_id'},
+            'item_snapshot_stats': {'server_item': 'server_id, item_id, snapshot_id'},
+            'price_history': {'timestamp': 'timestamp', 'item_timestamp': 'item_name, timestamp'},
+        }
+        for suffix, columns in indexes[base].items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table}({columns})")
+    
+    @staticmethod
+    def _is_table(cursor, name: str) -> bool:
+        """Czy name jest tabelą (a nie widokiem partycji ani brakującym obiektem)"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+    
+    @staticmethod
+    def _partition_names(cursor, base: str) -> List[str]:
+        """Partycje tabeli bazowej od najstarszego okresu"""
+        cursor.execute("SELECT name FROM partitions WHERE base_table = ? ORDER BY period_start", (base,))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _partition_bounds(self, timestamp: str) -> tuple[str, str]:
+        """Początek i koniec (wyłącznie) okresu partycji ze znacznikiem czasu: tydzień od poniedziałku lub miesiąc"""
+        from datetime import timedelta
+        day = datetime.fromisoformat(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+        if self._partition_period == 'month':
+            start = day.replace(day=1)
+            end = (start + timedelta(days=32)).replace(day=1)
+        else:
+            start = day - timedelta(days=day.weekday())
+            end = start + timedelta(days=7)
+        return start.isoformat(), end.isoformat()
+    
+    def _partition_for(self, cursor, base: str, timestamp: str) -> str:
+        """
+        Partycja tabeli base na dane snapshotu ze znacznikiem czasu timestamp (wątek zapisu).
+        Brakująca partycja jest tworzona w bieżącej transakcji: tabela, indeksy, wpis w partitions
+        i nowa definicja widoku. Id (AUTOINCREMENT) kontynuują numerację poprzednich partycji, więc
+        są unikalne i rosnące w całym widoku.
+        """
+        cursor.execute("""
+            SELECT name FROM partitions WHERE base_table = ? AND period_start <= ? AND period_end > ?
+        """, (base, timestamp, timestamp))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        
+        period_start, period_end = self._partition_bounds(timestamp)
+        # Okres przycięty do sąsiednich partycji (np. "_legacy" lub po zmianie SQLITE_PARTITION_PERIOD)
+        cursor.execute("""
+            SELECT (SELECT MAX(period_end) FROM partitions WHERE base_table = ? AND period_end <= ?),
+                   (SELECT MIN(period_start) FROM partitions WHERE base_table = ? AND period_start > ?)
+        """, (base, timestamp, base, timestamp))
+        previous_end, next_start = cursor.fetchone()
+        period_start = max(period_start, previous_end or '')
+        period_end = min(period_end, next_start or period_end)
+        name = f"{base}_{_NON_DIGITS.sub('', period_start)[:8]}"
+        
+        creators = {
+            'offer_intervals': self._create_intervals_table,
+            'item_snapshot_stats': self._create_item_stats_table,
+            'price_history': self._create_price_history_table,
+        }
+        creators[base](cursor, name)
+        self._create_partition_indexes(cursor, base, name)
+        if base != 'item_snapshot_stats':
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_snapshot_item_price ON offers(snapshot_id, item_name, price_in_won)
-            """)
-            # Indeks dla paginacji: DISTINCT item_name ... ORDER BY item_name LIMIT/OFFSET
+                SELECT MAX(seq) FROM sqlite_sequence WHERE name IN (SELECT name FROM partitions WHERE base_table = ?)
+            """, (base,))
+            last_id = cursor.fetchone()[0]
+            if last_id:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, last_id))
+        cursor.execute("""
+            INSERT INTO partitions (name, base_table, period_start, period_end) VALUES (?, ?, ?, ?)
+        """, (name, base, period_start, period_end))
+        self._refresh_partition_view(cursor, base)
+        logger.info(f"Nowa partycja {name} ({period_start} – {period_end})")
+        return name
+    
+    def _refresh_partition_view(self, cursor, base: str):
+        """Definiuje widok base od nowa jako UNION ALL partycji z rejestru (po dodaniu lub usunięciu partycji)"""
+        columns = PARTITIONED_TABLES[base]
+        cursor.execute(f"DROP VIEW IF EXISTS {base}")
+        cursor.execute(f"CREATE VIEW {base} AS " + " UNION ALL ".join(
+            f"SELECT {columns} FROM {name}" for name in self._partition_names(cursor, base)))
+    
+    def _partition_raw_tables(self, conn):
+        """
+        Jednorazowy podział tabel PARTITIONED_TABLES na partycje czasowe (bazy sprzed partycji i nowe bazy).
+        
+        Tabela z danymi zostaje partycją "<tabela>_legacy" (ALTER TABLE RENAME – bez przepisywania
+        wierszy) obejmującą wszystko do końca bieżącego okresu; usuwa ją retencja, gdy cały ten okres
+        będzie starszy niż granica. Pusta tabela jest usuwana, a na jej miejsce powstaje partycja
+        bieżącego okresu. Jedna transakcja.
+        """
+        cursor = conn.cursor()
+        tables = [base for base in PARTITIONED_TABLES if self._is_table(cursor, base)]
+        if not tables:
+            return
+        
+        now = datetime.now().isoformat()
+        _, period_end = self._partition_bounds(now)
+        cursor.execute("BEGIN")
+        for base in tables:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {base})")
+            if cursor.fetchone()[0]:
+                name = f"{base}_legacy"
+                cursor.execute(f"ALTER TABLE {base} RENAME TO {name}")
+                cursor.execute("""
+                    INSERT INTO partitions (name, base_table, period_start, period_end) VALUES (?, ?, '', ?)
+                """, (name, base, period_end))
+                self._refresh_partition_view(cursor, base)
+            else:
+                cursor.execute(f"DROP TABLE {base}")
+                self._partition_for(cursor, base, now)
+        conn.commit()
+        logger.info(f"Podzielono na partycje czasowe ({self._partition_period}): {', '.join(tables)}")
+    
+    def _drop_expired_partitions(self, cursor, bases: Iterable[str], cutoff: str) -> List[str]:
+        """
+        Usuwa całe partycje (DROP TABLE – koszt zależy od liczby stron tabeli, nie wierszy i indeksów)
+        tabel bases, których okres kończy się najpóźniej na cutoff – od najstarszej, więc zachowane
+        surowe dane są zawsze ciągłe (rollupy przeliczane są od pierwszego zachowanego snapshotu).
+        Zostaje zawsze najnowsza partycja każdej tabeli; usuwanie zatrzymuje się na partycji
+        z najnowszym snapshotem któregoś serwera (najnowsze dane, otwarte przedziały ofert).
+        Wywołujący zatwierdza transakcję.
+        
+        Returns:
+            Nazwy usuniętych partycji
+        """
+        cursor.execute("SELECT server_id, timestamp FROM latest_snapshots")
+        latest = {row['server_id']: row['timestamp'] for row in cursor.fetchall()}
+        dropped = []
+        for base in bases:
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_offers_snapshot_server_item ON offers(snapshot_id, server_id, item_name)
-            """)
-            
-            conn.commit()
-            logger.info(f"Baza danych zainicjalizowana: {self.db_path}")
-            
-            # Migrujemy strukturę jeśli brakuje kolumny server_id
-            self._migrate_schema_if_needed(conn)
-            
-            # Sprawdzamy czy trzeba zmigrować dane ze starej struktury
-            self._migrate_old_data_if_needed(conn)
+                SELECT name, period_start, period_end FROM partitions
+                WHERE base_table = ? AND period_end <= ?
+                AND period_start < (SELECT MAX(period_start) FROM partitions WHERE base_table = ?)
+                ORDER BY period_start
+            """, (base, cutoff, base))
+            expired = []
+            for row in cursor.fetchall():
+                holding = [server_id for server_id, timestamp in latest.items()
+                           if row['period_start'] <= timestamp < row['period_end']]
+                if holding:
+                    logger.warning(f"Retencja: partycja {row['name']} zawiera najnowszy snapshot serwera "
+                                   f"{', '.join(map(str, holding))} – starsze dane zostają do nowego zapisu")
+                    break
+                expired.append(row['name'])
+            if not expired:
+                continue
+            cursor.executemany("DELETE FROM partitions WHERE name = ?", [(name,) for name in expired])
+            self._refresh_partition_view(cursor, base)
+            for name in expired:
+                cursor.execute(f"DROP TABLE {name}")
+            dropped += expired
+        return dropped
+    
+    @staticmethod
+    def _partition_source(cursor, base: str, since: Optional[str] = None) -> str:
+        """
+        Źródło danych (FROM) tabeli partycjonowanej dla zapytania od znacznika czasu since: tylko
+        partycje, których okres kończy się po since – zapytania z days= nie czytają starszych partycji.
+        Bez since (lub gdy żadna partycja nie pasuje) widok wszystkich partycji.
+        """
+        if since is None:
+            return base
+        cursor.execute("""
+            SELECT name FROM partitions WHERE base_table = ? AND period_end > ? ORDER BY period_start
+        """, (base, since))
+        names = [row[0] for row in cursor.fetchall()]
+        if not names:
+            return base
+        if len(names) == 1:
+            return names[0]
+        columns = PARTITIONED_TABLES[base]
+        return "(" + " UNION ALL ".join(f"SELECT {columns} FROM {name}" for name in names) + ")"
     
     def _migrate_schema_if_needed(self, conn):
         """Migruje schemat bazy danych jeśli brakuje kolumny server_id"""
@@ -142,6 +671,17 @@ class Database:
             except Exception as e:
                 logger.warning(f"Błąd migracji schematu snapshots: {e}")
         
+        # last_seen_at: kiedy dane snapshotu ostatnio potwierdzono (pobranie bez zmian nie tworzy nowego)
+        if 'last_seen_at' not in columns:
+            logger.info("Migracja schematu: dodawanie kolumny last_seen_at do snapshots...")
+            try:
+                cursor.execute("ALTER TABLE snapshots ADD COLUMN last_seen_at TEXT")
+                cursor.execute("UPDATE snapshots SET last_seen_at = timestamp WHERE last_seen_at IS NULL")
+                conn.commit()
+                logger.info("Migracja schematu last_seen_at zakończona")
+            except Exception as e:
+                logger.warning(f"Błąd migracji schematu snapshots (last_seen_at): {e}")
+        
         # Sprawdzamy czy kolumna server_id istnieje w tabeli offers
         cursor.execute("PRAGMA table_info(offers)")
         columns = [row[1] for row in cursor.fetchall()]
@@ -213,141 +753,1094 @@ class Database:
             
             migrated += cursor.rowcount
         
-        conn.commit()
-        logger.info(f"Zmigrowano {migrated} ofert do nowej struktury ({len(timestamps)} snapshotów)")
+        conn.commit()
+        logger.info(f"Zmigrowano {migrated} ofert do nowej struktury ({len(timestamps)} snapshotów)")
+    
+    def _migrate_snapshot_timestamps(self, conn):
+        """
+        Uzupełnia snapshots.timestamp_ms (milisekundy epoki z timestamp ISO) i zakłada indeks
+        (server_id, timestamp_ms). Dodanie kolumny nie przepisuje tabeli; wiersze są uzupełniane
+        zakresami id po MIGRATION_BATCH_SIZE z commitem po każdym, więc odczyty nie czekają na całą
+        migrację, a przerwana jest kontynuowana przy kolejnym starcie.
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(snapshots)")
+        if 'timestamp_ms' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE snapshots ADD COLUMN timestamp_ms INTEGER")
+            conn.commit()
+        
+        cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM snapshots WHERE timestamp_ms IS NULL")
+        first_id, last_id, missing = cursor.fetchone()
+        if missing:
+            batch_size = max(1000, int(os.environ.get('MIGRATION_BATCH_SIZE', '50000')))
+            logger.info(f"Migracja czasu snapshotów do milisekund epoki ({missing} snapshotów)...")
+            for start in range(first_id, last_id + 1, batch_size):
+                cursor.execute("""
+                    UPDATE snapshots SET timestamp_ms = epoch_ms(timestamp)
+                    WHERE id >= ? AND id < ? AND timestamp_ms IS NULL
+                """, (start, start + batch_size))
+                conn.commit()
+            logger.info("Migracja czasu snapshotów zakończona")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_server_time ON snapshots(server_id, timestamp_ms)")
+        conn.commit()
+    
+    def _migrate_offers_to_intervals(self, conn):
+        """
+        Przenosi oferty z tabeli offers (pełna kopia każdego snapshotu) do offer_intervals.
+        Snapshoty każdego serwera są odtwarzane po kolei tą samą różnicą co przy zapisie;
+        po udanej migracji serwera jego wiersze z offers są usuwane (jedna transakcja na serwer).
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT server_id FROM offers")
+        server_ids = [row['server_id'] for row in cursor.fetchall()]
+        if not server_ids:
+            return
+        
+        for server_id in server_ids:
+            cursor.execute("SELECT COUNT(*) FROM offers WHERE server_id = ?", (server_id,))
+            offers_count = cursor.fetchone()[0]
+            logger.info(f"Migracja ofert serwera {server_id} do przedziałów ({offers_count} wierszy)...")
+            cursor.execute("SELECT id, timestamp FROM snapshots WHERE server_id = ? ORDER BY id", (server_id,))
+            snapshots = [tuple(row) for row in cursor.fetchall()]
+            
+            cursor.execute("INSERT OR IGNORE INTO items (name) SELECT DISTINCT item_name FROM offers WHERE server_id = ?",
+                           (server_id,))
+            cursor.execute("INSERT OR IGNORE INTO sellers (name) SELECT DISTINCT seller FROM offers WHERE server_id = ?",
+                           (server_id,))
+            self._create_incoming_table(cursor)
+            opened = 0
+            previous = None
+            for snapshot_id, timestamp in snapshots:
+                cursor.execute("DELETE FROM temp.incoming_offers")
+                cursor.execute("""
+                    INSERT INTO temp.incoming_offers (item_id, price, price_in_won, currency, quantity, seller_id)
+                    SELECT it.id, f.price, f.price_in_won, f.currency, parse_quantity(f.quantity), se.id
+                    FROM offers f
+                    JOIN items it ON it.name = f.item_name
+                    JOIN sellers se ON se.name = f.seller
+                    WHERE f.snapshot_id = ? AND f.server_id = ?
+                    ORDER BY f.id
+                """, (snapshot_id, server_id))
+                snapshot_opened, _ = self._store_offer_diff(cursor, server_id, snapshot_id, timestamp, previous)
+                self._write_item_snapshot_stats(cursor, server_id, snapshot_id)
+                opened += snapshot_opened
+                previous = (snapshot_id, timestamp)
+            
+            cursor.execute("DELETE FROM offers WHERE server_id = ?", (server_id,))
+            conn.commit()
+            logger.info(f"Zmigrowano serwer {server_id}: {offers_count} wierszy -> {opened} przedziałów "
+                        f"({len(snapshots)} snapshotów). Miejsce na dysku odzyska VACUUM.")
+    
+    def _migrate_intervals_to_dictionary(self, conn):
+        """
+        Przenosi przedziały zapisane z nazwami przedmiotu/sprzedawcy jako TEXT (offer_intervals_text,
+        przemianowana w _init_database) do offer_intervals z id ze słowników items i sellers.
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'offer_intervals_text'")
+        if not cursor.fetchone():
+            return
+        
+        logger.info("Migracja przedziałów ofert do słowników przedmiotów i sprzedawców...")
+        cursor.execute("INSERT OR IGNORE INTO items (name) SELECT DISTINCT item_name FROM offer_intervals_text")
+        cursor.execute("INSERT OR IGNORE INTO sellers (name) SELECT DISTINCT seller FROM offer_intervals_text")
+        cursor.execute("""
+            INSERT INTO offer_intervals
+            (id, server_id, item_id, price, price_in_won, currency, quantity, seller_id,
+             first_snapshot_id, last_snapshot_id)
+            SELECT t.id, t.server_id, it.id, t.price, t.price_in_won, t.currency, parse_quantity(t.quantity), se.id,
+                   t.first_snapshot_id, t.last_snapshot_id
+            FROM offer_intervals_text t
+            JOIN items it ON it.name = t.item_name
+            JOIN sellers se ON se.name = t.seller
+            ORDER BY t.id
+        """)
+        migrated = cursor.rowcount
+        cursor.execute("DROP TABLE offer_intervals_text")
+        conn.commit()
+        logger.info(f"Zmigrowano {migrated} przedziałów ofert do słowników")
+    
+    def _migrate_quantity_to_integer(self, conn):
+        """
+        Zamienia kolumnę quantity w offer_intervals z TEXT na INTEGER (parse_quantity).
+        
+        Tabela jest przepisywana porcjami (MIGRATION_BATCH_SIZE wierszy, commit po każdej) do
+        offer_intervals_typed, a na końcu podmieniana w jednej transakcji. Do podmiany odczyty
+        (także z innych procesów) korzystają ze starej tabeli i nie czekają na całą migrację;
+        przerwana migracja jest kontynuowana od ostatniej porcji przy kolejnym starcie.
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(offer_intervals)")
+        column_types = {row['name']: row['type'].upper() for row in cursor.fetchall()}
+        if column_types.get('quantity') != 'TEXT':
+            return
+        
+        batch_size = max(1000, int(os.environ.get('MIGRATION_BATCH_SIZE', '50000')))
+        cursor.execute("SELECT COUNT(*) FROM offer_intervals")
+        total = cursor.fetchone()[0]
+        logger.info(f"Migracja ilości ofert do INTEGER ({total} przedziałów, porcje po {batch_size})...")
+        self._create_intervals_table(cursor, 'offer_intervals_typed')
+        conn.commit()
+        
+        while True:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM offer_intervals_typed")
+            last_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO offer_intervals_typed
+                (id, server_id, item_id, price, price_in_won, currency, quantity, seller_id,
+                 first_snapshot_id, last_snapshot_id)
+                SELECT id, server_id, item_id, price, price_in_won, currency, parse_quantity(quantity), seller_id,
+                       first_snapshot_id, last_snapshot_id
+                FROM offer_intervals
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, batch_size))
+            copied = cursor.rowcount
+            conn.commit()
+            if copied < batch_size:
+                break
+            logger.info(f"Migracja ilości: przepisano przedziały do id {last_id + copied}")
+        
+        # Podmiana tabel atomowo (DDL w jawnej transakcji – przerwanie nie zostawi bazy bez przedziałów)
+        cursor.execute("BEGIN")
+        cursor.execute("DROP TABLE offer_intervals")
+        cursor.execute("ALTER TABLE offer_intervals_typed RENAME TO offer_intervals")
+        self._create_interval_indexes(cursor)
+        conn.commit()
+        logger.info(f"Migracja ilości ofert zakończona ({total} przedziałów)")
+    
+    def _create_incoming_table(self, cursor):
+        """Tymczasowa tabela (per połączenie) na oferty zapisywanego snapshotu"""
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS incoming_offers (
+                item_id INTEGER NOT NULL,
+                price REAL NOT NULL,
+                price_in_won REAL NOT NULL,
+                currency TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                seller_id INTEGER NOT NULL
+            )
+        """)
+    
+    def _write_item_snapshot_stats(self, cursor, server_id: int, snapshot_id: int):
+        """
+        Zapisuje statystyki przedmiotów snapshotu (item_snapshot_stats) z ofert w temp.incoming_offers.
+        Jedno posortowane przejście po ofertach (szybsze niż funkcje okna SQLite dla mediany).
+        """
+        cursor.execute("SELECT timestamp FROM snapshots WHERE id = ?", (snapshot_id,))
+        timestamp = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT item_id, price_in_won, quantity, seller_id
+            FROM temp.incoming_offers
+            ORDER BY item_id, price_in_won, rowid
+        """)
+        rows = [(snapshot_id, item_id, server_id) + self._offer_stats([offer[1:] for offer in offers])
+                for item_id, offers in groupby(cursor.fetchall(), key=itemgetter(0))]
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO {self._partition_for(cursor, 'item_snapshot_stats', timestamp)}
+            ({ITEM_STATS_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        # row: snapshot_id, item_id, server_id, offer_count, total_quantity, min, max, sum, ...
+        cursor.executemany("""
+            INSERT INTO item_totals
+                (server_id, item_id, data_points, min_price, max_price, sum_price, last_snapshot_id, current_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (server_id, item_id) DO UPDATE SET
+                data_points = data_points + excluded.data_points,
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                sum_price = sum_price + excluded.sum_price,
+                current_price = CASE WHEN excluded.last_snapshot_id >= last_snapshot_id
+                                     THEN excluded.current_price ELSE current_price END,
+                last_snapshot_id = MAX(last_snapshot_id, excluded.last_snapshot_id)
+        """, [(row[2], row[1], row[3], row[5], row[6], row[7], row[0], row[5]) for row in rows])
+        # Katalog: przedmioty snapshotu są aktywne, pozostałe przedmioty serwera – już nie
+        # (snapshot starszy niż ostatnio zapisany niczego nie cofa)
+        cursor.executemany("""
+            INSERT INTO item_catalog (server_id, item_id, first_seen, last_seen, last_price, active)
+            VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT (server_id, item_id) DO UPDATE SET
+                first_seen = MIN(first_seen, excluded.first_seen),
+                last_price = CASE WHEN excluded.last_seen >= last_seen THEN excluded.last_price ELSE last_price END,
+                active = CASE WHEN excluded.last_seen >= last_seen THEN 1 ELSE active END,
+                last_seen = MAX(last_seen, excluded.last_seen)
+        """, [(server_id, row[1], timestamp, timestamp, row[5]) for row in rows])
+        cursor.execute("UPDATE item_catalog SET active = 0 WHERE server_id = ? AND active = 1 AND last_seen < ?",
+                       (server_id, timestamp))
+        if rows:
+            self._update_item_rollups(cursor, [(server_id, row[1], snapshot_id, timestamp) + row[3:8] for row in rows])
+    
+    def _update_item_rollups(self, cursor, rows: List[tuple]):
+        """
+        Dolicza statystyki snapshotów do rollupów godzinowych i dziennych.
+        
+        Args:
+            rows: (server_id, item_id, snapshot_id, timestamp, offer_count, total_quantity, min_price, max_price,
+                sum_price) w kolejności snapshotów – open to pierwsza, close ostatnia najniższa cena przedziału.
+        """
+        for table, prefix_length, suffix in ROLLUP_TABLES.values():
+            cursor.executemany(f"""
+                INSERT INTO {table}
+                    (server_id, item_id, bucket_start, open_price, high_price, low_price, close_price,
+                     max_price, sum_price, offer_count, total_quantity, samples, last_snapshot_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (server_id, item_id, bucket_start) DO UPDATE SET
+                    high_price = MAX(high_price, excluded.high_price),
+                    low_price = MIN(low_price, excluded.low_price),
+                    close_price = CASE WHEN excluded.last_snapshot_id >= last_snapshot_id
+                                       THEN excluded.close_price ELSE close_price END,
+                    max_price = MAX(max_price, excluded.max_price),
+                    sum_price = sum_price + excluded.sum_price,
+                    offer_count = offer_count + excluded.offer_count,
+                    total_quantity = total_quantity + excluded.total_quantity,
+                    samples = samples + 1,
+                    last_snapshot_id = MAX(last_snapshot_id, excluded.last_snapshot_id)
+            """, [(server_id, item_id, timestamp[:prefix_length] + suffix,
+                   min_price, min_price, min_price, min_price, max_price, sum_price,
+                   offer_count, total_quantity, snapshot_id)
+                  for server_id, item_id, snapshot_id, timestamp, offer_count, total_quantity,
+                      min_price, max_price, sum_price in rows])
+    
+    def _rebuild_item_rollups(self, conn, force: bool = False) -> bool:
+        """
+        Przelicza rollupy z item_snapshot_stats. Przedziały starsze niż najstarszy zachowany snapshot
+        (surowe dane usunięte przez retencję) zostają bez zmian, nowsze są liczone od nowa.
+        Bez force tylko gdy rollupów nie ma, a statystyki snapshotów istnieją (baza sprzed rollupów).
+        
+        Returns:
+            True, jeśli rollupy zostały przeliczone
+        """
+        cursor = conn.cursor()
+        daily_table = ROLLUP_TABLES['day'][0]
+        if not force:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {daily_table}), EXISTS (SELECT 1 FROM item_snapshot_stats)")
+            has_rollups, has_stats = cursor.fetchone()
+            if has_rollups or not has_stats:
+                return False
+        
+        cursor.execute("SELECT DISTINCT server_id FROM snapshots")
+        server_ids = [row['server_id'] for row in cursor.fetchall()]
+        for server_id in server_ids:
+            cursor.execute("""
+                SELECT MIN(s.timestamp) FROM snapshots s
+                WHERE s.server_id = ? AND EXISTS (SELECT 1 FROM item_snapshot_stats st WHERE st.snapshot_id = s.id)
+            """, (server_id,))
+            first_timestamp = cursor.fetchone()[0]
+            if first_timestamp is None:
+                continue
+            for table, prefix_length, suffix in ROLLUP_TABLES.values():
+                cursor.execute(f"DELETE FROM {table} WHERE server_id = ? AND bucket_start >= ?",
+                               (server_id, first_timestamp[:prefix_length] + suffix))
+            
+            stats = conn.execute("""
+                SELECT st.server_id, st.item_id, st.snapshot_id, s.timestamp, st.offer_count, st.total_quantity,
+                       st.min_price, st.max_price, st.sum_price
+                FROM item_snapshot_stats st
+                JOIN snapshots s ON s.id = st.snapshot_id
+                WHERE st.server_id = ?
+                ORDER BY st.snapshot_id
+            """, (server_id,))
+            while True:
+                batch = [tuple(row) for row in stats.fetchmany(50000)]
+                if not batch:
+                    break
+                self._update_item_rollups(cursor, batch)
+        conn.commit()
+        logger.info(f"Przeliczono rollupy godzinowe i dzienne ({len(server_ids)} serwerów)")
+        return True
+    
+    def _rebuild_item_totals(self, conn, force: bool = False):
+        """
+        Przelicza item_totals od nowa z rollupów dziennych (obejmują też dni, których surowe dane
+        usunęła retencja; jedna transakcja). Bez force tylko gdy tabela jest pusta, a rollupy istnieją
+        (baza sprzed item_totals).
+        """
+        cursor = conn.cursor()
+        daily_table = ROLLUP_TABLES['day'][0]
+        if not force:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM item_totals), EXISTS (SELECT 1 FROM {daily_table})")
+            has_totals, has_rollups = cursor.fetchone()
+            if has_totals or not has_rollups:
+                return
+        
+        cursor.execute("DELETE FROM item_totals")
+        cursor.execute(f"""
+            INSERT INTO item_totals
+                (server_id, item_id, data_points, min_price, max_price, sum_price, last_snapshot_id, current_price)
+            SELECT server_id, item_id, SUM(offer_count), MIN(low_price), MAX(max_price), SUM(sum_price),
+                   MAX(last_snapshot_id), 0
+            FROM {daily_table}
+            GROUP BY server_id, item_id
+        """)
+        cursor.execute(f"""
+            UPDATE item_totals SET current_price = (
+                SELECT d.close_price FROM {daily_table} d
+                WHERE d.server_id = item_totals.server_id AND d.item_id = item_totals.item_id
+                AND d.last_snapshot_id = item_totals.last_snapshot_id
+            )
+        """)
+        conn.commit()
+        logger.info(f"Przeliczono statystyki przedmiotów z całej historii ({cursor.rowcount} przedmiotów)")
+    
+    def _rebuild_item_catalog(self, conn, force: bool = False):
+        """
+        Przelicza item_catalog od nowa z rollupów dziennych i item_totals (jedna transakcja). Bez force
+        tylko gdy katalog jest pusty, a rollupy istnieją (baza sprzed item_catalog). first_seen
+        przedmiotów sprzed katalogu to początek dnia (dokładność rollupów dziennych).
+        """
+        cursor = conn.cursor()
+        daily_table = ROLLUP_TABLES['day'][0]
+        if not force:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM item_catalog), EXISTS (SELECT 1 FROM {daily_table})")
+            has_catalog, has_rollups = cursor.fetchone()
+            if has_catalog or not has_rollups:
+                return
+        
+        cursor.execute("DELETE FROM item_catalog")
+        # last_seen: czas ostatniego snapshotu z przedmiotem (lub początek jego dnia, gdy snapshot usunęła
+        # retencja); active: ostatni snapshot z przedmiotem to najnowszy snapshot serwera
+        cursor.execute(f"""
+            INSERT INTO item_catalog (server_id, item_id, first_seen, last_seen, last_price, active)
+            SELECT d.server_id, d.item_id, MIN(d.bucket_start),
+                   COALESCE((SELECT s.timestamp FROM snapshots s WHERE s.id = t.last_snapshot_id), MAX(d.bucket_start)),
+                   t.current_price,
+                   EXISTS (SELECT 1 FROM latest_snapshots l
+                           WHERE l.server_id = d.server_id AND l.snapshot_id = t.last_snapshot_id)
+            FROM {daily_table} d
+            JOIN item_totals t ON t.server_id = d.server_id AND t.item_id = d.item_id
+            GROUP BY d.server_id, d.item_id
+        """)
+        conn.commit()
+        logger.info(f"Przeliczono katalog przedmiotów ({cursor.rowcount} przedmiotów)")
+    
+    def _rebuild_latest_snapshots(self, conn):
+        """Odtwarza latest_snapshots z tabeli snapshots (przy starcie) i czyści kopię w pamięci"""
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM latest_snapshots")
+        # id i timestamp z wiersza z MAX(timestamp_ms) (kolumny poza agregatem w SQLite)
+        cursor.execute("""
+            INSERT INTO latest_snapshots (server_id, snapshot_id, timestamp, timestamp_ms)
+            SELECT server_id, id, timestamp, MAX(timestamp_ms) FROM snapshots GROUP BY server_id
+        """)
+        conn.commit()
+        self._latest_snapshots.clear()
+    
+    def _backfill_item_snapshot_stats(self, conn) -> int:
+        """
+        Uzupełnia item_snapshot_stats dla snapshotów bez statystyk (bazy sprzed tej tabeli,
+        przerwane uzupełnianie, cleanup_invalid_price_records).
+        
+        Przedziały serwera są przeglądane raz, w kolejności snapshotów, z listą ofert obecnych
+        w bieżącym snapshocie. Statystyki liczone są tylko dla przedmiotów, których oferty
+        pojawiły się lub zniknęły – pozostałe przedmioty są kopiowane z poprzedniego snapshotu.
+        Commit co 100 snapshotów; kolejne uruchomienie kontynuuje od ostatniego zapisanego.
+        Rollupy i item_totals nie są tu aktualizowane – po uzupełnieniu trzeba je przeliczyć
+        (_rebuild_item_rollups, _rebuild_item_totals).
+        
+        Returns:
+            Liczba uzupełnionych snapshotów (wszystkie serwery).
+        """
+        cursor = conn.cursor()
+        total_written = 0
+        cursor.execute("SELECT DISTINCT server_id FROM snapshots")
+        server_ids = [row['server_id'] for row in cursor.fetchall()]
+        for server_id in server_ids:
+            cursor.execute("SELECT COALESCE(MAX(snapshot_id), 0) FROM item_snapshot_stats WHERE server_id = ?",
+                           (server_id,))
+            done_until = cursor.fetchone()[0]
+            # Czy któraś oferta jest obecna w snapshotach bez statystyk (np. ostatni snapshot bez
+            # poprawnych ofert nie ma czego uzupełniać)
+            cursor.execute("""
+                SELECT 1 FROM offer_intervals
+                WHERE server_id = ? AND price_in_won > 0 AND COALESCE(last_snapshot_id, ?) > ?
+                AND EXISTS (SELECT 1 FROM snapshots WHERE server_id = ? AND id > ?)
+                LIMIT 1
+            """, (server_id, OPEN_INTERVAL_END, done_until, server_id, done_until))
+            if not cursor.fetchone():
+                continue
+            
+            cursor.execute("SELECT id, timestamp FROM snapshots WHERE server_id = ? ORDER BY id", (server_id,))
+            snapshots = [tuple(row) for row in cursor.fetchall()]
+            logger.info(f"Uzupełnianie statystyk przedmiotów serwera {server_id} "
+                        f"({sum(1 for i, _ in snapshots if i > done_until)} snapshotów)...")
+            
+            # Przedziały w kolejności pierwszego snapshotu (osobny kursor – strumień)
+            intervals = conn.execute("""
+                SELECT id, item_id, price_in_won, quantity, seller_id, first_snapshot_id,
+                       COALESCE(last_snapshot_id, ?) AS last_snapshot_id
+                FROM offer_intervals
+                WHERE server_id = ? AND price_in_won > 0
+                ORDER BY first_snapshot_id, id
+            """, (OPEN_INTERVAL_END, server_id))
+            pending = intervals.fetchone()
+            active: Dict[int, Dict[int, tuple]] = {}
+            closing: Dict[int, list] = {}
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS changed_items (item_id INTEGER PRIMARY KEY)")
+            previous_snapshot_id = None
+            written = 0
+            for snapshot_id, timestamp in snapshots:
+                changed = set()
+                for item_id, interval_id in closing.pop(previous_snapshot_id, ()):
+                    del active[item_id][interval_id]
+                    changed.add(item_id)
+                while pending is not None and pending['first_snapshot_id'] <= snapshot_id:
+                    if pending['last_snapshot_id'] >= snapshot_id:
+                        item_id = pending['item_id']
+                        active.setdefault(item_id, {})[pending['id']] = (
+                            pending['price_in_won'], pending['quantity'], pending['seller_id'])
+                        closing.setdefault(pending['last_snapshot_id'], []).append((item_id, pending['id']))
+                        changed.add(item_id)
+                    pending = intervals.fetchone()
+                
+                if snapshot_id > done_until:
+                    table = self._partition_for(cursor, 'item_snapshot_stats', timestamp)
+                    if previous_snapshot_id is not None:
+                        cursor.execute("DELETE FROM temp.changed_items")
+                        cursor.executemany("INSERT INTO temp.changed_items (item_id) VALUES (?)",
+                                           [(item_id,) for item_id in changed])
+                        cursor.execute(f"""
+                            INSERT OR REPLACE INTO {table} ({ITEM_STATS_COLUMNS})
+                            SELECT ?, item_id, server_id, offer_count, total_quantity, min_price, max_price,
+                                   sum_price, median_price, min_quantity, min_seller_id
+                            FROM item_snapshot_stats
+                            WHERE snapshot_id = ? AND item_id NOT IN (SELECT item_id FROM temp.changed_items)
+                        """, (snapshot_id, previous_snapshot_id))
+                    rows = []
+                    for item_id in changed:
+                        offers = active.get(item_id)
+                        if offers:
+                            # Kolejność jak przy zapisie: cena, a przy równych cenach kolejność zapisu
+                            ordered = [offers[interval_id] for interval_id in
+                                       sorted(offers, key=lambda interval_id: (offers[interval_id][0], interval_id))]
+                            rows.append((snapshot_id, item_id, server_id) + self._offer_stats(ordered))
+                    cursor.executemany(f"""
+                        INSERT OR REPLACE INTO {table} ({ITEM_STATS_COLUMNS})
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, rows)
+                    written += 1
+                    if written % 100 == 0:
+                        conn.commit()
+                previous_snapshot_id = snapshot_id
+            conn.commit()
+            total_written += written
+            logger.info(f"Uzupełniono statystyki przedmiotów serwera {server_id} ({written} snapshotów)")
+        return total_written
+    
+    @staticmethod
+    def _offer_stats(offers: List[tuple]) -> tuple:
+        """
+        Statystyki ofert jednego przedmiotu – wartości kolumn item_snapshot_stats od offer_count.
+        
+        Args:
+            offers: (cena, ilość, sprzedawca) posortowane po cenie, równe ceny w kolejności zapisu.
+                Mediana: środkowa cena (średnia dwóch środkowych przy parzystej liczbie ofert);
+                reprezentatywna oferta: pierwsza (najtańsza).
+        """
+        prices = [offer[0] for offer in offers]
+        n = len(prices)
+        median = prices[n // 2] if n % 2 else (prices[n // 2 - 1] + prices[n // 2]) / 2
+        return (n, sum(offer[1] for offer in offers), prices[0], prices[-1], sum(prices), median,
+                offers[0][1], offers[0][2])
+    
+    def _load_dictionary_cache(self, cursor):
+        """Wczytuje słowniki items/sellers do cache (raz, przy pierwszym zapisie)"""
+        if self._dictionary_loaded:
+            return
+        cursor.execute("SELECT id, name FROM items")
+        self._item_ids = {row['name']: row['id'] for row in cursor.fetchall()}
+        cursor.execute("SELECT id, name FROM sellers")
+        self._seller_ids = {row['name']: row['id'] for row in cursor.fetchall()}
+        self._dictionary_loaded = True
+    
+    def _intern(self, cursor, table: str, name: str, cache: Dict[str, int], pending: Dict[str, int]) -> int:
+        """
+        Zwraca id nazwy ze słownika (items lub sellers), dodając ją przy pierwszym wystąpieniu.
+        Nowe id trafiają do pending i do cache dopiero po commicie – wycofana transakcja
+        nie zostawia w cache id, którego nie ma w bazie.
+        """
+        name_id = cache.get(name)
+        if name_id is None:
+            name_id = pending.get(name)
+        if name_id is None:
+            cursor.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            if cursor.rowcount == 1:
+                name_id = cursor.lastrowid
+                if table == 'items' and self._item_search_fts:
+                    cursor.execute("INSERT INTO item_search (rowid, name_key) VALUES (?, ?)",
+                                   (name_id, fold_name(name)))
+            else:
+                cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+                name_id = cursor.fetchone()['id']
+            pending[name] = name_id
+        return name_id
+    
+    def _store_offer_diff(self, cursor, server_id: int, snapshot_id: int, timestamp: str,
+                          previous: Optional[tuple]) -> tuple[int, int]:
+        """
+        Zapisuje oferty snapshotu (temp.incoming_offers) w partycjach offer_intervals (_apply_offer_diff).
+        
+        Otwarte przedziały serwera są w partycji poprzedniego snapshotu. Gdy snapshot należy już do
+        następnego okresu, są tam zamykane na poprzednim snapshocie i otwierane ponownie (w tej samej
+        kolejności) w partycji bieżącego okresu – każda partycja zawiera tylko snapshoty swojego okresu,
+        więc retencja może ją usunąć w całości.
+        
+        Args:
+            previous: (id, timestamp) poprzedniego snapshotu serwera lub None
+        
+        Returns:
+            (liczba nowych przedziałów, liczba zamkniętych przedziałów)
+        """
+        previous_snapshot_id = previous[0] if previous else None
+        table = self._partition_for(cursor, 'offer_intervals', previous[1] if previous else timestamp)
+        opened, closed = self._apply_offer_diff(cursor, server_id, snapshot_id, previous_snapshot_id, table)
+        current = self._partition_for(cursor, 'offer_intervals', timestamp)
+        if current != table:
+            cursor.execute(f"""
+                INSERT INTO {current}
+                (server_id, item_id, price, price_in_won, currency, quantity, seller_id, first_snapshot_id)
+                SELECT server_id, item_id, price, price_in_won, currency, quantity, seller_id, ?
+                FROM {table}
+                WHERE server_id = ? AND last_snapshot_id IS NULL
+                ORDER BY id
+            """, (snapshot_id, server_id))
+            cursor.execute(f"""
+                DELETE FROM {table} WHERE server_id = ? AND last_snapshot_id IS NULL AND first_snapshot_id = ?
+            """, (server_id, snapshot_id))
+            cursor.execute(f"""
+                UPDATE {table} SET last_snapshot_id = ? WHERE server_id = ? AND last_snapshot_id IS NULL
+            """, (previous_snapshot_id, server_id))
+        return opened, closed
+    
+    def _apply_offer_diff(self, cursor, server_id: int, snapshot_id: int,
+                          previous_snapshot_id: Optional[int], table: str) -> tuple[int, int]:
+        """
+        Zapisuje snapshot (oferty w temp.incoming_offers) jako różnicę względem otwartych przedziałów serwera
+        w tabeli (partycji) table.
+        
+        Oferty porównywane są jako multizbiory: identyczne oferty (ten sam przedmiot, sprzedawca,
+        cena, ilość) numerowane są ROW_NUMBER() po obu stronach i parowane po (oferta, numer).
+        Otwarte przedziały bez pary są zamykane na poprzednim snapshocie, oferty bez pary
+        otwierają nowe przedziały od bieżącego snapshotu.
+        
+        Returns:
+            (liczba nowych przedziałów, liczba zamkniętych przedziałów)
+        """
+        key_columns = "item_id, seller_id, price_in_won, price, currency, quantity"
+        match = """
+            i.item_id = o.item_id AND i.seller_id = o.seller_id AND i.rn = o.rn
+            AND i.price_in_won = o.price_in_won AND i.price = o.price
+            AND i.currency = o.currency AND i.quantity = o.quantity
+        """
+        cursor.execute("DROP TABLE IF EXISTS temp.open_ranked")
+        cursor.execute("DROP TABLE IF EXISTS temp.incoming_ranked")
+        cursor.execute(f"""
+            CREATE TEMP TABLE open_ranked AS
+            SELECT id, {key_columns},
+                   ROW_NUMBER() OVER (PARTITION BY {key_columns} ORDER BY id) AS rn
+            FROM {table}
+            WHERE server_id = ? AND last_snapshot_id IS NULL
+        """, (server_id,))
+        cursor.execute(f"""
+            CREATE TEMP TABLE incoming_ranked AS
+            SELECT rowid AS pos, {key_columns},
+                   ROW_NUMBER() OVER (PARTITION BY {key_columns} ORDER BY rowid) AS rn
+            FROM temp.incoming_offers
+        """)
+        cursor.execute("CREATE INDEX temp.idx_open_ranked ON open_ranked(item_id, seller_id, rn)")
+        cursor.execute("CREATE INDEX temp.idx_incoming_ranked ON incoming_ranked(item_id, seller_id, rn)")
+        
+        closed = 0
+        if previous_snapshot_id is not None:
+            cursor.execute(f"""
+                UPDATE {table} SET last_snapshot_id = ?
+                WHERE id IN (
+                    SELECT o.id FROM open_ranked o
+                    WHERE NOT EXISTS (SELECT 1 FROM incoming_ranked i WHERE {match})
+                )
+            """, (previous_snapshot_id,))
+            closed = cursor.rowcount
+        
+        cursor.execute(f"""
+            INSERT INTO {table}
+            (server_id, item_id, price, price_in_won, currency, quantity, seller_id, first_snapshot_id)
+            SELECT ?, i.item_id, i.price, i.price_in_won, i.currency, i.quantity, i.seller_id, ?
+            FROM incoming_ranked i
+            WHERE NOT EXISTS (SELECT 1 FROM open_ranked o WHERE {match})
+            ORDER BY i.pos
+        """, (server_id, snapshot_id))
+        opened = cursor.rowcount
+        
+        cursor.execute("DROP TABLE temp.open_ranked")
+        cursor.execute("DROP TABLE temp.incoming_ranked")
+        return opened, closed
     
-    @contextmanager
-    def _get_connection(self):
-        """Context manager dla połączenia z bazą danych"""
-        # Używamy timeout i WAL mode dla lepszej obsługi równoległych operacji
-        conn = sqlite3.connect(self.db_path, timeout=30.0)  # 30 sekund timeout
+    def _connect(self, read_only: bool = True) -> sqlite3.Connection:
+        """
+        Otwiera nowe połączenie z bazą i ustawia PRAGMA (raz na połączenie).
+        read_only: połączenie puli czytelników (query_only); False – połączenie wątku zapisu.
+        """
+        # Używamy timeout i WAL mode dla lepszej obsługi równoległych operacji. Połączenie z puli bywa
+        # używane przez różne wątki (zawsze przez jeden naraz) – stąd check_same_thread=False.
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)  # 30 sekund timeout
         conn.row_factory = sqlite3.Row  # Umożliwia dostęp przez nazwy kolumn
+        # Normalizacja ilości w migracjach (INSERT ... SELECT parse_quantity(quantity))
+        conn.create_function('parse_quantity', 1, parse_quantity, deterministic=True)
+        # Czas ISO -> milisekundy epoki (migracja snapshots.timestamp_ms, początki przedziałów rollupów)
+        conn.create_function('epoch_ms', 1, epoch_ms, deterministic=True)
+        # Klucz wyszukiwania nazwy (indeks item_search, wyszukiwanie bez FTS5)
+        conn.create_function('fold_name', 1, fold_name, deterministic=True)
         
-        # Włączamy WAL mode (Write-Ahead Logging) dla lepszej obsługi równoległych operacji
-        try:
-            conn.execute("PRAGMA journal_mode=WAL")
-        except Exception as e:
-            logger.warning(f"Nie udało się włączyć WAL mode: {e}")
+        # Włączamy WAL mode (Write-Ahead Logging): czytelnicy nie blokują zapisu i odwrotnie.
+        # Tryb jest zapisany w pliku bazy – ustawia go połączenie zapisu.
+        if not read_only:
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except Exception as e:
+                logger.warning(f"Nie udało się włączyć WAL mode: {e}")
         
-        # Optymalizacje (cache: -64000=64MB, -4096=4MB dla LOW_MEMORY)
+        # Optymalizacje (cache: -64000=64MB, -4096=4MB dla LOW_MEMORY; mmap: odczyt stron bez kopiowania)
         try:
             conn.execute("PRAGMA synchronous=NORMAL")
             cache_kb = int(os.environ.get('SQLITE_CACHE_KB', '-64000'))
             conn.execute("PRAGMA cache_size=%d" % cache_kb)
             conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=%d" % int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))))
+            if read_only:
+                conn.execute("PRAGMA query_only=ON")
+            else:
+                # Checkpoint WAL wykonuje tylko połączenie zapisu (czytelnicy nie zatwierdzają transakcji)
+                conn.execute("PRAGMA wal_autocheckpoint=%d" % int(os.environ.get('SQLITE_WAL_AUTOCHECKPOINT', '1000')))
         except Exception as e:
             logger.warning(f"Nie udało się ustawić PRAGMA: {e}")
         
+        if read_only:
+            with self._pool_lock:
+                self._pool_stats['created'] += 1
+        return conn
+    
+    def _submit_write(self, func, *args):
+        """
+        Wykonuje func(conn, *args) w wątku zapisu (kolejka – zapisy po kolei) i czeka na wynik;
+        wyjątek z func jest rzucany tutaj. Wywołanie z wątku zapisu (zapis w trakcie zapisu)
+        wykonuje się od razu na jego połączeniu.
+        """
+        writer_conn = getattr(self._writer_local, 'conn', None)
+        if writer_conn is not None:
+            return func(writer_conn, *args)
+        
+        future = Future()
+        with self._writer_lock:
+            if self._writer_thread is None or not self._writer_thread.is_alive():
+                conn = self._connect(read_only=False)
+                self._writer_thread = threading.Thread(target=self._writer_loop, args=(conn,),
+                                                       name='db-writer', daemon=True)
+                self._writer_thread.start()
+            self._write_queue.put((future, func, args))
+        return future.result()
+    
+    def _writer_loop(self, conn: sqlite3.Connection):
+        """Wątek zapisu: wykonuje zadania z kolejki do sygnału zakończenia (None) i zamyka połączenie"""
+        self._writer_local.conn = conn
+        idle_timeout = self._wal_idle_checkpoint_sec if self._wal_idle_checkpoint_sec > 0 else None
         try:
-            yield conn
+            while True:
+                try:
+                    task = self._write_queue.get(timeout=idle_timeout)
+                except queue.Empty:
+                    # Przerwa w zapisach: TRUNCATE zeruje plik WAL (czytelnicy nie przeglądają długiego WAL)
+                    if self._wal_dirty:
+                        self._wal_dirty = not self._checkpoint_wal(conn, 'TRUNCATE')
+                    continue
+                if task is None:
+                    break
+                future, func, args = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._wal_dirty = True
+                try:
+                    future.set_result(func(conn, *args))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    if conn.in_transaction:
+                        try:
+                            conn.rollback()
+                        except sqlite3.Error as e:
+                            logger.warning(f"Nie udało się wycofać transakcji zapisu: {e}")
         finally:
+            self._writer_local.conn = None
+            self._close_quietly(conn)
+    
+    def _checkout_connection(self) -> sqlite3.Connection:
+        """
+        Bierze bezczynne połączenie z puli (po dłuższej bezczynności sprawdzane SELECT 1) albo otwiera
+        nowe, gdy otwartych jest mniej niż SQLITE_POOL_SIZE; inaczej czeka na zwrot połączenia.
+        Po close() pula nie ogranicza – połączenia są na jedno użycie.
+        
+        Raises:
+            sqlite3.OperationalError: brak wolnego połączenia po SQLITE_POOL_TIMEOUT_SEC s
+        """
+        deadline = time.monotonic() + self._pool_timeout_sec
+        waited = False
+        while True:
+            conn = None
+            with self._pool_available:
+                stats = self._pool_stats
+                while not self._pool and stats['open'] >= self._pool_size and not self._pool_closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stats['timeouts'] += 1
+                        raise sqlite3.OperationalError(
+                            f"Brak wolnego połączenia z bazą ({self._pool_size} w użyciu) "
+                            f"po {self._pool_timeout_sec:g} s")
+                    if not waited:
+                        waited = True
+                        stats['waits'] += 1
+                    self._pool_available.wait(remaining)
+                if self._pool:
+                    conn, returned_at = self._pool.pop()
+                else:
+                    # Miejsce zarezerwowane przed otwarciem (poza blokadą)
+                    stats['open'] += 1
+                    stats['max_open'] = max(stats['max_open'], stats['open'])
+            
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._pool_available:
+                        self._pool_stats['open'] -= 1
+                        self._pool_available.notify()
+                    raise
+                with self._pool_lock:
+                    self._pool_stats['in_use'] += 1
+                return conn
+            
+            if time.monotonic() - returned_at >= self._pool_health_check_sec:
+                try:
+                    conn.execute("SELECT 1").fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Połączenie z puli nie odpowiada ({e}) – otwieranie nowego")
+                    with self._pool_lock:
+                        self._pool_stats['health_check_failures'] += 1
+                    self._discard_connection(conn)
+                    continue
+            with self._pool_lock:
+                self._pool_stats['reused'] += 1
+                self._pool_stats['in_use'] += 1
+            return conn
+    
+    def _discard_connection(self, conn: sqlite3.Connection):
+        """Zamyka połączenie czytelnika spoza puli i zwalnia jego miejsce dla czekających"""
+        with self._pool_available:
+            self._pool_stats['open'] -= 1
+            self._pool_stats['discarded'] += 1
+            self._pool_available.notify()
+        self._close_quietly(conn)
+    
+    def _return_connection(self, conn: sqlite3.Connection):
+        """Zwraca połączenie do puli; niezatwierdzona transakcja jest wycofywana (jak przy zamknięciu)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Nie udało się wycofać transakcji połączenia z puli: {e}")
+            with self._pool_lock:
+                self._pool_stats['in_use'] -= 1
+            self._discard_connection(conn)
+            return
+        
+        with self._pool_available:
+            self._pool_stats['in_use'] -= 1
+            if not self._pool_closed:
+                self._pool.append((conn, time.monotonic()))
+                self._pool_available.notify()
+                return
+        self._discard_connection(conn)
+    
+    def _checkpoint_wal(self, conn: sqlite3.Connection, mode: str) -> bool:
+        """
+        Checkpoint WAL na połączeniu zapisu (mode: PASSIVE lub TRUNCATE) i zapis metryk.
+        TRUNCATE czeka na czytelników najwyżej SQLITE_WAL_CHECKPOINT_BUSY_MS (domyślnie 200 ms),
+        żeby nie wstrzymywać kolejki zapisów.
+        
+        Returns:
+            True, jeśli cały WAL został przeniesiony do bazy (nie przerwany przez czytelników)
+        """
+        started = time.perf_counter()
+        try:
+            if mode == 'TRUNCATE':
+                conn.execute("PRAGMA busy_timeout=%d" % int(os.environ.get('SQLITE_WAL_CHECKPOINT_BUSY_MS', '200')))
+            try:
+                busy, log_frames, checkpointed_frames = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            finally:
+                if mode == 'TRUNCATE':
+                    conn.execute("PRAGMA busy_timeout=30000")
+        except sqlite3.Error as e:
+            logger.warning(f"Checkpoint WAL ({mode}) nie powiódł się: {e}")
+            return False
+        
+        duration_ms = (time.perf_counter() - started) * 1000
+        stats = self._wal_stats
+        stats['checkpoints'] += 1
+        stats['busy'] += 1 if busy else 0
+        stats['last_mode'] = mode
+        stats['last_at'] = datetime.now().isoformat()
+        stats['last_duration_ms'] = round(duration_ms, 2)
+        stats['max_duration_ms'] = round(max(stats['max_duration_ms'], duration_ms), 2)
+        stats['last_log_frames'] = log_frames
+        stats['last_checkpointed_frames'] = checkpointed_frames
+        if duration_ms > 1000:
+            logger.warning(f"Checkpoint WAL ({mode}) trwał {duration_ms:.0f} ms ({checkpointed_frames}/{log_frames} stron)")
+        return not busy and checkpointed_frames == log_frames
+    
+    def get_wal_stats(self) -> Dict:
+        """Metryki WAL: rozmiar pliku -wal, liczba i czas checkpointów, wynik ostatniego (strony w WAL/przeniesione)"""
+        stats = dict(self._wal_stats)
+        try:
+            stats['wal_size_bytes'] = os.path.getsize(f"{self.db_path}-wal")
+        except OSError:
+            stats['wal_size_bytes'] = 0
+        stats['pending_changes'] = self._wal_dirty
+        stats['idle_checkpoint_sec'] = self._wal_idle_checkpoint_sec
+        return stats
+    
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection):
+        try:
             conn.close()
+        except sqlite3.Error:
+            pass
+    
+    @contextmanager
+    def _get_connection(self):
+        """Context manager dla połączenia z bazą danych (z puli połączeń)"""
+        conn = self._checkout_connection()
+        try:
+            yield conn
+        finally:
+            self._return_connection(conn)
+    
+    def get_pool_stats(self) -> Dict:
+        """
+        Statystyki puli połączeń: utworzone, ponownie użyte, odrzucone, nieudane sprawdzenia, w użyciu,
+        bezczynne, otwarte teraz (open) i najwięcej naraz (max_open), oczekiwania na połączenie (waits, timeouts)
+        """
+        with self._pool_lock:
+            stats = dict(self._pool_stats)
+            stats['idle'] = len(self._pool)
+            stats['pool_size'] = self._pool_size
+            stats['closed'] = self._pool_closed
+        stats['write_queue'] = self._write_queue.qsize()
+        return stats
+    
+    def close(self):
+        """
+        Kończy wątek zapisu (po wykonaniu zadań z kolejki) i zamyka bezczynne połączenia puli;
+        połączenia w użyciu są zamykane przy zwrocie. Po close() kolejne wywołania nadal działają,
+        ale czytelnicy otwierają połączenie na jedno użycie (zapis uruchamia nowy wątek zapisu).
+        """
+        with self._writer_lock:
+            writer = self._writer_thread
+            if writer is not None and writer.is_alive():
+                self._write_queue.put(None)
+            self._writer_thread = None
+        if writer is not None:
+            writer.join(timeout=60)
+        
+        with self._pool_available:
+            self._pool_closed = True
+            idle = [conn for conn, _ in self._pool]
+            self._pool.clear()
+            self._pool_stats['open'] -= len(idle)
+            # Czekający na połączenie otwierają je teraz bez limitu (pula zamknięta)
+            self._pool_available.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+        logger.info(f"Zamknięto pulę połączeń z bazą ({len(idle)} bezczynnych)")
     
-    def add_price_data(self, items: List[Dict], server_id: int):
+    def add_price_data(self, items: Iterable[Dict], server_id: int) -> int:
         """
         Dodaje nowe dane cenowe do bazy danych używając struktury snapshotów
         
+        Oferty są czytane porcjami (BATCH_INSERT_SIZE) prosto do executemany, więc można
+        przekazać generator (np. Metin2DataFetcher.iter_upgrade_items) – w pamięci jest
+        tylko bieżąca porcja, niezależnie od liczby ofert.
+        
+        Porcje trafiają do tabeli tymczasowej, a do offer_intervals zapisywana jest tylko różnica
+        względem poprzedniego snapshotu (nowe i znikające oferty) – patrz _apply_offer_diff.
+        
+        Zapis wykonuje wątek zapisu (_submit_write) na własnym połączeniu – zapisy nie konkurują
+        o blokadę bazy, więc nie ma ponowień po "database is locked".
+        
         Args:
-            items: Lista przedmiotów z danymi cenowymi
+            items: Lista lub iterator przedmiotów z danymi cenowymi
             server_id: ID serwera (np. 426, 702)
+        
+        Returns:
+            Liczba zapisanych ofert
         """
-        timestamp = datetime.now().isoformat()
+        return self._submit_write(self._add_price_data, items, server_id)
+    
+    def _add_price_data(self, conn, items: Iterable[Dict], server_id: int) -> int:
+        """Zapis snapshotu (add_price_data) na połączeniu wątku zapisu"""
+        now = datetime.now()
+        timestamp = now.isoformat()
+        timestamp_ms = int(now.timestamp() * 1000)
         added_count = 0
         batch_size = int(os.environ.get('BATCH_INSERT_SIZE', '5000'))  # Dla małego RAM (384 MB): 3000
         batch_size = max(1000, min(batch_size, 50000))
         
-        max_retries = 5
-        retry_delay = 0.1
+        items_iter = iter(items)
+        first_item = next(items_iter, None)
+        if first_item is None:
+            logger.warning(f"Brak ofert do zapisu dla serwera {server_id} – pomijanie snapshotu")
+            return 0
         
-        for attempt in range(max_retries):
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO snapshots (server_id, timestamp) VALUES (?, ?)
-                    """, (server_id, timestamp))
-                    snapshot_id = cursor.lastrowid
-                    if snapshot_id == 0:
-                        cursor.execute("SELECT id FROM snapshots WHERE server_id = ? AND timestamp = ?", (server_id, timestamp))
-                        result = cursor.fetchone()
-                        if result:
-                            snapshot_id = result['id']
-                        else:
-                            logger.error("Nie udało się utworzyć/pobrać snapshot")
-                            return
-                    
-                    YANG_TO_WON = 100000000
-                    skip_legacy = os.environ.get('SKIP_PRICE_HISTORY_TABLE', '').lower() in ('1', 'true', 'yes')
-                    for start in range(0, len(items), batch_size):
-                        chunk = items[start:start + batch_size]
-                        offers_data = []
-                        history_data = [] if not skip_legacy else []
-                        for item in chunk:
-                            # Łączna cena w won: yang (100M yang = 1 won) + won. Zapis do 5 miejsc po przecinku.
-                            yang = item.get('yang', '').replace(',', '').replace('.', '').strip()
-                            won_raw = item.get('won', '')
-                            won_str = str(won_raw).strip().replace(',', '.') if won_raw not in (None, '') else ''
-                            yang_int = int(yang) if (yang and yang.isdigit()) else 0
-                            won_value = 0.0
-                            if won_str:
-                                try:
-                                    parsed = float(won_str)
-                                    if parsed >= 0:
-                                        won_value = parsed
-                                except (ValueError, TypeError):
-                                    pass
-                            # Yang w won: API może zwracać dwie skale – jedna reguła, bez „lepów”.
-                            # 1) yang >= 1M: pełne yang (100M yang = 1 won) → dziel przez 100M
-                            # 2) yang 1..999999: skala „won×100” (np. 127 = 1,27w) → dziel przez 100
-                            if yang_int >= 1_000_000:
-                                yang_in_won = yang_int / YANG_TO_WON
-                            elif yang_int > 0:
-                                yang_in_won = yang_int / 100.0
-                            else:
-                                yang_in_won = 0.0
-                            price_in_won = round(yang_in_won + won_value, 5)
-                            if price_in_won > 0:
-                                price = price_in_won
-                                currency = 'won'
-                                offers_data.append((
-                                    snapshot_id, server_id, item.get('name', 'Unknown'),
-                                    price, price_in_won, currency, item.get('quantity', ''), item.get('seller', '')
-                                ))
-                                if not skip_legacy:
-                                    history_data.append((
-                                        timestamp, item.get('name', 'Unknown'),
-                                        price, price_in_won, currency, item.get('quantity', ''), item.get('seller', '')
-                                    ))
-                        if offers_data:
-                            cursor.executemany("""
-                                INSERT INTO offers 
-                                (snapshot_id, server_id, item_name, price, price_in_won, currency, quantity, seller)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """, offers_data)
-                            added_count += len(offers_data)
-                        if history_data:
-                            cursor.executemany("""
-                                INSERT INTO price_history 
-                                (timestamp, item_name, price, price_in_won, currency, quantity, seller)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                            """, history_data)
-                    
-                    conn.commit()
-                    break
-                    
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    logger.warning(f"Database locked, próba {attempt + 1}/{max_retries}, czekam {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR IGNORE INTO snapshots (server_id, timestamp, timestamp_ms, last_seen_at) VALUES (?, ?, ?, ?)
+            """, (server_id, timestamp, timestamp_ms, timestamp))
+            snapshot_id = cursor.lastrowid
+            if snapshot_id == 0:
+                cursor.execute("SELECT id FROM snapshots WHERE server_id = ? AND timestamp = ?", (server_id, timestamp))
+                result = cursor.fetchone()
+                if result:
+                    snapshot_id = result['id']
                 else:
-                    logger.error(f"Błąd podczas dodawania danych do bazy: {e}", exc_info=True)
-                    raise
-            except Exception as e:
-                logger.error(f"Nieoczekiwany błąd podczas dodawania danych: {e}", exc_info=True)
-                raise
+                    logger.error("Nie udało się utworzyć/pobrać snapshot")
+                    return 0
+            # Poprzedni snapshot serwera – na nim zamykane są przedziały ofert, które zniknęły
+            cursor.execute(
+                "SELECT id, timestamp FROM snapshots WHERE server_id = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                (server_id, snapshot_id),
+            )
+            previous = cursor.fetchone()
+            previous = tuple(previous) if previous else None
+            self._create_incoming_table(cursor)
+            cursor.execute("DELETE FROM temp.incoming_offers")
+            # Nazwy -> id słowników; nowe id trafiają do cache dopiero po commicie
+            self._load_dictionary_cache(cursor)
+            new_item_ids: Dict[str, int] = {}
+            new_seller_ids: Dict[str, int] = {}
+            
+            YANG_TO_WON = 100000000
+            skip_legacy = os.environ.get('SKIP_PRICE_HISTORY_TABLE', '').lower() in ('1', 'true', 'yes')
+            history_table = self._partition_for(cursor, 'price_history', timestamp) if not skip_legacy else None
+            pending = chain((first_item,), items_iter)
+            while True:
+                chunk = list(islice(pending, batch_size))
+                if not chunk:
+                    break
+                offers_data = []
+                history_data = []
+                for item in chunk:
+                    # Łączna cena w won: yang (100M yang = 1 won) + won. Zapis do 5 miejsc po przecinku.
+                    yang = item.get('yang', '').replace(',', '').replace('.', '').strip()
+                    won_raw = item.get('won', '')
+                    won_str = str(won_raw).strip().replace(',', '.') if won_raw not in (None, '') else ''
+                    yang_int = int(yang) if (yang and yang.isdigit()) else 0
+                    won_value = 0.0
+                    if won_str:
+                        try:
+                            parsed = float(won_str)
+                            if parsed >= 0:
+                                won_value = parsed
+                        except (ValueError, TypeError):
+                            pass
+                    # Yang w won: API może zwracać dwie skale – jedna reguła, bez „lepów”.
+                    # 1) yang >= 1M: pełne yang (100M yang = 1 won) → dziel przez 100M
+                    # 2) yang 1..999999: skala „won×100” (np. 127 = 1,27w) → dziel przez 100
+                    if yang_int >= 1_000_000:
+                        yang_in_won = yang_int / YANG_TO_WON
+                    elif yang_int > 0:
+                        yang_in_won = yang_int / 100.0
+                    else:
+                        yang_in_won = 0.0
+                    price_in_won = round(yang_in_won + won_value, 5)
+                    if price_in_won > 0:
+                        price = price_in_won
+                        currency = 'won'
+                        offers_data.append((
+                            self._intern(cursor, 'items', item.get('name', 'Unknown'),
+                                         self._item_ids, new_item_ids),
+                            price, price_in_won, currency, parse_quantity(item.get('quantity', '')),
+                            self._intern(cursor, 'sellers', item.get('seller', ''),
+                                         self._seller_ids, new_seller_ids)
+                        ))
+                        if not skip_legacy:
+                            history_data.append((
+                                timestamp, item.get('name', 'Unknown'),
+                                price, price_in_won, currency, item.get('quantity', ''), item.get('seller', '')
+                            ))
+                if offers_data:
+                    cursor.executemany("""
+                        INSERT INTO temp.incoming_offers
+                        (item_id, price, price_in_won, currency, quantity, seller_id)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, offers_data)
+                    added_count += len(offers_data)
+                if history_data:
+                    cursor.executemany(f"""
+                        INSERT INTO {history_table}
+                        (timestamp, item_name, price, price_in_won, currency, quantity, seller)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, history_data)
+            
+            opened, closed = self._store_offer_diff(cursor, server_id, snapshot_id, timestamp, previous)
+            self._write_item_snapshot_stats(cursor, server_id, snapshot_id)
+            # Wskaźnik najnowszego snapshotu w tej samej transakcji (nie cofa się przy starszym timestamp)
+            cursor.execute("""
+                INSERT INTO latest_snapshots (server_id, snapshot_id, timestamp, timestamp_ms) VALUES (?, ?, ?, ?)
+                ON CONFLICT(server_id) DO UPDATE SET
+                    snapshot_id = excluded.snapshot_id, timestamp = excluded.timestamp, timestamp_ms = excluded.timestamp_ms
+                WHERE excluded.timestamp_ms >= latest_snapshots.timestamp_ms
+            """, (server_id, snapshot_id, timestamp, timestamp_ms))
+            cursor.execute("SELECT snapshot_id, timestamp, timestamp_ms FROM latest_snapshots WHERE server_id = ?",
+                           (server_id,))
+            latest = tuple(cursor.fetchone())
+            conn.commit()
+            self._item_ids.update(new_item_ids)
+            self._seller_ids.update(new_seller_ids)
+            self._latest_snapshots[server_id] = latest
+            # Przeniesienie stron snapshotu z WAL do bazy bez czekania na czytelników
+            self._checkpoint_wal(conn, 'PASSIVE')
+            logger.info(f"Snapshot serwera {server_id}: {opened} nowych ofert, {closed} zniknęło, "
+                        f"{added_count - opened} bez zmian")
+        except Exception as e:
+            logger.error(f"Błąd podczas dodawania danych do bazy: {e}", exc_info=True)
+            raise
         
         logger.info(f"Dodano {added_count} ofert do snapshotu {timestamp}")
+        return added_count
+    
+    def touch_latest_snapshot(self, server_id: int) -> bool:
+        """
+        Oznacza najnowszy snapshot serwera jako nadal aktualny (last_seen_at = teraz).
+        Używane zamiast zapisu nowego snapshotu, gdy pobrane dane są identyczne z poprzednimi.
+        
+        Args:
+            server_id: ID serwera (np. 426, 702)
+        
+        Returns:
+            True jeśli zaktualizowano snapshot, False jeśli serwer nie ma jeszcze snapshotów
+        """
+        return self._submit_write(self._touch_latest_snapshot, server_id)
+    
+    def _touch_latest_snapshot(self, conn, server_id: int) -> bool:
+        last_seen_at = datetime.now().isoformat()
+        cursor = conn.cursor()
+        latest = self._latest_snapshot(cursor, server_id)
+        if latest is None:
+            return False
+        cursor.execute("UPDATE snapshots SET last_seen_at = ? WHERE id = ?", (last_seen_at, latest[0]))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        return updated
     
     def get_all_history(self) -> List[Dict]:
         """Zwraca całą historię cen"""
@@ -372,104 +1865,137 @@ class Database:
             limit: Maksymalna liczba wpisów do zwrócenia (None = wszystkie)
             days: Liczba ostatnich dni do pobrania (None = wszystkie)
         """
-        # Retry logic dla operacji odczytu
-        max_retries = 3
-        retry_delay = 0.05
-        
-        for attempt in range(max_retries):
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    
-                    # OPTYMALIZACJA: Używamy dokładnego dopasowania zamiast LIKE dla lepszej wydajności
-                    # Najpierw próbujemy dokładnego dopasowania
-                    exact_match = item_name.strip()
-                    
-                    # OPTYMALIZACJA: Pobieramy tylko unikalne snapshots dla danego przedmiotu i serwera
-                    # Używamy dokładnego dopasowania (szybsze niż LIKE)
-                    snapshot_query = """
-                        SELECT DISTINCT s.timestamp, s.id
-                        FROM snapshots s
-                        INNER JOIN offers o ON s.id = o.snapshot_id
-                        WHERE o.item_name = ?
-                        AND o.server_id = ?
-                        AND o.price_in_won > 0
-                    """
-                    snapshot_params = [exact_match, server_id]
-                    
-                    # Dodajemy filtr daty jeśli podano
-                    if days:
-                        from datetime import timedelta
-                        cutoff_date = datetime.now() - timedelta(days=days)
-                        cutoff_timestamp = cutoff_date.isoformat()
-                        snapshot_query += " AND s.timestamp >= ?"
-                        snapshot_params.append(cutoff_timestamp)
-                    
-                    snapshot_query += " ORDER BY s.timestamp DESC"
-                    
-                    # Dodajemy limit jeśli podano (limitujemy liczbę snapshotów)
-                    if limit:
-                        # Limit snapshotów - mniej danych do przetworzenia
-                        max_snapshots = min(limit // 10, 500) if limit else 500  # ~10 ofert na snapshot
-                        snapshot_query += " LIMIT ?"
-                        snapshot_params.append(max_snapshots if max_snapshots > 0 else 500)
-                    else:
-                        # Domyślnie limit 500 snapshotów dla wydajności
-                        snapshot_query += " LIMIT ?"
-                        snapshot_params.append(500)
-                    
-                    cursor.execute(snapshot_query, snapshot_params)
-                    snapshots = cursor.fetchall()
-                    
-                    if not snapshots:
-                        return []
-                    
-                    # Pobieramy oferty tylko dla wybranych snapshotów
-                    snapshot_ids = [s['id'] for s in snapshots]
-                    placeholders = ','.join(['?'] * len(snapshot_ids))
-                    
-                    query = f"""
-                        SELECT s.timestamp, o.item_name, o.price, o.price_in_won, o.currency, o.quantity, o.seller
-                        FROM offers o
-                        INNER JOIN snapshots s ON o.snapshot_id = s.id
-                        WHERE o.snapshot_id IN ({placeholders})
-                        AND o.item_name = ?
-                        AND o.server_id = ?
-                        AND o.price_in_won > 0
-                        ORDER BY s.timestamp ASC, o.id ASC
-                    """
-                    params = snapshot_ids + [exact_match, server_id]
-                    
-                    # Dodajemy limit na oferty jeśli podano
-                    if limit:
-                        query += " LIMIT ?"
-                        params.append(limit)
-                    
-                    cursor.execute(query, params)
-                    rows = cursor.fetchall()
-                    # Jawnie float(price_in_won), żeby JSON nie zwracał 1 zamiast 1.47
-                    result = []
-                    for row in rows:
-                        d = dict(row)
-                        if d.get('price_in_won') is not None:
-                            d['price_in_won'] = float(d['price_in_won'])
-                        result.append(d)
-                    
-                    return result
-                    
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    logger.warning(f"Database locked podczas odczytu historii, próba {attempt + 1}/{max_retries}, czekam {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # OPTYMALIZACJA: Używamy dokładnego dopasowania zamiast LIKE dla lepszej wydajności
+                # Najpierw próbujemy dokładnego dopasowania
+                exact_match = item_name.strip()
+                
+                # Zakres dat: tylko partycje przedziałów z okresu od granicy
+                cutoff = None
+                if days:
+                    from datetime import timedelta
+                    cutoff = datetime.now() - timedelta(days=days)
+                intervals = self._partition_source(cursor, 'offer_intervals', cutoff.isoformat() if cutoff else None)
+                
+                # OPTYMALIZACJA: Pobieramy tylko unikalne snapshots dla danego przedmiotu i serwera
+                # Używamy dokładnego dopasowania (szybsze niż LIKE)
+                # Snapshot zawiera przedmiot, jeśli mieści się w przedziale którejś z jego ofert
+                snapshot_query = f"""
+                    SELECT DISTINCT s.timestamp_ms, s.id
+                    FROM {intervals} o
+                    CROSS JOIN snapshots s
+                    WHERE o.item_id = (SELECT id FROM items WHERE name = ?)
+                    AND o.server_id = ?
+                    AND o.price_in_won > 0
+                    AND s.server_id = o.server_id
+                    AND s.id BETWEEN o.first_snapshot_id AND COALESCE(o.last_snapshot_id, ?)
+                """
+                snapshot_params = [exact_match, server_id, OPEN_INTERVAL_END]
+                
+                # Dodajemy filtr daty jeśli podano
+                if cutoff:
+                    snapshot_query += " AND s.timestamp_ms >= ?"
+                    snapshot_params.append(int(cutoff.timestamp() * 1000))
+                
+                snapshot_query += " ORDER BY s.timestamp_ms DESC"
+                
+                # Dodajemy limit jeśli podano (limitujemy liczbę snapshotów)
+                if limit:
+                    # Limit snapshotów - mniej danych do przetworzenia
+                    max_snapshots = min(limit // 10, 500) if limit else 500  # ~10 ofert na snapshot
+                    snapshot_query += " LIMIT ?"
+                    snapshot_params.append(max_snapshots if max_snapshots > 0 else 500)
                 else:
-                    logger.error(f"Błąd podczas pobierania historii przedmiotu: {e}", exc_info=True)
+                    # Domyślnie limit 500 snapshotów dla wydajności
+                    snapshot_query += " LIMIT ?"
+                    snapshot_params.append(500)
+                
+                cursor.execute(snapshot_query, snapshot_params)
+                snapshots = cursor.fetchall()
+                
+                if not snapshots:
                     return []
-            except Exception as e:
-                logger.error(f"Nieoczekiwany błąd podczas pobierania historii: {e}", exc_info=True)
-                return []
+                
+                # Pobieramy oferty tylko dla wybranych snapshotów
+                snapshot_ids = [s['id'] for s in snapshots]
+                placeholders = ','.join(['?'] * len(snapshot_ids))
+                
+                # Odtwarzamy oferty tych snapshotów z przedziałów (oferta × snapshoty w jej przedziale)
+                query = f"""
+                    SELECT s.timestamp, s.timestamp_ms, it.name AS item_name, o.price, o.price_in_won, o.currency,
+                           o.quantity, se.name AS seller
+                    FROM {intervals} o
+                    CROSS JOIN snapshots s
+                    JOIN items it ON it.id = o.item_id
+                    JOIN sellers se ON se.id = o.seller_id
+                    WHERE s.id IN ({placeholders})
+                    AND o.item_id = (SELECT id FROM items WHERE name = ?)
+                    AND o.server_id = ?
+                    AND o.price_in_won > 0
+                    AND s.server_id = o.server_id
+                    AND s.id BETWEEN o.first_snapshot_id AND COALESCE(o.last_snapshot_id, ?)
+                    ORDER BY s.timestamp_ms ASC, o.id ASC
+                """
+                params = snapshot_ids + [exact_match, server_id, OPEN_INTERVAL_END]
+                
+                # Dodajemy limit na oferty jeśli podano
+                if limit:
+                    query += " LIMIT ?"
+                    params.append(limit)
+                
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                # Jawnie float(price_in_won), żeby JSON nie zwracał 1 zamiast 1.47
+                result = []
+                for row in rows:
+                    d = dict(row)
+                    if d.get('price_in_won') is not None:
+                        d['price_in_won'] = float(d['price_in_won'])
+                    result.append(d)
+                
+                return result
+        
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania historii przedmiotu: {e}", exc_info=True)
+            return []
+        except Exception as e:
+            logger.error(f"Nieoczekiwany błąd podczas pobierania historii: {e}", exc_info=True)
+            return []
+    
+    def _latest_snapshot(self, cursor, server_id: int) -> Optional[tuple]:
+        """
+        Najnowszy snapshot serwera (snapshot_id, timestamp, timestamp_ms) z kopii w pamięci, a przy
+        jej braku z latest_snapshots. None: serwer nie ma snapshotów.
+        """
+        latest = self._latest_snapshots.get(server_id)
+        if latest is None:
+            cursor.execute("SELECT snapshot_id, timestamp, timestamp_ms FROM latest_snapshots WHERE server_id = ?",
+                           (server_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            # Wartość ustawiona w międzyczasie przez wątek zapisu (po commicie) ma pierwszeństwo
+            latest = self._latest_snapshots.setdefault(server_id, tuple(row))
+        return latest
+    
+    def get_latest_snapshot(self, server_id: int) -> Optional[Dict]:
+        """
+        Zwraca najnowszy snapshot serwera (snapshot_id, timestamp, timestamp_ms) lub None, zwykle
+        bez zapytania do bazy. Zmiana snapshot_id oznacza nowe dane – sygnał unieważnienia cache odpowiedzi.
         
-        return []
+        Args:
+            server_id: ID serwera (np. 426, 702)
+        """
+        latest = self._latest_snapshots.get(server_id)
+        if latest is None:
+            with self._get_connection() as conn:
+                latest = self._latest_snapshot(conn.cursor(), server_id)
+        if latest is None:
+            return None
+        return {'snapshot_id': latest[0], 'timestamp': latest[1], 'timestamp_ms': latest[2]}
     
     def get_latest_snapshot_offers_raw(self, server_id: int) -> tuple[List[Dict], Optional[str]]:
         """
@@ -481,21 +2007,19 @@ class Database:
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, timestamp FROM snapshots WHERE server_id = ? ORDER BY timestamp DESC LIMIT 1",
-                (server_id,),
-            )
-            row = cursor.fetchone()
-            if not row:
+            latest = self._latest_snapshot(cursor, server_id)
+            if latest is None:
                 return [], None
-            snapshot_id = row['id']
-            snapshot_timestamp = row['timestamp']
+            snapshot_timestamp = latest[1]
+            # Oferty najnowszego snapshotu = otwarte przedziały serwera
             cursor.execute("""
-                SELECT o.item_name, o.price_in_won, o.quantity, o.seller, s.timestamp
-                FROM offers o
-                INNER JOIN snapshots s ON o.snapshot_id = s.id
-                WHERE o.snapshot_id = ? AND o.server_id = ? AND o.price_in_won > 0
-            """, (snapshot_id, server_id))
+                SELECT it.name AS item_name, o.price_in_won, o.quantity, se.name AS seller, ? AS timestamp
+                FROM offer_intervals o
+                JOIN items it ON it.id = o.item_id
+                JOIN sellers se ON se.id = o.seller_id
+                WHERE o.server_id = ? AND o.last_snapshot_id IS NULL AND o.price_in_won > 0
+                ORDER BY o.id
+            """, (snapshot_timestamp, server_id))
             offers = []
             for r in cursor.fetchall():
                 d = dict(r)
@@ -506,7 +2030,7 @@ class Database:
     
     def get_latest_data(self, server_id: int) -> tuple[List[Dict], int]:
         """
-        Zwraca najnowsze dane dla wszystkich przedmiotów używając zoptymalizowanej struktury snapshotów
+        Zwraca najnowsze dane dla wszystkich przedmiotów (jeden wiersz item_snapshot_stats na przedmiot)
         
         Args:
             server_id: ID serwera (np. 426, 702)
@@ -514,157 +2038,52 @@ class Database:
         Returns:
             Tuple: (lista najnowszych wpisów po przedmiocie, łączna ilość dostępnych sztuk)
         """
-        # Retry logic dla operacji odczytu
-        max_retries = 3
-        retry_delay = 0.05
-        
-        for attempt in range(max_retries):
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    
-                    # OPTYMALIZACJA: Pobieramy najnowszy snapshot dla danego serwera
-                    cursor.execute("SELECT id, timestamp FROM snapshots WHERE server_id = ? ORDER BY timestamp DESC LIMIT 1", (server_id,))
-                    snapshot_result = cursor.fetchone()
-                    
-                    if not snapshot_result:
-                        return [], 0
-                    
-                    snapshot_id = snapshot_result['id']
-                    latest_timestamp = snapshot_result['timestamp']
-                    
-                    # Pobieramy wszystkie oferty z najnowszego snapshot dla danego serwera
-                    cursor.execute("""
-                        SELECT s.timestamp, o.item_name, o.price, o.price_in_won, o.currency, o.quantity, o.seller
-                        FROM offers o
-                        INNER JOIN snapshots s ON o.snapshot_id = s.id
-                        WHERE o.snapshot_id = ? AND o.server_id = ? AND o.price_in_won > 0
-                    """, (snapshot_id, server_id))
-                    
-                    latest_offers = [dict(row) for row in cursor.fetchall()]
-                    
-                    # Obliczamy łączną ilość dostępnych sztuk
-                    total_quantity = 0
-                    
-                    # Grupujemy oferty po nazwie przedmiotu i obliczamy statystyki (min/max/avg) per sztukę
-                    offers_by_item = {}
-                    for offer in latest_offers:
-                        item_name = offer.get('item_name', 'Unknown')
-                        if item_name not in offers_by_item:
-                            offers_by_item[item_name] = []
-                        
-                        # price_in_won w bazie to cena za 1 szt (yang+won), nie dzielimy przez quantity
-                        price_in_won = float(offer.get('price_in_won', 0))
-                        quantity_str = str(offer.get('quantity', '1')).strip()
-                        quantity_clean = ''.join(c for c in quantity_str if c.isdigit())
-                        quantity = int(quantity_clean) if quantity_clean else 1
-                        if quantity <= 0:
-                            quantity = 1
-                        if price_in_won > 0:
-                            offers_by_item[item_name].append({
-                                'price_per_unit': price_in_won,
-                                'price_in_won': price_in_won,
-                                'quantity': quantity,
-                                'offer': offer
-                            })
-                            total_quantity += quantity
-                    
-                    # Tworzymy agregowane dane dla każdego przedmiotu (używamy minimalnej ceny per sztukę)
-                    latest_data = []
-                    for item_name, offers in offers_by_item.items():
-                        if not offers:
-                            continue
-                        
-                        # Obliczamy min/max/avg cen per sztukę
-                        prices_per_unit = [o['price_per_unit'] for o in offers]
-                        min_price_per_unit = min(prices_per_unit)
-                        max_price_per_unit = max(prices_per_unit)
-                        avg_price_per_unit = sum(prices_per_unit) / len(prices_per_unit)
-                        
-                        # Używamy oferty z minimalną ceną per sztukę jako reprezentatywnej
-                        min_offer = min(offers, key=lambda x: x['price_per_unit'])
-                        representative_offer = min_offer['offer']
-                        
-                        # Tworzymy agregowany wpis używając oferty z minimalną ceną per sztukę
-                        # price_in_won pozostaje ceną za całą ofertę (dla spójności z resztą kodu)
-                        raw_price_in_won = representative_offer.get('price_in_won')
-                        price_in_won_float = float(raw_price_in_won) if raw_price_in_won is not None else 0.0
-                        latest_data.append({
-                            'item_name': item_name,
-                            'timestamp': representative_offer.get('timestamp'),
-                            'price': representative_offer.get('price'),
-                            'price_in_won': price_in_won_float,  # Zawsze float (np. 1.27, nie 1)
-                            'currency': representative_offer.get('currency'),
-                            'quantity': representative_offer.get('quantity'),
-                            'seller': representative_offer.get('seller'),
-                            # Dodatkowe statystyki (opcjonalnie, dla przyszłego użycia)
-                            'min_price_per_unit': min_price_per_unit,
-                            'max_price_per_unit': max_price_per_unit,
-                            'avg_price_per_unit': avg_price_per_unit
-                        })
-                    
-                    latest_data.sort(key=lambda x: x.get('item_name', ''))
-                    
-                    return latest_data, total_quantity
-                    
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    logger.warning(f"Database locked podczas odczytu, próba {attempt + 1}/{max_retries}, czekam {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    logger.error(f"Błąd podczas pobierania najnowszych danych: {e}", exc_info=True)
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # OPTYMALIZACJA: Najnowszy snapshot serwera ze wskaźnika latest_snapshots (bez sortowania snapshots)
+                latest = self._latest_snapshot(cursor, server_id)
+                
+                if latest is None:
                     return [], 0
-            except Exception as e:
-                logger.error(f"Nieoczekiwany błąd podczas pobierania najnowszych danych: {e}", exc_info=True)
-                return [], 0
+                snapshot_id, snapshot_timestamp = latest[0], latest[1]
+                
+                # Statystyki przedmiotów najnowszego snapshotu (min/max/avg per sztukę, najtańsza oferta)
+                cursor.execute(f"""
+                    {ITEM_STATS_SELECT}
+                    WHERE st.snapshot_id = ?
+                    ORDER BY it.name
+                """, (snapshot_id,))
+                
+                return self._item_stats_to_items(cursor.fetchall(), snapshot_timestamp)
         
-        return [], 0
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania najnowszych danych: {e}", exc_info=True)
+            return [], 0
+        except Exception as e:
+            logger.error(f"Nieoczekiwany błąd podczas pobierania najnowszych danych: {e}", exc_info=True)
+            return [], 0
     
-    def _aggregate_offers_to_items(self, latest_offers: List[Dict]) -> tuple[List[Dict], int]:
-        """Z ofert buduje listę przedmiotów (min cena/szt) i łączną ilość. Używane przez get_latest_data*."""
+    def _item_stats_to_items(self, rows, timestamp: str) -> tuple[List[Dict], int]:
+        """Z wierszy ITEM_STATS_SELECT buduje listę przedmiotów (najtańsza oferta + min/max/avg) i łączną ilość"""
         total_quantity = 0
-        offers_by_item: Dict[str, list] = {}
-        for offer in latest_offers:
-            item_name = offer.get('item_name', 'Unknown')
-            if item_name not in offers_by_item:
-                offers_by_item[item_name] = []
-            price_in_won = float(offer.get('price_in_won', 0))
-            quantity_str = str(offer.get('quantity', '1')).strip()
-            quantity_clean = ''.join(c for c in quantity_str if c.isdigit())
-            quantity = int(quantity_clean) if quantity_clean else 1
-            if quantity <= 0:
-                quantity = 1
-            if price_in_won > 0:
-                offers_by_item[item_name].append({
-                    'price_per_unit': price_in_won,
-                    'price_in_won': price_in_won,
-                    'quantity': quantity,
-                    'offer': offer,
-                })
-                total_quantity += quantity
         latest_data = []
-        for item_name, offers in offers_by_item.items():
-            if not offers:
-                continue
-            prices_per_unit = [o['price_per_unit'] for o in offers]
-            min_offer = min(offers, key=lambda x: x['price_per_unit'])
-            rep = min_offer['offer']
-            raw_piw = rep.get('price_in_won')
-            price_in_won_float = float(raw_piw) if raw_piw is not None else 0.0
+        for row in rows:
+            total_quantity += row['total_quantity']
+            min_price = float(row['min_price'])
             latest_data.append({
-                'item_name': item_name,
-                'timestamp': rep.get('timestamp'),
-                'price': rep.get('price'),
-                'price_in_won': price_in_won_float,
-                'currency': rep.get('currency'),
-                'quantity': rep.get('quantity'),
-                'seller': rep.get('seller'),
-                'min_price_per_unit': min(prices_per_unit),
-                'max_price_per_unit': max(prices_per_unit),
-                'avg_price_per_unit': sum(prices_per_unit) / len(prices_per_unit),
+                'item_name': row['item_name'],
+                'timestamp': timestamp,
+                'price': min_price,
+                'price_in_won': min_price,  # Zawsze float (np. 1.27, nie 1)
+                'currency': 'won',
+                'quantity': row['min_quantity'],
+                'seller': row['seller'],
+                'min_price_per_unit': min_price,
+                'max_price_per_unit': float(row['max_price']),
+                'avg_price_per_unit': row['sum_price'] / row['offer_count'],
             })
-        latest_data.sort(key=lambda x: x.get('item_name', ''))
         return latest_data, total_quantity
     
     def get_latest_data_paginated(self, server_id: int, limit: int = 10, offset: int = 0) -> tuple[List[Dict], int, int]:
@@ -672,142 +2091,99 @@ class Database:
         Zwraca stronę najnowszych danych (limit pozycji, od offset).
         Returns: (lista wpisów dla przedmiotów, total_count wszystkich przedmiotów, total_quantity na stronie)
         """
-        max_retries = 3
-        retry_delay = 0.05
-        for attempt in range(max_retries):
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "SELECT id FROM snapshots WHERE server_id = ? ORDER BY timestamp DESC LIMIT 1",
-                        (server_id,),
-                    )
-                    row = cursor.fetchone()
-                    if not row:
-                        return [], 0, 0
-                    snapshot_id = row['id']
-                    cursor.execute(
-                        """
-                        SELECT COUNT(DISTINCT item_name) FROM offers
-                        WHERE snapshot_id = ? AND server_id = ? AND price_in_won > 0
-                        """,
-                        (snapshot_id, server_id),
-                    )
-                    total_count = cursor.fetchone()[0]
-                    cursor.execute(
-                        """
-                        SELECT DISTINCT item_name FROM offers
-                        WHERE snapshot_id = ? AND server_id = ? AND price_in_won > 0
-                        ORDER BY item_name ASC
-                        LIMIT ? OFFSET ?
-                        """,
-                        (snapshot_id, server_id, limit, offset),
-                    )
-                    page_names = [r['item_name'] for r in cursor.fetchall()]
-                    if not page_names:
-                        return [], total_count, 0
-                    placeholders = ','.join(['?'] * len(page_names))
-                    cursor.execute(
-                        """
-                        SELECT s.timestamp, o.item_name, o.price, o.price_in_won, o.currency, o.quantity, o.seller
-                        FROM offers o
-                        INNER JOIN snapshots s ON o.snapshot_id = s.id
-                        WHERE o.snapshot_id = ? AND o.server_id = ? AND o.item_name IN ({}) AND o.price_in_won > 0
-                        """.format(placeholders),
-                        [snapshot_id, server_id] + page_names,
-                    )
-                    latest_offers = [dict(r) for r in cursor.fetchall()]
-                    latest_data, total_quantity = self._aggregate_offers_to_items(latest_offers)
-                    return latest_data, total_count, total_quantity
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    raise
-        return [], 0, 0
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            latest = self._latest_snapshot(cursor, server_id)
+            if latest is None:
+                return [], 0, 0
+            snapshot_id, snapshot_timestamp = latest[0], latest[1]
+            cursor.execute("SELECT COUNT(*) FROM item_snapshot_stats WHERE snapshot_id = ?", (snapshot_id,))
+            total_count = cursor.fetchone()[0]
+            cursor.execute(
+                f"""
+                {ITEM_STATS_SELECT}
+                WHERE st.snapshot_id = ?
+                ORDER BY it.name ASC
+                LIMIT ? OFFSET ?
+                """,
+                (snapshot_id, limit, offset),
+            )
+            latest_data, total_quantity = self._item_stats_to_items(cursor.fetchall(), snapshot_timestamp)
+            return latest_data, total_count, total_quantity
     
     def get_latest_data_for_items(self, server_id: int, item_names: List[str]) -> tuple[List[Dict], int]:
         """Zwraca najnowsze dane tylko dla podanych nazw przedmiotów. Returns (list, total_quantity)."""
         if not item_names:
             return [], 0
-        max_retries = 3
-        retry_delay = 0.05
-        for attempt in range(max_retries):
-            try:
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "SELECT id FROM snapshots WHERE server_id = ? ORDER BY timestamp DESC LIMIT 1",
-                        (server_id,),
-                    )
-                    row = cursor.fetchone()
-                    if not row:
-                        return [], 0
-                    snapshot_id = row['id']
-                    placeholders = ','.join(['?'] * len(item_names))
-                    cursor.execute(
-                        """
-                        SELECT s.timestamp, o.item_name, o.price, o.price_in_won, o.currency, o.quantity, o.seller
-                        FROM offers o
-                        INNER JOIN snapshots s ON o.snapshot_id = s.id
-                        WHERE o.snapshot_id = ? AND o.server_id = ? AND o.item_name IN ({}) AND o.price_in_won > 0
-                        """.format(placeholders),
-                        [snapshot_id, server_id] + item_names,
-                    )
-                    latest_offers = [dict(r) for r in cursor.fetchall()]
-                    latest_data, total_quantity = self._aggregate_offers_to_items(latest_offers)
-                    return latest_data, total_quantity
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    raise
-        return [], 0
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            latest = self._latest_snapshot(cursor, server_id)
+            if latest is None:
+                return [], 0
+            placeholders = ','.join(['?'] * len(item_names))
+            cursor.execute(
+                f"""
+                {ITEM_STATS_SELECT}
+                WHERE st.snapshot_id = ? AND it.name IN ({placeholders})
+                ORDER BY it.name
+                """,
+                [latest[0]] + item_names,
+            )
+            return self._item_stats_to_items(cursor.fetchall(), latest[1])
     
-    def get_unique_items(self, server_id: int) -> List[str]:
+    def get_unique_items(self, server_id: int, active_only: bool = False) -> List[str]:
         """
-        Zwraca listę unikalnych nazw przedmiotów dla danego serwera
+        Zwraca listę unikalnych nazw przedmiotów dla danego serwera (z katalogu item_catalog)
         
         Args:
             server_id: ID serwera (np. 426, 702)
+            active_only: Tylko przedmioty wystawione w najnowszym snapshocie
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT DISTINCT o.item_name
-                FROM offers o
-                WHERE o.server_id = ?
-                AND o.price_in_won > 0
-                ORDER BY o.item_name ASC
+            cursor.execute(f"""
+                SELECT it.name
+                FROM item_catalog c
+                JOIN items it ON it.id = c.item_id
+                WHERE c.server_id = ?{' AND c.active = 1' if active_only else ''}
+                ORDER BY it.name ASC
             """, (server_id,))
             
-            return [row['item_name'] for row in cursor.fetchall()]
+            return [row['name'] for row in cursor.fetchall()]
     
     def search_items(self, query: str, server_id: int, limit: int = 100) -> List[str]:
         """
         Wyszukuje przedmioty po nazwie dla danego serwera (tylko nazwy – lekka odpowiedź).
         
+        Fragment nazwy (także początek) bez względu na wielkość liter i polskie znaki ("luska" znajduje
+        "Łuska Smoka"). Od 3 znaków przez indeks trigramów item_search – koszt zależy od liczby
+        pasujących nazw, nie od historii; krótsze frazy (lub brak FTS5) przeglądają słownik items.
+        
         Args:
-            query: Fraza do wyszukania (case-insensitive)
+            query: Fraza do wyszukania (case- i diacritic-insensitive)
             server_id: ID serwera (np. 426, 702)
             limit: Maks. liczba wyników (domyślnie 100)
         """
         if not query or not query.strip():
             return []
+        key = fold_name(query.strip())
+        if self._item_search_fts and len(key) >= 3:
+            # Fraza w cudzysłowie: kolejne trygramy klucza = podciąg nazwy
+            source = "item_search JOIN items it ON it.id = item_search.rowid WHERE item_search MATCH ?"
+            pattern = '"' + key.replace('"', '""') + '"'
+        else:
+            source = "items it WHERE fold_name(it.name) LIKE ? ESCAPE '\\'"
+            pattern = '%' + key.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT DISTINCT o.item_name
-                FROM offers o
-                WHERE LOWER(o.item_name) LIKE LOWER(?)
-                AND o.server_id = ?
-                AND o.price_in_won > 0
-                ORDER BY o.item_name ASC
+            cursor.execute(f"""
+                SELECT it.name
+                FROM {source}
+                AND EXISTS (SELECT 1 FROM item_catalog c WHERE c.server_id = ? AND c.item_id = it.id)
+                ORDER BY it.name ASC
                 LIMIT ?
-            """, (f'%{query.strip()}%', server_id, limit))
-            return [row['item_name'] for row in cursor.fetchall()]
+            """, (pattern, server_id, limit))
+            return [row['name'] for row in cursor.fetchall()]
     
     def get_statistics(self, server_id: int) -> Dict:
         """
@@ -818,45 +2194,31 @@ class Database:
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            # Używamy nowej struktury offers zamiast price_history
+            # Z item_totals (jeden wiersz na przedmiot, aktualizowany przy zapisie) – koszt nie rośnie
+            # z historią. Średnia i data_points ważone liczbą ofert. current_price: najniższa cena
+            # w ostatnim snapshocie z przedmiotem.
             cursor.execute("""
                 SELECT 
-                    o.item_name,
-                    MIN(o.price_in_won) as min_price,
-                    MAX(o.price_in_won) as max_price,
-                    AVG(o.price_in_won) as avg_price,
-                    COUNT(*) as data_points
-                FROM offers o
-                WHERE o.server_id = ?
-                AND o.price_in_won > 0
-                GROUP BY o.item_name
+                    it.name as item_name,
+                    t.min_price,
+                    t.max_price,
+                    t.sum_price / t.data_points as avg_price,
+                    t.data_points,
+                    t.current_price
+                FROM item_totals t
+                JOIN items it ON it.id = t.item_id
+                WHERE t.server_id = ?
+                ORDER BY it.name
             """, (server_id,))
             
             stats = {}
             for row in cursor.fetchall():
-                # Pobieramy najnowszą ofertę (price_in_won + quantity) i liczymy cenę ZA 1 SZT
-                cursor.execute("""
-                    SELECT o.price_in_won, o.quantity
-                    FROM offers o
-                    INNER JOIN snapshots s ON o.snapshot_id = s.id
-                    WHERE o.item_name = ? 
-                    AND o.server_id = ?
-                    AND o.price_in_won > 0
-                    ORDER BY s.timestamp DESC
-                    LIMIT 1
-                """, (row['item_name'], server_id))
-                
-                current_row = cursor.fetchone()
-                current_price = None
-                if current_row:
-                    current_price = float(current_row['price_in_won'])
-                
                 stats[row['item_name']] = {
                     'min_price': float(row['min_price']) if row['min_price'] is not None else 0.0,
                     'max_price': float(row['max_price']) if row['max_price'] is not None else 0.0,
                     'avg_price': float(row['avg_price']) if row['avg_price'] is not None else 0.0,
                     'data_points': row['data_points'],
-                    'current_price': float(current_price) if current_price is not None else None
+                    'current_price': float(row['current_price']) if row['current_price'] is not None else None
                 }
             
             return stats
@@ -876,107 +2238,206 @@ class Database:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            # Statystyki tylko z ostatniego snapshotu (najnowsze ceny)
-            cursor.execute("""
-                SELECT id FROM snapshots
-                WHERE server_id = ?
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """, (server_id,))
-            row = cursor.fetchone()
-            if not row:
+            # Statystyki tylko z ostatniego snapshotu (najnowsze ceny) – wiersz item_snapshot_stats
+            latest = self._latest_snapshot(cursor, server_id)
+            if latest is None:
                 return None
-            snapshot_id = row['id']
-            
             cursor.execute("""
-                SELECT 
-                    o.price_in_won,
-                    CAST(REPLACE(REPLACE(o.quantity, ',', ''), ' ', '') AS INTEGER) as qty
-                FROM offers o
-                WHERE o.snapshot_id = ?
-                AND o.item_name = ?
-                AND o.server_id = ?
-                AND o.price_in_won > 0
-            """, (snapshot_id, item_name, server_id))
-            
-            rows = cursor.fetchall()
-            
-            if not rows:
-                return None
-            
-            prices_per_unit = []
-            total_quantity = 0
+                SELECT st.offer_count, st.total_quantity, st.min_price, st.max_price, st.sum_price, st.median_price
+                FROM item_snapshot_stats st
+                WHERE st.snapshot_id = ?
+                AND st.item_id = (SELECT id FROM items WHERE name = ?)
+            """, (latest[0], item_name))
             
-            for row in rows:
-                price_in_won = float(row['price_in_won'])
-                quantity = int(row['qty']) if row['qty'] and row['qty'] > 0 else 1
-                if quantity <= 0:
-                    quantity = 1
-                if price_in_won > 0:
-                    prices_per_unit.append(price_in_won)
-                    total_quantity += quantity
+            row = cursor.fetchone()
             
-            if not prices_per_unit:
+            if not row:
                 return None
             
-            # Obliczamy statystyki z cen per sztukę
-            sorted_prices = sorted(prices_per_unit)
-            n = len(sorted_prices)
-            
-            # Mediana
-            if n % 2 == 0:
-                median_price = (sorted_prices[n//2 - 1] + sorted_prices[n//2]) / 2
-            else:
-                median_price = sorted_prices[n//2]
-            
-            min_price = float(min(prices_per_unit))
-            max_price = float(max(prices_per_unit))
-            avg_price = float(sum(prices_per_unit) / len(prices_per_unit))
-            
-            # Obliczamy ceny za 200 sztuk
-            min_price_200 = min_price * 200
-            max_price_200 = max_price * 200
-            avg_price_200 = avg_price * 200
-            median_price_200 = median_price * 200
+            min_price = float(row['min_price'])
+            max_price = float(row['max_price'])
+            avg_price = float(row['sum_price'] / row['offer_count'])
+            median_price = float(row['median_price'])
             
             return {
                 'min_price': min_price,
                 'max_price': max_price,
                 'avg_price': avg_price,
                 'median_price': median_price,
-                'min_price_200': min_price_200,
-                'max_price_200': max_price_200,
-                'avg_price_200': avg_price_200,
-                'median_price_200': median_price_200,
-                'data_points': len(prices_per_unit),
-                'total_offers': len(prices_per_unit),
-                'total_quantity': total_quantity
+                'min_price_200': min_price * 200,
+                'max_price_200': max_price * 200,
+                'avg_price_200': avg_price * 200,
+                'median_price_200': median_price * 200,
+                'data_points': row['offer_count'],
+                'total_offers': row['offer_count'],
+                'total_quantity': row['total_quantity']
             }
     
+    def get_item_price_series(self, item_name: str, server_id: int, limit: Optional[int] = None,
+                              days: Optional[int] = None, resolution: str = 'raw') -> List[Dict]:
+        """
+        Zwraca serię cen przedmiotu: jeden punkt na snapshot (min/max/średnia/mediana za sztukę,
+        liczba ofert, łączna ilość) z item_snapshot_stats – dane wykresu bez pobierania wszystkich ofert.
+        Dla resolution 'hour'/'day' punkt na godzinę/dzień z rollupów (dodatkowo open/close najniższej
+        ceny, liczba snapshotów w przedziale; bez mediany).
+        
+        Args:
+            item_name: Nazwa przedmiotu (dokładne dopasowanie)
+            server_id: ID serwera (np. 426, 702)
+            limit: Maksymalna liczba najnowszych punktów (None = 10000)
+            days: Liczba ostatnich dni do pobrania (None = wszystkie)
+            resolution: 'raw' (snapshoty), 'hour' lub 'day'
+        
+        Returns:
+            Lista punktów od najstarszego; czas jako timestamp (ISO) i timestamp_ms (milisekundy epoki)
+        """
+        if resolution in ROLLUP_TABLES:
+            return self._get_item_rollup_series(item_name, server_id, limit, days, resolution)
+        since = None
+        if days:
+            from datetime import timedelta
+            since = datetime.now() - timedelta(days=days)
+        query = """
+            SELECT s.timestamp, s.timestamp_ms, st.min_price, st.max_price, st.sum_price / st.offer_count AS avg_price,
+                   st.median_price, st.offer_count, st.total_quantity
+            FROM {stats} st
+            JOIN snapshots s ON s.id = st.snapshot_id
+            WHERE st.server_id = ?
+            AND st.item_id = (SELECT id FROM items WHERE name = ?)
+        """
+        params = [server_id, item_name.strip()]
+        if since:
+            query += " AND s.timestamp_ms >= ?"
+            params.append(int(since.timestamp() * 1000))
+        query += " ORDER BY st.snapshot_id DESC LIMIT ?"
+        params.append(limit or 10000)
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                # Z days= tylko partycje statystyk z okresu od granicy
+                stats = self._partition_source(cursor, 'item_snapshot_stats', since.isoformat() if since else None)
+                cursor.execute(query.format(stats=stats), params)
+                series = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania serii cen przedmiotu: {e}", exc_info=True)
+            return []
+        series.reverse()
+        return series
+    
+    def _get_item_rollup_series(self, item_name: str, server_id: int, limit: Optional[int],
+                                days: Optional[int], resolution: str) -> List[Dict]:
+        """Seria cen przedmiotu z rollupów (get_item_price_series z resolution 'hour'/'day')"""
+        table, prefix_length, suffix = ROLLUP_TABLES[resolution]
+        query = f"""
+            SELECT bucket_start AS timestamp, epoch_ms(bucket_start) AS timestamp_ms, low_price AS min_price, max_price,
+                   sum_price / offer_count AS avg_price, NULL AS median_price, offer_count, total_quantity,
+                   open_price, high_price, close_price, samples
+            FROM {table}
+            WHERE server_id = ?
+            AND item_id = (SELECT id FROM items WHERE name = ?)
+        """
+        params = [server_id, item_name.strip()]
+        if days:
+            from datetime import timedelta
+            # Od początku przedziału zawierającego granicę zakresu
+            query += " AND bucket_start >= ?"
+            params.append((datetime.now() - timedelta(days=days)).isoformat()[:prefix_length] + suffix)
+        query += " ORDER BY bucket_start DESC LIMIT ?"
+        params.append(limit or 10000)
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                series = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania rollupów przedmiotu: {e}", exc_info=True)
+            return []
+        series.reverse()
+        return series
+    
     def cleanup_old_data(self, days_to_keep: int = 30):
         """
-        Usuwa stare dane starsze niż określona liczba dni
+        Usuwa stare dane starsze niż określona liczba dni (partycje price_history, których cały okres
+        jest starszy – dane z częściowo wygasłego okresu zostają do jego końca)
         
         Args:
             days_to_keep: Liczba dni do zachowania danych
+        
+        Returns:
+            Liczba usuniętych partycji
         """
         cutoff_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         from datetime import timedelta
         cutoff_date = cutoff_date - timedelta(days=days_to_keep)
         cutoff_timestamp = cutoff_date.isoformat()
         
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        deleted_count = self._submit_write(self._drop_price_history_before, cutoff_timestamp)
+        
+        logger.info(f"Usunięto {deleted_count} partycji price_history (starszych niż {days_to_keep} dni)")
+        return deleted_count
+    
+    def _drop_price_history_before(self, conn, cutoff_timestamp: str) -> int:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        dropped = self._drop_expired_partitions(cursor, ('price_history',), cutoff_timestamp)
+        conn.commit()
+        return len(dropped)
+    
+    def apply_retention(self, raw_days: Optional[int] = None, hourly_days: Optional[int] = None) -> Dict[str, int]:
+        """
+        Retencja warstwowa: surowe dane (snapshoty, przedziały ofert, statystyki snapshotów, price_history)
+        starsze niż raw_days i rollupy godzinowe starsze niż hourly_days są usuwane; rollupy dzienne
+        i item_totals zostają na zawsze.
+        
+        Surowe dane są usuwane całymi partycjami (_drop_expired_partitions), gdy cały okres partycji
+        (tydzień/miesiąc od północy) jest starszy niż granica – bez DELETE wiersz po wierszu, więc zapis
+        snapshotów nie czeka; dane trzymane są do jednego okresu dłużej niż raw_days. Granice okresów
+        to północ, więc dzień nie jest dzielony między rollupy liczone z zachowanych i usuniętych
+        snapshotów. Najnowszy snapshot serwera zostaje zawsze (najnowsze dane).
+        
+        Args:
+            raw_days: Dni surowych danych do zachowania (None = bez limitu)
+            hourly_days: Dni rollupów godzinowych do zachowania (None = bez limitu)
+        
+        Returns:
+            Liczba usuniętych partycji ('partitions') i wierszy (snapshots, rollupy godzinowe)
+        """
+        return self._submit_write(self._apply_retention, raw_days, hourly_days)
+    
+    def _apply_retention(self, conn, raw_days: Optional[int], hourly_days: Optional[int]) -> Dict[str, int]:
+        from datetime import timedelta
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        deleted = {}
+        dropped = []
+        cursor = conn.cursor()
+        if raw_days:
+            cutoff = (midnight - timedelta(days=raw_days)).isoformat()
+            cursor.execute("BEGIN")
+            dropped = self._drop_expired_partitions(cursor, PARTITIONED_TABLES, cutoff)
+            deleted['partitions'] = len(dropped)
+            # Snapshoty spoza okresów zachowanych partycji przedziałów i statystyk nie mają już danych
             cursor.execute("""
-                DELETE FROM price_history
-                WHERE timestamp < ?
-            """, (cutoff_timestamp,))
-            
-            deleted_count = cursor.rowcount
+                DELETE FROM snapshots WHERE NOT EXISTS (
+                    SELECT 1 FROM partitions p
+                    WHERE p.base_table IN ('offer_intervals', 'item_snapshot_stats')
+                    AND snapshots.timestamp >= p.period_start AND snapshots.timestamp < p.period_end
+                )
+            """)
+            deleted['snapshots'] = cursor.rowcount
             conn.commit()
+        if hourly_days:
+            table = ROLLUP_TABLES['hour'][0]
+            cursor.execute(f"DELETE FROM {table} WHERE bucket_start < ?",
+                           ((midnight - timedelta(days=hourly_days)).isoformat(),))
+            deleted[table] = cursor.rowcount
+        conn.commit()
         
-        logger.info(f"Usunięto {deleted_count} starych wpisów (starszych niż {days_to_keep} dni)")
-        return deleted_count
+        if any(deleted.values()):
+            logger.info("Retencja: usunięto " + ", ".join(f"{table}: {count}" for table, count in deleted.items())
+                        + (f" ({', '.join(dropped)})" if dropped else ""))
+        return deleted
     
     def cleanup_invalid_price_records(self, max_valid_min_price: float = 0.01) -> int:
         """
@@ -989,19 +2450,31 @@ class Database:
         Returns:
             Liczba usuniętych rekordów (offers + price_history).
         """
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM offers
-                WHERE price_in_won > 0 AND price_in_won < ?
-            """, (max_valid_min_price,))
-            deleted_offers = cursor.rowcount
-            cursor.execute("""
-                DELETE FROM price_history
-                WHERE price_in_won > 0 AND price_in_won < ?
-            """, (max_valid_min_price,))
-            deleted_history = cursor.rowcount
-            conn.commit()
+        deleted_offers, deleted_history = self._submit_write(self._delete_invalid_price_records, max_valid_min_price)
         total = deleted_offers + deleted_history
         logger.info(f"Usunięto błędne rekordy: {deleted_offers} ofert, {deleted_history} price_history (łącznie {total})")
         return total
+    
+    def _delete_invalid_price_records(self, conn, max_valid_min_price: float) -> tuple[int, int]:
+        cursor = conn.cursor()
+        deleted = {}
+        for base in ('offer_intervals', 'price_history'):
+            deleted[base] = 0
+            for table in self._partition_names(cursor, base):
+                cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE price_in_won > 0 AND price_in_won < ?
+                """, (max_valid_min_price,))
+                deleted[base] += cursor.rowcount
+        deleted_offers, deleted_history = deleted['offer_intervals'], deleted['price_history']
+        conn.commit()
+        if deleted_offers:
+            # Statystyki przedmiotów liczone z usuniętymi ofertami – przeliczenie od nowa
+            for table in self._partition_names(cursor, 'item_snapshot_stats'):
+                cursor.execute(f"DELETE FROM {table}")
+            conn.commit()
+            self._backfill_item_snapshot_stats(conn)
+            self._rebuild_item_rollups(conn, force=True)
+            self._rebuild_item_totals(conn, force=True)
+            self._rebuild_item_catalog(conn, force=True)
+        return deleted_offers, deleted_history
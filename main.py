@@ -4,12 +4,14 @@ Uruchamia background service do aktualizacji danych oraz web interface
 """
 import os
 import time
-import gc
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from data_fetcher import Metin2DataFetcher
+from typing import Dict
+from data_fetcher import Metin2DataFetcher, FETCH_NO_CHANGE
 from chart_manager import ChartManager
+from refresh_scheduler import RefreshScheduler, RESULT_CHANGED, RESULT_UNCHANGED, RESULT_ERROR
 import config
 
 logging.basicConfig(
@@ -38,11 +40,103 @@ logging.getLogger('werkzeug').setLevel(logging.WARNING)
 # Globalne instancje współdzielone między wątkami
 fetcher = None
 chart_manager = None
+# Harmonogram odświeżania per serwer (tworzony w main() lub w workerze)
+refresh_scheduler = None
+# Pula wątków do równoległego pobierania danych serwerów (tworzona leniwie)
+fetch_executor = None
+# Liczniki workera (server_id -> liczba pobrań bez zmian: 304 Not Modified lub identyczna treść)
+no_change_counts: Dict[int, int] = {}
+
+
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """Zwraca (i przy pierwszym wywołaniu tworzy) pulę wątków do pobierania danych"""
+    global fetch_executor
+    if fetch_executor is None:
+        concurrency = max(1, int(getattr(config, 'FETCH_CONCURRENCY', 4)))
+        fetch_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='fetch')
+        logger.info(f"Pula pobierania danych: {concurrency} równoległych pobrań")
+    return fetch_executor
+
+
+def fetch_and_store_servers(servers: Dict[int, str]) -> Dict[int, int]:
+    """
+    Pobiera dane dla serwerów równolegle i zapisuje je do bazy w miarę napływania.
+    
+    Pobrania działają w puli wątków (limit FETCH_CONCURRENCY), a zapis odbywa się
+    w wątku wywołującym – jeden zapis naraz, ale pobieranie serwera B trwa,
+    gdy oferty serwera A są wstawiane do bazy. Oferty płyną strumieniowo
+    (pobrana odpowiedź → parser → executemany), bez pełnej listy w pamięci.
+    
+    Args:
+        servers: Dict server_id -> nazwa serwera
+    
+    Returns:
+        Dict server_id -> liczba zapisanych ofert (0 = brak danych, brak zmian lub błąd)
+    """
+    executor = get_fetch_executor()
+    futures = {}
+    for server_id, server_name in servers.items():
+        logger.info(f"Pobieranie danych dla serwera {server_id} ({server_name})...")
+        future = executor.submit(
+            fetcher.iter_upgrade_items,
+            item_names=None,
+            server_id=server_id
+        )
+        futures[future] = server_id
+    
+    results = {}
+    for future in as_completed(futures):
+        server_id = futures[future]
+        results[server_id] = 0
+        try:
+            items = future.result()
+        except Exception as e:
+            logger.error(f"Błąd podczas pobierania danych dla serwera {server_id}: {e}", exc_info=True)
+            continue
+        
+        if items is None:
+            if fetcher.get_fetch_status(server_id) in FETCH_NO_CHANGE:
+                no_change_counts[server_id] = no_change_counts.get(server_id, 0) + 1
+                logger.info(f"Serwer {server_id}: brak zmian od ostatniego pobrania – pomijanie zapisu "
+                            f"(cykli bez zmian: {no_change_counts[server_id]})")
+                try:
+                    chart_manager.touch_snapshot(server_id)
+                except Exception as e:
+                    logger.warning(f"Nie udało się oznaczyć snapshotu serwera {server_id} jako aktualnego: {e}")
+            else:
+                logger.warning(f"Nie pobrano żadnych danych dla serwera {server_id}")
+            continue
+        
+        try:
+            added_count = chart_manager.add_price_data(items, server_id)
+            results[server_id] = added_count
+            if added_count:
+                logger.info(f"Zapisano {added_count} ofert dla serwera {server_id}")
+            else:
+                logger.warning(f"Nie pobrano żadnych danych dla serwera {server_id}")
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisu danych dla serwera {server_id}: {e}", exc_info=True)
+            # Następne pobranie musi zwrócić pełne dane, a nie 304 dla niezapisanego snapshotu
+            fetcher.invalidate_cache(server_id)
+    
+    return results
+
+
+def record_refresh_results(results: Dict[int, int]):
+    """Przekazuje wyniki fetch_and_store_servers do harmonogramu (zmiana / brak zmian / błąd)"""
+    for server_id, added_count in results.items():
+        if added_count:
+            result = RESULT_CHANGED
+        elif fetcher.get_fetch_status(server_id) in FETCH_NO_CHANGE:
+            result = RESULT_UNCHANGED
+        else:
+            result = RESULT_ERROR
+        refresh_scheduler.record_result(server_id, result)
 
 
 def data_update_worker():
     """Worker thread do aktualizacji danych w tle"""
-    global fetcher, chart_manager
+    global fetcher, chart_manager, refresh_scheduler
     
     logger.info("Uruchamianie background service do aktualizacji danych")
     
@@ -52,65 +146,79 @@ def data_update_worker():
         fetcher = Metin2DataFetcher(config.STORE_URL)
     if chart_manager is None:
         chart_manager = ChartManager()
+    if refresh_scheduler is None:
+        refresh_scheduler = RefreshScheduler(getattr(config, 'AVAILABLE_SERVERS', {config.DEFAULT_SERVER_ID: 'Default'}))
     
     # Ustawiamy chart_manager w app.py, jeśli już został zaimportowany
     try:
-        from app import set_chart_manager
+        from app import set_chart_manager, set_refresh_scheduler, set_data_fetcher
         set_chart_manager(chart_manager)
+        set_refresh_scheduler(refresh_scheduler)
+        set_data_fetcher(fetcher)
         logger.info("Chart manager udostępniony dla web interface")
     except ImportError:
         pass  # app.py jeszcze nie został zaimportowany
     
     iteration = 0
+    # Retencja warstwowa (domyślnie wyłączona – RAW_RETENTION_DAYS / HOURLY_RETENTION_DAYS w config)
+    raw_retention_days = getattr(config, 'RAW_RETENTION_DAYS', None)
+    hourly_retention_days = getattr(config, 'HOURLY_RETENTION_DAYS', None)
+    retention_interval = getattr(config, 'RETENTION_CHECK_INTERVAL', 3600)
+    last_retention = None
     
     try:
         while True:
-            iteration += 1
-            logger.info(f"=== Iteracja {iteration} ===")
-            logger.info(f"Czas: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            try:
-                # Pobieramy dane dla wszystkich dostępnych serwerów
-                servers = getattr(config, 'AVAILABLE_SERVERS', {config.DEFAULT_SERVER_ID: 'Default'})
+            # Pobieramy tylko serwery, których termin minął (harmonogram per serwer)
+            servers = refresh_scheduler.due_servers()
+            if servers:
+                iteration += 1
+                logger.info(f"=== Iteracja {iteration} ===")
+                logger.info(f"Czas: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                 
-                for server_id, server_name in servers.items():
-                    logger.info(f"Pobieranie danych dla serwera {server_id} ({server_name})...")
+                try:
+                    cycle_start = time.monotonic()
+                    try:
+                        results = fetch_and_store_servers(servers)
+                    except Exception:
+                        results = {server_id: 0 for server_id in servers}
+                        raise
+                    finally:
+                        record_refresh_results(results)
+                    logger.info(f"Cykl pobierania zakończony w {time.monotonic() - cycle_start:.1f}s ({len(servers)} serwerów)")
                     
-                    items = fetcher.fetch_upgrade_items(
-                        server_name=None,
-                        item_names=None,
-                        server_id=server_id
-                    )
+                    # Wyświetlamy statystyki (pomijane przy LOW_MEMORY – oszczędność RAM)
+                    if not getattr(config, 'LOW_MEMORY', False):
+                        for server_id, server_name in servers.items():
+                            if not results.get(server_id):
+                                continue
+                            stats = chart_manager.get_statistics(server_id)
+                            if stats:
+                                logger.info(f"Statystyki cen (serwer {server_id} - {server_name}): {len(stats)} przedmiotów")
+                                for item, stat in list(stats.items())[:3]:
+                                    min_price = stat.get('min_price', 0) or 0
+                                    max_price = stat.get('max_price', 0) or 0
+                                    avg_price = stat.get('avg_price', 0) or 0
+                                    current_price = stat.get('current_price', 0) or 0
+                                    logger.info(f"  {item}: min={min_price:.0f}, max={max_price:.0f}, avg={avg_price:.0f}, current={current_price:.0f}")
                     
-                    if items:
-                        logger.info(f"Pobrano {len(items)} przedmiotów dla serwera {server_id}")
-                        chart_manager.add_price_data(items, server_id)
-                        # Zwolnienie pamięci przed kolejnym serwerem (szczególnie przy małym RAM)
-                        del items
-                        gc.collect()
-                    else:
-                        logger.warning(f"Nie pobrano żadnych danych dla serwera {server_id}")
-                
-                # Wyświetlamy statystyki (pomijane przy LOW_MEMORY – oszczędność RAM)
-                if not getattr(config, 'LOW_MEMORY', False):
-                    for server_id, server_name in servers.items():
-                        stats = chart_manager.get_statistics(server_id)
-                        if stats:
-                            logger.info(f"Statystyki cen (serwer {server_id} - {server_name}): {len(stats)} przedmiotów")
-                            for item, stat in list(stats.items())[:3]:
-                                min_price = stat.get('min_price', 0) or 0
-                                max_price = stat.get('max_price', 0) or 0
-                                avg_price = stat.get('avg_price', 0) or 0
-                                current_price = stat.get('current_price', 0) or 0
-                                logger.info(f"  {item}: min={min_price:.0f}, max={max_price:.0f}, avg={avg_price:.0f}, current={current_price:.0f}")
+                except Exception as e:
+                    logger.error(f"Błąd podczas pobierania danych: {e}", exc_info=True)
                 
-            except Exception as e:
-                logger.error(f"Błąd podczas pobierania danych: {e}", exc_info=True)
+                schedule = refresh_scheduler.get_schedule()
+                logger.info("Następne odświeżenia: " + ", ".join(
+                    f"{entry['server_id']} za {entry['next_run_in']:.0f}s (co {entry['interval']:.0f}s)" for entry in schedule))
             
-            # Czekamy na następną iterację
-            logger.info(f"Oczekiwanie {config.REFRESH_INTERVAL} sekund do następnego odświeżenia...")
-            time.sleep(config.REFRESH_INTERVAL)
+            if (raw_retention_days or hourly_retention_days) and (
+                    last_retention is None or time.monotonic() - last_retention >= retention_interval):
+                last_retention = time.monotonic()
+                try:
+                    chart_manager.apply_retention(raw_retention_days, hourly_retention_days)
+                except Exception as e:
+                    logger.error(f"Błąd podczas usuwania starych danych: {e}", exc_info=True)
             
+            # Czekamy do najbliższego terminu (zamiast stałego REFRESH_INTERVAL po całym cyklu)
+            time.sleep(max(1.0, refresh_scheduler.seconds_until_next()))
+    
     except Exception as e:
         logger.error(f"Krytyczny błąd w worker thread: {e}", exc_info=True)
     finally:
@@ -127,36 +235,27 @@ def main():
             os.environ['SQLITE_CACHE_KB'] = '-4096'  # 4 MB
         if 'BATCH_INSERT_SIZE' not in os.environ:
             os.environ['BATCH_INSERT_SIZE'] = '2000'
+        if 'SQLITE_POOL_SIZE' not in os.environ:
+            os.environ['SQLITE_POOL_SIZE'] = '2'
         if 'SKIP_PRICE_HISTORY_TABLE' not in os.environ:
             os.environ['SKIP_PRICE_HISTORY_TABLE'] = '1'
         logger.info("Tryb LOW_MEMORY włączony (mniejszy RAM)")
     
     # Inicjalizujemy fetcher i chart_manager przed uruchomieniem worker thread
-    global fetcher, chart_manager
+    global fetcher, chart_manager, refresh_scheduler
     fetcher = Metin2DataFetcher(config.STORE_URL)
     chart_manager = ChartManager()
     
     # Pobieramy dane przy starcie (przed uruchomieniem Flask) - ważne dla Render
     logger.info("Pobieranie początkowych danych przy starcie...")
     servers = getattr(config, 'AVAILABLE_SERVERS', {config.DEFAULT_SERVER_ID: 'Default'})
+    refresh_scheduler = RefreshScheduler(servers)
     
-    for server_id, server_name in servers.items():
-        logger.info(f"Pobieranie początkowych danych dla serwera {server_id} ({server_name})...")
-        try:
-            items = fetcher.fetch_upgrade_items(
-                server_name=None,
-                item_names=None,
-                server_id=server_id
-            )
-            if items:
-                logger.info(f"Pobrano {len(items)} przedmiotów dla serwera {server_id} przy starcie")
-                chart_manager.add_price_data(items, server_id)
-                del items
-                gc.collect()
-            else:
-                logger.warning(f"Nie pobrano danych dla serwera {server_id} przy starcie")
-        except Exception as e:
-            logger.error(f"Błąd podczas pobierania początkowych danych dla serwera {server_id}: {e}", exc_info=True)
+    try:
+        # Wyniki ustawiają pierwsze terminy – worker nie pobiera wszystkiego drugi raz od razu
+        record_refresh_results(fetch_and_store_servers(servers))
+    except Exception as e:
+        logger.error(f"Błąd podczas pobierania początkowych danych: {e}", exc_info=True)
     
     logger.info("Początkowe dane pobrane. Uruchamianie background service...")
     
@@ -172,22 +271,25 @@ def main():
     
     # Importujemy i uruchamiamy Flask app
     try:
-        from app import app, set_chart_manager
+        from app import app, set_chart_manager, set_refresh_scheduler, set_data_fetcher
         
-        # Ustawiamy globalny chart_manager w app.py
+        # Ustawiamy globalny chart_manager, harmonogram i fetcher w app.py
         set_chart_manager(chart_manager)
+        set_refresh_scheduler(refresh_scheduler)
+        set_data_fetcher(fetcher)
         
         web_port = getattr(config, 'WEB_PORT', 5001)
         web_host = getattr(config, 'WEB_HOST', '0.0.0.0')
         logger.info(f"Web interface dostępny na http://{web_host}:{web_port}")
         # Uruchamiamy Flask (host '::' = IPv6, '0.0.0.0' = IPv4)
         app.run(debug=False, host=web_host, port=web_port, use_reloader=False)
-        
+    
     except KeyboardInterrupt:
         logger.info("Zatrzymywanie aplikacji...")
     except Exception as e:
         logger.error(f"Błąd uruchamiania web interface: {e}", exc_info=True)
     finally:
+        chart_manager.close()
         logger.info("Aplikacja zakończona")
 
 
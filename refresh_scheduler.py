@@ -0,0 +1,142 @@
+"""
+Harmonogram odświeżania danych serwerów: osobny termin dla każdego serwera zamiast stałego
+time.sleep(REFRESH_INTERVAL) po całym cyklu.
+"""
+import time
+import random
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Wynik odświeżenia serwera (RefreshScheduler.record_result)
+RESULT_CHANGED = 'changed'  # zapisano nowy snapshot
+RESULT_UNCHANGED = 'unchanged'  # 304 lub identyczna treść
+RESULT_ERROR = 'error'  # błąd pobrania lub zapisu
+
+
+class RefreshScheduler:
+    """
+    Terminy odświeżania per serwer.
+    
+    - Kolejny termin liczony od planowanego startu (czas przetwarzania nie przesuwa harmonogramu).
+    - Interwał dopasowuje się do tempa zmian: po nowych danych maleje (do min_interval),
+      po odpowiedziach bez zmian rośnie (do max_interval).
+    - Po błędzie ponowienie z wykładniczym odstępem (error_backoff, 2×, 4×, ... do max_interval),
+      zamiast czekania pełnego interwału.
+    - Losowy rozrzut (jitter) rozsuwa serwery, żeby nie pobierać wszystkich naraz.
+    """
+    
+    def __init__(self, servers: Dict[int, str], base_interval: Optional[float] = None):
+        """
+        Args:
+            servers: Dict server_id -> nazwa serwera
+            base_interval: Interwał początkowy w sekundach (domyślnie config.REFRESH_INTERVAL)
+        """
+        self.base_interval = float(base_interval if base_interval is not None else getattr(config, 'REFRESH_INTERVAL', 300))
+        self.min_interval = float(getattr(config, 'REFRESH_MIN_INTERVAL', self.base_interval / 2))
+        self.max_interval = float(getattr(config, 'REFRESH_MAX_INTERVAL', self.base_interval * 4))
+        self.jitter = float(getattr(config, 'REFRESH_JITTER', 0.1))
+        self.error_backoff = float(getattr(config, 'REFRESH_ERROR_BACKOFF', 30))
+        # Mnożniki interwału po zmianie / braku zmian
+        self.speedup = 0.75
+        self.slowdown = 1.25
+        
+        self._lock = threading.Lock()
+        now = time.time()
+        self._servers: Dict[int, Dict] = {}
+        for server_id, server_name in servers.items():
+            self._servers[server_id] = {
+                'name': server_name,
+                'interval': self.base_interval,
+                'next_run': now,
+                'last_run': None,
+                'last_result': None,
+                'last_change': None,
+                'errors': 0,
+                'runs': 0,
+                'changes': 0,
+            }
+    
+    def due_servers(self, now: Optional[float] = None) -> Dict[int, str]:
+        """Serwery, których termin minął (server_id -> nazwa), od najbardziej spóźnionego"""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = sorted((state['next_run'], server_id) for server_id, state in self._servers.items()
+                         if state['next_run'] <= now)
+            return {server_id: self._servers[server_id]['name'] for _, server_id in due}
+    
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """Ile sekund do najbliższego terminu (0 jeśli któryś serwer już czeka)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._servers:
+                return self.base_interval
+            return max(0.0, min(state['next_run'] for state in self._servers.values()) - now)
+    
+    def record_result(self, server_id: int, result: str, now: Optional[float] = None):
+        """
+        Zapisuje wynik odświeżenia serwera i wyznacza jego kolejny termin.
+        
+        Args:
+            server_id: ID serwera
+            result: RESULT_CHANGED, RESULT_UNCHANGED lub RESULT_ERROR
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._servers.get(server_id)
+            if state is None:
+                return
+            scheduled = state['next_run']
+            state['last_run'] = now
+            state['last_result'] = result
+            state['runs'] += 1
+            
+            if result == RESULT_ERROR:
+                state['errors'] += 1
+                delay = min(self.max_interval, self.error_backoff * 2 ** (state['errors'] - 1))
+                state['next_run'] = now + self._with_jitter(delay)
+                logger.info(f"Serwer {server_id}: błąd #{state['errors']} – ponowienie za {delay:.0f}s")
+                return
+            
+            state['errors'] = 0
+            if result == RESULT_CHANGED:
+                state['changes'] += 1
+                state['last_change'] = now
+                state['interval'] = max(self.min_interval, state['interval'] * self.speedup)
+            else:
+                state['interval'] = min(self.max_interval, state['interval'] * self.slowdown)
+            
+            # Od planowanego terminu, a nie od końca przetwarzania (bez narastającego dryfu).
+            # Po długim przestoju nie nadrabiamy zaległych terminów – najwcześniej teraz.
+            state['next_run'] = max(now, scheduled + self._with_jitter(state['interval']))
+    
+    def _with_jitter(self, delay: float) -> float:
+        if self.jitter <= 0:
+            return delay
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def get_schedule(self) -> List[Dict]:
+        """Stan harmonogramu dla API/logów: kolejny termin, interwał i ostatni wynik per serwer"""
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat(timespec='seconds') if ts else None
+        
+        now = time.time()
+        with self._lock:
+            return [{
+                'server_id': server_id,
+                'name': state['name'],
+                'next_run': iso(state['next_run']),
+                'next_run_in': round(max(0.0, state['next_run'] - now), 1),
+                'interval': round(state['interval'], 1),
+                'last_run': iso(state['last_run']),
+                'last_result': state['last_result'],
+                'last_change': iso(state['last_change']),
+                'consecutive_errors': state['errors'],
+                'runs': state['runs'],
+                'changes': state['changes'],
+            } for server_id, state in sorted(self._servers.items(), key=lambda entry: entry[1]['next_run'])]
@@ -0,0 +1,205 @@
+"""
+Lokalny zamiennik metin2alerts.com odtwarzający nagrane odpowiedzi (tryb nagrywania: RECORD_DIR).
+Pozwala uruchomić pełny cykl workera (pobieranie, parsowanie, zapis) offline na prawdziwych danych.
+
+Użycie:
+    python replay_server.py recordings                  # czas rzeczywisty od pierwszego nagrania
+    python replay_server.py recordings --speed 288      # doba nagrań w 5 minut
+    python replay_server.py recordings --step           # każde pobranie serwera = kolejne nagranie
+
+W config.py aplikacji (lub benchmarku):
+    STORE_URL = "http://127.0.0.1:8765/store/"
+    TRANSLATION_URL = "http://127.0.0.1:8765/m2_data/pl/item_names.json"
+"""
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+import argparse
+import threading
+import logging
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RECORDING_NAME = re.compile(r'^(\d{8}T\d{6}Z)\.json\.gz$')
+DATA_PATH = re.compile(r'^/store/public/data/(\d+)\.json$')
+
+
+def load_recordings(record_dir: str) -> Dict[int, List[Tuple[float, str]]]:
+    """
+    Wczytuje listę nagrań z katalogu (bez treści).
+    
+    Returns:
+        Dict server_id -> posortowana lista (czas nagrania jako timestamp, ścieżka pliku)
+    """
+    recordings = {}
+    for entry in sorted(os.listdir(record_dir)):
+        directory = os.path.join(record_dir, entry)
+        if not entry.isdigit() or not os.path.isdir(directory):
+            continue
+        files = []
+        for name in os.listdir(directory):
+            match = RECORDING_NAME.match(name)
+            if match:
+                recorded_at = datetime.strptime(match.group(1), '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                files.append((recorded_at.timestamp(), os.path.join(directory, name)))
+        if files:
+            recordings[int(entry)] = sorted(files)
+    return recordings
+
+
+def load_translations(path: Optional[str]) -> Optional[bytes]:
+    """Plik tłumaczeń do serwowania: item_names.json albo kopia z TranslationStore (klucz 'translations')"""
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get('translations'), dict):
+        data = data['translations']
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class ReplayState:
+    """Wybór nagrania do odpowiedzi: według wirtualnego zegara albo kolejno (tryb --step)"""
+    
+    def __init__(self, recordings: Dict[int, List[Tuple[float, str]]], speed: float = 1.0, step: bool = False):
+        self.recordings = recordings
+        self.speed = speed
+        self.step = step
+        self._times = {server_id: [recorded_at for recorded_at, _ in files] for server_id, files in recordings.items()}
+        self.start_time = min(files[0][0] for files in recordings.values())
+        self.started = time.monotonic()
+        self._positions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+    
+    def virtual_now(self) -> float:
+        """Odtwarzany czas (timestamp): pierwsze nagranie + czas od startu × speed"""
+        return self.start_time + (time.monotonic() - self.started) * self.speed
+    
+    def pick(self, server_id: int) -> Optional[str]:
+        """Ścieżka nagrania, które serwer zwróciłby teraz (po ostatnim – ciągle ostatnie)"""
+        files = self.recordings.get(server_id)
+        if not files:
+            return None
+        if self.step:
+            with self._lock:
+                index = self._positions.get(server_id, 0)
+                self._positions[server_id] = min(index + 1, len(files) - 1)
+            return files[index][1]
+        index = bisect.bisect_right(self._times[server_id], self.virtual_now()) - 1
+        return files[max(index, 0)][1]
+    
+    def status(self) -> Dict:
+        return {
+            'virtual_time': datetime.fromtimestamp(self.virtual_now(), timezone.utc).isoformat(),
+            'speed': self.speed,
+            'step': self.step,
+            'servers': {
+                server_id: {'recordings': len(files), 'first': os.path.basename(files[0][1]),
+                            'last': os.path.basename(files[-1][1])}
+                for server_id, files in self.recordings.items()
+            },
+        }
+
+
+def make_handler(state: ReplayState, translations: Optional[bytes]):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive jak prawdziwy serwer
+        
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+        
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            match = DATA_PATH.match(path)
+            if match:
+                self._send_recording(int(match.group(1)))
+            elif path.endswith('/item_names.json') and translations is not None:
+                self._send(200, translations, {'ETag': '"translations"'}, etag='"translations"')
+            elif path == '/status':
+                self._send(200, json.dumps(state.status()).encode('utf-8'))
+            else:
+                self._send(404, b'')
+        
+        def _send_recording(self, server_id: int):
+            recording = state.pick(server_id)
+            if recording is None:
+                self._send(404, b'')
+                return
+            with open(recording, 'rb') as f:
+                compressed = f.read()
+            etag = f'"{server_id}-{os.path.basename(recording)}"'
+            headers = {'ETag': etag, 'Content-Type': 'application/json'}
+            # Nagrania są w gzip – wysyłamy je bez rozpakowywania, jeśli klient to akceptuje
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                headers['Content-Encoding'] = 'gzip'
+                body = compressed
+            else:
+                body = gzip.decompress(compressed)
+            self._send(200, body, headers, etag=etag)
+        
+        def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None,
+                  etag: Optional[str] = None):
+            if etag and self.headers.get('If-None-Match') == etag:
+                status, body, headers = 304, b'', {'ETag': etag}
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    return ReplayHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odtwarzanie nagranych odpowiedzi metin2alerts.com")
+    parser.add_argument('record_dir', help="Katalog nagrań (RECORD_DIR)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--speed', type=float, default=1.0, help="Przyspieszenie odtwarzanego czasu (np. 288 = doba w 5 minut)")
+    parser.add_argument('--step', action='store_true', help="Każde pobranie serwera zwraca kolejne nagranie")
+    parser.add_argument('--translations', default=None,
+                        help="Plik tłumaczeń (domyślnie item_names.json w katalogu nagrań lub TRANSLATION_CACHE_PATH)")
+    args = parser.parse_args()
+    
+    recordings = load_recordings(args.record_dir)
+    if not recordings:
+        logger.error(f"Brak nagrań w {args.record_dir}")
+        return
+    
+    translations_path = args.translations
+    if translations_path is None:
+        translations_path = os.path.join(args.record_dir, 'item_names.json')
+        if not os.path.isfile(translations_path):
+            try:
+                import config
+                translations_path = getattr(config, 'TRANSLATION_CACHE_PATH', 'item_names_cache.json')
+            except ImportError:
+                translations_path = 'item_names_cache.json'
+    translations = load_translations(translations_path)
+    
+    state = ReplayState(recordings, speed=args.speed, step=args.step)
+    for server_id, files in recordings.items():
+        logger.info(f"Serwer {server_id}: {len(files)} nagrań")
+    if translations is None:
+        logger.warning("Brak pliku tłumaczeń – /item_names.json zwraca 404")
+    
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state, translations))
+    logger.info(f"Odtwarzanie na http://{args.host}:{args.port}/store/ (speed={args.speed}, step={args.step})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Zatrzymywanie serwera odtwarzania...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
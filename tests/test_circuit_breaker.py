@@ -0,0 +1,101 @@
+"""Testy CircuitBreaker i próby alternatywnego endpointu (Metin2DataFetcher._probe_fallback_endpoint)"""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+class FakeTime:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(circuit_breaker.time, 'time', fake.time)
+    return fake
+
+
+def state_of(breaker: CircuitBreaker, key: str) -> str:
+    return breaker._endpoints[key]['state']
+
+
+def test_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60, max_cooldown=600)
+    assert breaker.allow('a')
+    breaker.record_failure('a', 'timeout')
+    assert state_of(breaker, 'a') == STATE_CLOSED
+    assert breaker.allow('a')
+    breaker.record_failure('a', 'timeout')
+    assert state_of(breaker, 'a') == STATE_OPEN
+    assert not breaker.allow('a')
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60, max_cooldown=600)
+    breaker.record_failure('a', 'timeout')
+    clock.now += 59
+    assert not breaker.allow('a')
+    clock.now += 1
+    assert breaker.allow('a')
+    assert state_of(breaker, 'a') == STATE_HALF_OPEN
+    # Druga próba w trakcie pierwszej jest odrzucana
+    assert not breaker.allow('a')
+    breaker.record_success('a')
+    assert state_of(breaker, 'a') == STATE_CLOSED
+    assert breaker.allow('a')
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60, max_cooldown=100)
+    breaker.record_failure('a', 'timeout')
+    clock.now += 60
+    assert breaker.allow('a')
+    breaker.record_failure('a', 'timeout')
+    assert state_of(breaker, 'a') == STATE_OPEN
+    clock.now += 99
+    assert not breaker.allow('a')
+    clock.now += 1
+    assert breaker.allow('a')
+    # Sukces przywraca początkowe schłodzenie
+    breaker.record_success('a')
+    breaker.record_failure('a', 'timeout')
+    assert breaker._endpoints['a']['cooldown'] == 60
+
+
+def test_endpoints_are_independent(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60, max_cooldown=600)
+    breaker.record_failure('a', 'timeout')
+    assert not breaker.allow('a')
+    assert breaker.allow('b')
+    health = {entry['endpoint']: entry for entry in breaker.get_health(['a', 'b'])}
+    assert health['a']['state'] == STATE_OPEN
+    assert health['a']['last_error'] == 'timeout'
+    assert health['b']['state'] == STATE_CLOSED
+
+
+def test_unexpected_probe_error_releases_half_open(clock):
+    from data_fetcher import Metin2DataFetcher
+    
+    class BrokenSession:
+        def get(self, *args, **kwargs):
+            raise RuntimeError('boom')
+    
+    fetcher = Metin2DataFetcher.__new__(Metin2DataFetcher)
+    fetcher.endpoint_breaker = CircuitBreaker(failure_threshold=1, cooldown=60, max_cooldown=600)
+    fetcher.fallback_timeout = 1
+    fetcher._fallback_session = BrokenSession()
+    fetcher.endpoint_breaker.record_failure('http://e', 'timeout')
+    clock.now += 60
+    assert fetcher.endpoint_breaker.allow('http://e')
+    
+    assert fetcher._probe_fallback_endpoint('http://e') is None
+    assert state_of(fetcher.endpoint_breaker, 'http://e') == STATE_OPEN
+    assert fetcher.endpoint_breaker._endpoints['http://e']['last_error'] == 'RuntimeError'
+    # Po kolejnym schłodzeniu endpoint znowu dostaje próbę (nie zostaje zablokowany)
+    clock.now += 120
+    assert fetcher.endpoint_breaker.allow('http://e')
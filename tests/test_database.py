@@ -0,0 +1,213 @@
+"""
+Testy zapisu snapshotów jako przedziałów ofert, partycji czasowych, retencji i migracji bazy
+w schemacie sprzed przedziałów (tabele snapshots + offers)
+"""
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from database import Database
+
+
+class FrozenDatetime(datetime):
+    """datetime.now() zwraca ustawiony czas (database.datetime w testach)"""
+    current = datetime(2026, 10, 5, 12, 0)
+    
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(database, 'datetime', FrozenDatetime)
+    FrozenDatetime.current = datetime(2026, 10, 5, 12, 0)  # poniedziałek – początek partycji tygodniowej
+    return FrozenDatetime
+
+
+@pytest.fixture
+def db(tmp_path, clock):
+    instance = Database(str(tmp_path / 'test.db'))
+    yield instance
+    instance.close()
+
+
+def offer(name, yang, seller='s1', quantity='1'):
+    return {'name': name, 'yang': str(yang), 'won': '0', 'quantity': quantity, 'seller': seller}
+
+
+def add_snapshot(db, clock, at, offers, server_id=426):
+    clock.current = at
+    return db.add_price_data(iter(offers), server_id)
+
+
+def raw_offers(db, server_id=426):
+    offers, _ = db.get_latest_snapshot_offers_raw(server_id)
+    return Counter((o['item_name'], o['price_in_won'], o['quantity'], o['seller']) for o in offers)
+
+
+def query(db, sql, params=()):
+    with db._get_connection() as conn:
+        return [tuple(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def test_duplicate_offers_are_matched_as_multiset(db, clock):
+    day = datetime(2026, 10, 5, 12, 0)
+    a, b = offer('Perła', 500), offer('Łuska Smoka', 700)
+    add_snapshot(db, clock, day, [a, a, b])
+    assert raw_offers(db) == Counter({('Perła', 5.0, 1, 's1'): 2, ('Łuska Smoka', 7.0, 1, 's1'): 1})
+    
+    # Jedna z dwóch identycznych ofert znika – zamykany jest dokładnie jeden przedział
+    add_snapshot(db, clock, day + timedelta(minutes=5), [b, a])
+    assert raw_offers(db) == Counter({('Perła', 5.0, 1, 's1'): 1, ('Łuska Smoka', 7.0, 1, 's1'): 1})
+    intervals = query(db, "SELECT first_snapshot_id, last_snapshot_id FROM offer_intervals ORDER BY id")
+    assert intervals == [(1, None), (1, 1), (1, None)]
+    
+    # Bez zmian – żadnego nowego ani zamkniętego przedziału
+    add_snapshot(db, clock, day + timedelta(minutes=10), [a, b])
+    assert len(query(db, "SELECT id FROM offer_intervals")) == 3
+    
+    # Duplikat wraca – nowy przedział od bieżącego snapshotu
+    add_snapshot(db, clock, day + timedelta(minutes=15), [a, b, a])
+    assert raw_offers(db)[('Perła', 5.0, 1, 's1')] == 2
+    assert query(db, "SELECT first_snapshot_id FROM offer_intervals WHERE last_snapshot_id IS NULL ORDER BY id") \
+        == [(1,), (1,), (4,)]
+    
+    # Historia odtwarza każdy snapshot z przedziałów (także duplikaty)
+    history = Counter(h['timestamp'] for h in db.get_item_history('Perła', 426))
+    assert sorted(history.values()) == [1, 1, 2, 2]
+
+
+def test_partition_rollover_carries_open_intervals(db, clock):
+    sunday = datetime(2026, 10, 11, 23, 0)
+    offers = [offer('Perła', 500), offer('Perła', 500), offer('Ząb Diabła', 900, seller='s2')]
+    add_snapshot(db, clock, sunday, offers)
+    add_snapshot(db, clock, sunday + timedelta(hours=2), offers[1:])
+    
+    assert [name for name, in query(db, "SELECT name FROM partitions WHERE base_table = 'offer_intervals' "
+                                         "ORDER BY period_start")] == ['offer_intervals_20261005',
+                                                                       'offer_intervals_20261012']
+    # Stara partycja: wszystkie przedziały zamknięte na ostatnim snapshocie jej okresu
+    assert query(db, "SELECT COUNT(*) FROM offer_intervals_20261005 WHERE last_snapshot_id IS NULL") == [(0,)]
+    assert query(db, "SELECT COUNT(*) FROM offer_intervals_20261005 WHERE last_snapshot_id = 1") == [(3,)]
+    # Nowa partycja: oferty obecne nadal otwarte od pierwszego snapshotu nowego okresu
+    assert query(db, "SELECT first_snapshot_id, last_snapshot_id FROM offer_intervals_20261012") == [(2, None), (2, None)]
+    assert raw_offers(db) == Counter({('Perła', 5.0, 1, 's1'): 1, ('Ząb Diabła', 9.0, 1, 's2'): 1})
+    
+    # Kolejny snapshot w nowym okresie porównuje się z przeniesionymi przedziałami
+    add_snapshot(db, clock, sunday + timedelta(hours=3), offers[1:])
+    assert query(db, "SELECT COUNT(*) FROM offer_intervals_20261012") == [(2,)]
+    assert len(db.get_item_history('Perła', 426)) == 4
+
+
+def test_retention_drops_whole_partitions(db, clock):
+    start = datetime(2026, 10, 5, 12, 0)
+    for week in range(3):
+        for hour in (0, 1):
+            add_snapshot(db, clock, start + timedelta(weeks=week, hours=hour),
+                         [offer('Perła', 500 + week), offer('Stone X', 300)])
+    latest_before = db.get_latest_data(426)
+    
+    clock.current = datetime(2026, 10, 21, 12, 0)
+    deleted = db.apply_retention(raw_days=7)
+    
+    # Zostają partycje, których okres nie jest cały starszy niż 7 dni (tydzień od 2026-10-12 i bieżący)
+    assert deleted['partitions'] == len(database.PARTITIONED_TABLES)
+    assert deleted['snapshots'] == 2
+    assert query(db, "SELECT DISTINCT period_start FROM partitions ORDER BY period_start") \
+        == [('2026-10-12T00:00:00',), ('2026-10-19T00:00:00',)]
+    assert db.get_latest_data(426) == latest_before
+    assert [h['timestamp'][:10] for h in db.get_item_history('Perła', 426)].count('2026-10-05') == 0
+    # Rollupy dzienne i katalog przedmiotów nie podlegają retencji
+    assert query(db, "SELECT MIN(bucket_start) FROM item_rollups_daily") == [('2026-10-05T00:00:00',)]
+    assert db.get_unique_items(426) == ['Perła', 'Stone X']
+
+
+def test_retention_keeps_partition_with_latest_snapshot_of_stale_server(db, clock):
+    add_snapshot(db, clock, datetime(2026, 10, 5, 12, 0), [offer('Perła', 500)], server_id=702)
+    add_snapshot(db, clock, datetime(2026, 10, 12, 12, 0), [offer('Perła', 500)])
+    add_snapshot(db, clock, datetime(2026, 10, 19, 12, 0), [offer('Perła', 600)])
+    
+    clock.current = datetime(2026, 10, 28, 12, 0)
+    deleted = db.apply_retention(raw_days=7)
+    
+    # Najnowszy snapshot serwera 702 jest w najstarszej partycji – nic nie jest usuwane
+    assert deleted['partitions'] == 0
+    assert raw_offers(db, 702) == Counter({('Perła', 5.0, 1, 's1'): 1})
+    assert raw_offers(db, 426) == Counter({('Perła', 6.0, 1, 's1'): 1})
+
+
+BASELINE_SCHEMA = """
+    CREATE TABLE price_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, item_name TEXT NOT NULL,
+        price REAL NOT NULL, price_in_won REAL NOT NULL, currency TEXT NOT NULL, quantity TEXT NOT NULL,
+        seller TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, server_id INTEGER NOT NULL, timestamp TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE(server_id, timestamp)
+    );
+    CREATE TABLE offers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, snapshot_id INTEGER NOT NULL, server_id INTEGER NOT NULL,
+        item_name TEXT NOT NULL, price REAL NOT NULL, price_in_won REAL NOT NULL, currency TEXT NOT NULL,
+        quantity TEXT NOT NULL, seller TEXT NOT NULL,
+        FOREIGN KEY (snapshot_id) REFERENCES snapshots(id) ON DELETE CASCADE
+    );
+    CREATE INDEX idx_snapshots_server_timestamp ON snapshots(server_id, timestamp);
+    CREATE INDEX idx_offers_snapshot_id ON offers(snapshot_id);
+"""
+
+
+def test_migration_from_baseline_schema(tmp_path, clock):
+    path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    snapshots = [
+        ('2026-10-05T10:00:00', [('Perła', 5.0, '1,000', 's1'), ('Perła', 5.0, '1,000', 's1'), ('Stone X', 3.0, '', 's2')]),
+        ('2026-10-05T10:05:00', [('Perła', 5.0, '1,000', 's1'), ('Stone X', 2.5, '10', 's3')]),
+    ]
+    for snapshot_id, (timestamp, offers) in enumerate(snapshots, start=1):
+        conn.execute("INSERT INTO snapshots (id, server_id, timestamp) VALUES (?, 426, ?)", (snapshot_id, timestamp))
+        conn.executemany("""
+            INSERT INTO offers (snapshot_id, server_id, item_name, price, price_in_won, currency, quantity, seller)
+            VALUES (?, 426, ?, ?, ?, 'won', ?, ?)
+        """, [(snapshot_id, name, price, price, quantity, seller) for name, price, quantity, seller in offers])
+    conn.commit()
+    conn.close()
+    
+    clock.current = datetime(2026, 10, 5, 12, 0)
+    db = Database(path)
+    try:
+        assert query(db, "SELECT COUNT(*) FROM offers") == [(0,)]
+        assert raw_offers(db) == Counter({('Perła', 5.0, 1000, 's1'): 1, ('Stone X', 2.5, 10, 's3'): 1})
+        history = db.get_item_history('Perła', 426)
+        assert Counter(h['timestamp'] for h in history) == Counter({'2026-10-05T10:00:00': 2, '2026-10-05T10:05:00': 1})
+        assert all(h['quantity'] == 1000 for h in history)
+        
+        # Czas jako milisekundy epoki, wskaźnik najnowszego snapshotu, statystyki i katalog
+        assert query(db, "SELECT COUNT(*) FROM snapshots WHERE timestamp_ms IS NULL") == [(0,)]
+        assert db.get_latest_snapshot(426)['timestamp'] == '2026-10-05T10:05:00'
+        latest, total_quantity = db.get_latest_data(426)
+        assert {item['item_name']: item['price'] for item in latest} == {'Perła': 5.0, 'Stone X': 2.5}
+        assert total_quantity == 1010
+        assert db.get_unique_items(426, active_only=True) == ['Perła', 'Stone X']
+        assert db.search_items('perl', 426) == ['Perła']
+        
+        # Zapis po migracji kontynuuje przedziały z migracji
+        clock.current = datetime(2026, 10, 5, 12, 5)
+        db.add_price_data(iter([offer('Perła', 500, quantity='1,000')]), 426)
+        assert raw_offers(db) == Counter({('Perła', 5.0, 1000, 's1'): 1})
+        assert db.get_unique_items(426, active_only=True) == ['Perła']
+    finally:
+        db.close()
+    
+    # Ponowne otwarcie nie migruje drugi raz
+    db = Database(path)
+    try:
+        assert raw_offers(db) == Counter({('Perła', 5.0, 1000, 's1'): 1})
+        assert len(db.get_item_history('Perła', 426)) == 4
+    finally:
+        db.close()
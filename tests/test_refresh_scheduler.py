@@ -0,0 +1,72 @@
+"""Testy harmonogramu odświeżania serwerów (RefreshScheduler)"""
+import pytest
+
+from refresh_scheduler import RefreshScheduler, RESULT_CHANGED, RESULT_ERROR, RESULT_UNCHANGED
+
+
+@pytest.fixture
+def scheduler():
+    sched = RefreshScheduler({426: 'Charon', 702: 'Tamara'}, base_interval=100)
+    sched.min_interval = 50
+    sched.max_interval = 400
+    sched.error_backoff = 10
+    sched.jitter = 0
+    now = 1000.0
+    for state in sched._servers.values():
+        state['next_run'] = now
+    return sched
+
+
+def test_due_servers_most_overdue_first(scheduler):
+    scheduler._servers[426]['next_run'] = 990.0
+    scheduler._servers[702]['next_run'] = 980.0
+    assert list(scheduler.due_servers(now=1000.0)) == [702, 426]
+    assert scheduler.due_servers(now=970.0) == {}
+    assert scheduler.seconds_until_next(now=970.0) == 10.0
+
+
+def test_next_run_counts_from_scheduled_time(scheduler):
+    # Przetwarzanie trwało 30 s – kolejny termin nie przesuwa się o ten czas
+    scheduler.record_result(426, RESULT_CHANGED, now=1030.0)
+    state = scheduler._servers[426]
+    assert state['interval'] == 75.0
+    assert state['next_run'] == 1075.0
+
+
+def test_next_run_not_in_the_past_after_long_pause(scheduler):
+    scheduler.record_result(426, RESULT_UNCHANGED, now=5000.0)
+    assert scheduler._servers[426]['next_run'] == 5000.0
+
+
+def test_interval_adapts_within_bounds(scheduler):
+    for _ in range(20):
+        scheduler.record_result(426, RESULT_CHANGED, now=1000.0)
+        scheduler.record_result(702, RESULT_UNCHANGED, now=1000.0)
+    assert scheduler._servers[426]['interval'] == 50
+    assert scheduler._servers[702]['interval'] == 400
+    assert scheduler._servers[426]['changes'] == 20
+
+
+def test_error_backoff_is_exponential_and_resets(scheduler):
+    delays = []
+    for _ in range(7):
+        scheduler.record_result(426, RESULT_ERROR, now=1000.0)
+        delays.append(scheduler._servers[426]['next_run'] - 1000.0)
+    assert delays == [10, 20, 40, 80, 160, 320, 400]
+    # Błąd nie zmienia interwału; sukces zeruje licznik błędów
+    assert scheduler._servers[426]['interval'] == 100
+    scheduler.record_result(426, RESULT_UNCHANGED, now=2000.0)
+    assert scheduler._servers[426]['errors'] == 0
+
+
+def test_unknown_server_is_ignored(scheduler):
+    scheduler.record_result(999, RESULT_CHANGED, now=1000.0)
+    assert 999 not in scheduler._servers
+
+
+def test_schedule_report(scheduler):
+    scheduler.record_result(702, RESULT_ERROR, now=1000.0)
+    schedule = scheduler.get_schedule()
+    assert [entry['server_id'] for entry in schedule] == [426, 702]
+    assert schedule[1]['last_result'] == RESULT_ERROR
+    assert schedule[1]['consecutive_errors'] == 1
@@ -0,0 +1,184 @@
+"""
+Moduł z tłumaczeniami nazw przedmiotów (vnum -> polska nazwa) przechowywanymi na dysku.
+Start aplikacji czyta lokalną kopię, a plik TRANSLATION_URL jest odświeżany w tle (zapytaniem warunkowym).
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional
+import logging
+import requests
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TranslationStore:
+    """Klasa przechowująca tłumaczenia nazw przedmiotów z kopią na dysku i odświeżaniem w tle"""
+    
+    def __init__(self, session: requests.Session, url: Optional[str] = None,
+                 cache_path: Optional[str] = None):
+        """
+        Args:
+            session: Sesja HTTP używana do pobierania pliku tłumaczeń
+            url: URL pliku item_names.json (domyślnie config.TRANSLATION_URL)
+            cache_path: Ścieżka lokalnej kopii (domyślnie config.TRANSLATION_CACHE_PATH)
+        """
+        self.session = session
+        self.url = url if url is not None else getattr(config, 'TRANSLATION_URL', None)
+        self.cache_path = cache_path or getattr(config, 'TRANSLATION_CACHE_PATH', 'item_names_cache.json')
+        # Co ile sekund sprawdzać, czy plik tłumaczeń się zmienił
+        self.refresh_interval = getattr(config, 'TRANSLATION_REFRESH_INTERVAL', 6 * 3600)
+        # Po nieudanym pobraniu kolejna próba najwcześniej po tylu sekundach
+        self.retry_interval = getattr(config, 'TRANSLATION_RETRY_INTERVAL', 60)
+        
+        self._translations: Optional[Dict[str, str]] = None
+        self._etag = ''
+        self._last_modified = ''
+        self._checked_at = 0.0  # time.time() ostatniego udanego sprawdzenia (200 lub 304)
+        self._failed_at: Optional[float] = None  # time.monotonic() ostatniego błędu
+        self._lock = threading.Lock()
+        self._refresh_flag_lock = threading.Lock()
+        self._refreshing = False
+    
+    def get(self) -> Dict[str, str]:
+        """
+        Zwraca tłumaczenia (vnum jako string -> nazwa).
+        
+        Przy pierwszym wywołaniu czyta lokalną kopię; gdy jej nie ma – pobiera plik synchronicznie.
+        Nieaktualna kopia jest odświeżana w tle, a do tego czasu (i po błędzie pobierania)
+        zwracane są ostatnie poprawne tłumaczenia. Pusty dict tylko gdy nigdy ich nie pobrano –
+        wtedy kolejna próba następuje po retry_interval, a nie dopiero po restarcie.
+        """
+        translations = self._translations
+        if translations is None:
+            with self._lock:
+                if self._translations is None:
+                    self._load_from_disk()
+                if self._translations is None and self._can_retry():
+                    self._refresh()
+                translations = self._translations
+            if translations is None:
+                return {}
+        
+        if time.time() - self._checked_at > self.refresh_interval and self._can_retry():
+            self._start_background_refresh()
+        return translations
+    
+    def refresh(self) -> bool:
+        """Sprawdza synchronicznie, czy plik tłumaczeń się zmienił. True jeśli sprawdzenie się udało."""
+        with self._lock:
+            return self._refresh()
+    
+    def _can_retry(self) -> bool:
+        return self._failed_at is None or time.monotonic() - self._failed_at >= self.retry_interval
+    
+    def _start_background_refresh(self):
+        # Osobna blokada – self._lock jest trzymany przez cały czas pobierania
+        with self._refresh_flag_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+        
+        threading.Thread(target=run, name='translations-refresh', daemon=True).start()
+    
+    def _load_from_disk(self):
+        """Wczytuje lokalną kopię tłumaczeń (jeśli istnieje)"""
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            translations = stored.get('translations')
+            if not isinstance(translations, dict):
+                logger.warning(f"Nieprawidłowy plik tłumaczeń {self.cache_path} – pomijanie")
+                return
+            self._translations = translations
+            # Kopia z innego URL jest używana do czasu pobrania właściwej, bez walidatorów
+            if stored.get('url') == self.url:
+                self._etag = stored.get('etag') or ''
+                self._last_modified = stored.get('last_modified') or ''
+                self._checked_at = float(stored.get('checked_at') or 0)
+            logger.info(f"Załadowano {len(translations)} tłumaczeń z dysku ({self.cache_path})")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Błąd odczytu pliku tłumaczeń {self.cache_path}: {e}")
+    
+    def _save_to_disk(self):
+        """Zapisuje tłumaczenia atomowo (plik tymczasowy + os.replace)"""
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'url': self.url,
+                    'etag': self._etag,
+                    'last_modified': self._last_modified,
+                    'checked_at': self._checked_at,
+                    'translations': self._translations,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać tłumaczeń do {self.cache_path}: {e}")
+    
+    def _refresh(self) -> bool:
+        """Pobiera plik tłumaczeń (warunkowo, jeśli znamy walidatory). Wywoływane pod self._lock."""
+        if not self.url:
+            logger.warning("Nie skonfigurowano URL tłumaczeń. Używanie oryginalnych nazw.")
+            self._translations = self._translations or {}
+            self._checked_at = time.time()
+            return False
+        
+        headers = {}
+        if self._translations is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        
+        try:
+            logger.info(f"Ładowanie tłumaczeń z: {self.url}")
+            response = self.session.get(self.url, headers=headers, timeout=15)
+            
+            if response.status_code == 304:
+                logger.info("Tłumaczenia bez zmian (304 Not Modified)")
+                self._checked_at = time.time()
+                self._failed_at = None
+                return True
+            
+            if response.status_code != 200:
+                logger.warning(f"Nie udało się pobrać tłumaczeń: status {response.status_code}")
+                self._failed_at = time.monotonic()
+                return False
+            
+            translations = response.json()
+            if not isinstance(translations, dict):
+                logger.warning(f"Nieoczekiwany format tłumaczeń: {type(translations)}")
+                self._failed_at = time.monotonic()
+                return False
+            
+            self._translations = translations
+            self._etag = response.headers.get('ETag', '')
+            self._last_modified = response.headers.get('Last-Modified', '')
+            self._checked_at = time.time()
+            self._failed_at = None
+            logger.info(f"Załadowano {len(translations)} tłumaczeń")
+            self._save_to_disk()
+            return True
+        
+        except (requests.exceptions.RequestException, ValueError) as e:
+            kept = f" – używanie ostatnich ({len(self._translations)})" if self._translations else ""
+            logger.warning(f"Błąd podczas pobierania tłumaczeń: {e}{kept}")
+            self._failed_at = time.monotonic()
+            return False